@@ -0,0 +1,137 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from buildprofile import configure_logging
+from model_builder import MODEL_STATE_KEYS, SCENARIOS, workbook_bytes
+from timeline import DEFAULT_GRANULARITY, DEFAULT_HORIZON_MONTHS
+
+# --- HEADLESS BATCH RENDERER ---
+# Builds one workbook per assumption file (JSON or YAML, same schema as the app's session state)
+# across a process pool. Usage:
+#   python batch.py assumptions/ -o models/ --workers 32 --with-values
+
+ASSUMPTION_EXTENSIONS = ('.json', '.yaml', '.yml')
+
+
+def load_assumptions(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.json'):
+            state = json.load(f)
+        else:
+            try:
+                import yaml
+            except ImportError:
+                raise RuntimeError("PyYAML is required for YAML assumption files (pip install pyyaml)")
+            state = yaml.safe_load(f)
+    state.setdefault('scenario_to_run', "Base")
+    state.setdefault('scenarios', list(SCENARIOS))
+    state.setdefault('horizon_months', DEFAULT_HORIZON_MONTHS)
+    state.setdefault('granularity', DEFAULT_GRANULARITY)
+    missing = [key for key in MODEL_STATE_KEYS if key not in state]
+    if missing:
+        raise ValueError(f"missing keys: {', '.join(missing)}")
+    return state
+
+
+def render_model(path, out_dir, with_values=False, scenario=None, all_scenarios=False):
+    # Worker entry point: returns a timing record instead of raising, so one bad file doesn't stop the batch
+    record = {'input': path, 'output': None, 'error': None}
+    started = time.perf_counter()
+    try:
+        state = load_assumptions(path)
+        if scenario:
+            state['scenario_to_run'] = scenario
+        record['load_s'] = time.perf_counter() - started
+
+        build_start = time.perf_counter()
+        data = workbook_bytes(state, with_values, all_scenarios=all_scenarios)
+        record['build_s'] = time.perf_counter() - build_start
+
+        name = os.path.splitext(os.path.basename(path))[0] + ".xlsx"
+        output = os.path.join(out_dir, name)
+        with open(output, 'wb') as f:
+            f.write(data)
+        record['output'] = output
+        record['bytes'] = len(data)
+    except Exception as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+    record['total_s'] = time.perf_counter() - started
+    record['pid'] = os.getpid()
+    return record
+
+
+def find_inputs(input_dir):
+    return sorted(
+        os.path.join(input_dir, name) for name in os.listdir(input_dir)
+        if name.lower().endswith(ASSUMPTION_EXTENSIONS)
+    )
+
+
+def run_batch(input_dir, out_dir, workers=None, with_values=False, scenario=None, all_scenarios=False):
+    paths = find_inputs(input_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+
+    started = time.perf_counter()
+    records = []
+    if workers == 1:
+        records = [render_model(p, out_dir, with_values, scenario, all_scenarios) for p in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=configure_logging) as pool:
+            futures = [pool.submit(render_model, p, out_dir, with_values, scenario, all_scenarios) for p in paths]
+            for future in as_completed(futures):
+                records.append(future.result())
+    wall = time.perf_counter() - started
+
+    records.sort(key=lambda r: r['input'])
+    ok = [r for r in records if not r['error']]
+    busy = sum(r['total_s'] for r in records)
+    return {
+        'input_dir': input_dir,
+        'output_dir': out_dir,
+        'workers': workers,
+        'with_values': with_values,
+        'all_scenarios': all_scenarios,
+        'models': len(records),
+        'failed': len(records) - len(ok),
+        'wall_s': wall,
+        'cpu_s': busy,
+        # Busy time / (wall time * workers): 1.0 means the pool was never idle
+        'pool_efficiency': busy / (wall * workers) if wall > 0 else 0.0,
+        'models_per_s': len(ok) / wall if wall > 0 else 0.0,
+        'records': records,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render financial model workbooks from a directory of assumption files")
+    parser.add_argument('input_dir', help="directory of .json / .yaml assumption files")
+    parser.add_argument('-o', '--output-dir', default='models', help="where .xlsx files are written (default: models)")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--with-values', action='store_true', help="store engine-computed values next to formulas")
+    parser.add_argument('--scenario', default=None, help="override scenario_to_run for every file")
+    parser.add_argument('--all-scenarios', action='store_true', help="one switchable workbook per file with every scenario and a comparison sheet")
+    parser.add_argument('--report', default=None, help="timing report path (default: <output-dir>/batch_report.json)")
+    args = parser.parse_args(argv)
+    configure_logging()
+
+    report = run_batch(args.input_dir, args.output_dir, args.workers, args.with_values, args.scenario, args.all_scenarios)
+    report_path = args.report or os.path.join(args.output_dir, 'batch_report.json')
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    for r in report['records']:
+        if r['error']:
+            print(f"FAILED {r['input']}: {r['error']}")
+    print(f"{report['models'] - report['failed']}/{report['models']} models in {report['wall_s']:.2f}s "
+          f"with {report['workers']} workers ({report['models_per_s']:.1f} models/s, "
+          f"pool efficiency {report['pool_efficiency']:.0%}); report: {report_path}")
+    return 1 if report['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
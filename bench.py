@@ -0,0 +1,178 @@
+import argparse
+import copy
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+
+import openpyxl
+
+from model_builder import default_quarterly_state, default_state, generate_excel, generate_quarterly_excel
+
+# --- WORKBOOK BENCHMARKS ---
+# Times the three builders as the apps call them (build, then wb.save to memory, measured separately) and
+# their peak Python memory, over a grid of line-item counts and horizons. Results are JSON; with --baseline
+# every case is compared against a stored run and the exit code is 1 if any got slower or bigger. Usage:
+#   python bench.py -o bench.json
+#   python bench.py --baseline bench.json --tolerance 0.15
+
+DEFAULT_ITEMS = [2, 20, 200]  # revenue / opex / capex items each
+DEFAULT_PERIODS = [12, 36, 120, 240]
+DEFAULT_REPEATS = 3
+DEFAULT_TOLERANCE = 0.10
+# Differences below these are noise, whatever the ratio
+MIN_SECONDS = 0.005
+MIN_MB = 0.5
+
+METRICS = ['build_s', 'save_s', 'peak_mb']
+
+
+def _build_main(state):
+    # main.py: planned horizon with KPIs, streamed
+    return generate_excel(state, include_kpis=True, write_only=True)
+
+
+def _build_plus(state):
+    # fms3mPlus.py: same builder without the KPI sheet
+    return generate_excel(state, include_kpis=False, write_only=True)
+
+
+def _plus_state():
+    # fms3mPlus.py never seeds the KPI assumptions
+    state = default_state()
+    del state['kpi_assumptions']
+    return state
+
+
+# name -> (default state, build function, months per period)
+BUILDERS = {
+    'main': (default_state, _build_main, 1),
+    'plus': (_plus_state, _build_plus, 1),
+    'quarterly': (default_quarterly_state, generate_quarterly_excel, 3),
+}
+
+
+def scaled_state(state, n_items, n_periods, months_per_period=1):
+    # Copy of state with n_items revenue, opex and capex items (the defaults repeated, later copies numbered)
+    # and a horizon of n_periods
+    state = copy.deepcopy(state)
+    for key in ('revenue_items', 'opex_items', 'capex_items'):
+        base = state[key]
+        items = []
+        for i in range(n_items):
+            item = copy.deepcopy(base[i % len(base)])
+            if i >= len(base):
+                item['name'] = f"{item['name']} {i // len(base) + 1}"
+            items.append(item)
+        state[key] = items
+    state['horizon_months'] = n_periods * months_per_period
+    return state
+
+
+def measure(build, state, repeats=DEFAULT_REPEATS, memory=True):
+    # Best-of-repeats build and save times; peak traced memory of one more build + save
+    build_s, save_s, size = [], [], 0
+    for _ in range(repeats):
+        started = time.perf_counter()
+        wb = build(state)
+        built = time.perf_counter()
+        buffer = BytesIO()
+        wb.save(buffer)
+        build_s.append(built - started)
+        save_s.append(time.perf_counter() - built)
+        size = len(buffer.getvalue())
+    record = {'build_s': min(build_s), 'save_s': min(save_s), 'bytes': size}
+    if memory:
+        tracemalloc.start()
+        try:
+            build(state).save(BytesIO())
+            record['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2**20
+        finally:
+            tracemalloc.stop()
+    record['total_s'] = record['build_s'] + record['save_s']
+    return record
+
+
+def run_benchmarks(builders=tuple(BUILDERS), items=DEFAULT_ITEMS, periods=DEFAULT_PERIODS, repeats=DEFAULT_REPEATS, memory=True, progress=None):
+    cases = []
+    for name in builders:
+        default, build, months = BUILDERS[name]
+        for n_items in items:
+            for n_periods in periods:
+                record = {'builder': name, 'items': n_items, 'periods': n_periods}
+                record.update(measure(build, scaled_state(default(), n_items, n_periods, months), repeats, memory))
+                cases.append(record)
+                if progress:
+                    progress(record)
+    return {
+        'python': platform.python_version(),
+        'openpyxl': openpyxl.__version__,
+        'platform': platform.platform(),
+        'repeats': repeats,
+        'cases': cases,
+    }
+
+
+def compare(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    # [{'builder', 'items', 'periods', 'metric', 'baseline', 'current', 'ratio', 'regression'}] for every case
+    # and metric present in both reports; a regression is more than tolerance worse and above the noise floor
+    stored = {(c['builder'], c['items'], c['periods']): c for c in baseline['cases']}
+    rows = []
+    for case in report['cases']:
+        old = stored.get((case['builder'], case['items'], case['periods']))
+        if old is None:
+            continue
+        for metric in METRICS:
+            if metric not in case or metric not in old:
+                continue
+            before, after = old[metric], case[metric]
+            floor = MIN_MB if metric == 'peak_mb' else MIN_SECONDS
+            rows.append({
+                'builder': case['builder'], 'items': case['items'], 'periods': case['periods'], 'metric': metric,
+                'baseline': before, 'current': after, 'ratio': after / before if before else None,
+                'regression': after > before * (1 + tolerance) and after - before > floor,
+            })
+    return rows
+
+
+def _print_case(record):
+    memory = f"{record['peak_mb']:8.1f} MB" if 'peak_mb' in record else ""
+    print(f"{record['builder']:<10} {record['items']:>4} items {record['periods']:>4} periods  "
+          f"build {record['build_s']:7.3f}s  save {record['save_s']:7.3f}s  {memory}", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark workbook build and save times across model sizes")
+    parser.add_argument('-o', '--output', default=None, help="write the JSON report here")
+    parser.add_argument('--baseline', default=None, help="stored report to compare against (exit code 1 on regressions)")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help="allowed slowdown / growth vs the baseline (default: 0.10)")
+    parser.add_argument('--builders', nargs='+', choices=list(BUILDERS), default=list(BUILDERS))
+    parser.add_argument('--items', nargs='+', type=int, default=DEFAULT_ITEMS, help="revenue / opex / capex items each")
+    parser.add_argument('--periods', nargs='+', type=int, default=DEFAULT_PERIODS, help="horizon in the builder's periods")
+    parser.add_argument('--repeats', type=int, default=DEFAULT_REPEATS, help="timed runs per case (the best is kept)")
+    parser.add_argument('--no-memory', action='store_true', help="skip the traced peak-memory run")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.builders, args.items, args.periods, args.repeats, not args.no_memory, _print_case)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        rows = compare(report, json.load(f), args.tolerance)
+    regressions = [r for r in rows if r['regression']]
+    for r in regressions:
+        print(f"REGRESSION {r['builder']} {r['items']} items {r['periods']} periods {r['metric']}: "
+              f"{r['baseline']:.4g} -> {r['current']:.4g} ({r['ratio']:.2f}x)")
+    print(f"{len(rows)} comparisons against {args.baseline}, {len(regressions)} regressions (tolerance {args.tolerance:.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
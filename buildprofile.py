@@ -0,0 +1,88 @@
+import json
+import logging
+import time
+import tracemalloc
+
+# --- BUILD PROFILE ---
+# Per-phase instrumentation of a workbook build. A profile is a plain dict passed through the builder;
+# mark() closes the running phase and opens the next, so phases need no nesting and can start in the
+# middle of a streamed sheet (the model sheet is split at its P&L / balance sheet / cash flow headers).
+# Every phase records wall time and cells written; with trace_memory the traced allocations too
+# (tracemalloc slows a build noticeably, so it is opt-in). Builders take profile=None and skip all of it.
+
+logger = logging.getLogger("model_builder")
+LOG_FORMAT = "%(asctime)s %(name)s %(levelname)s %(message)s"
+
+
+def configure_logging(level=logging.INFO):
+    # The build line is logged at INFO, below Python's default WARNING: entry points (the apps, batch.py
+    # and its workers) call this so it reaches stderr. Safe to call on every Streamlit rerun
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(level)
+
+
+def start_profile(trace_memory=False):
+    profile = {'phases': [], 'current': None, 'trace_memory': trace_memory, 'started_tracing': False,
+               'started': time.perf_counter()}
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        profile['started_tracing'] = True
+    return profile
+
+
+def _close(profile, now):
+    current = profile['current']
+    if current is None:
+        return
+    record = {'phase': current['phase'], 'seconds': now - current['started'], 'cells': current['cells']}
+    if profile['trace_memory']:
+        size, peak = tracemalloc.get_traced_memory()
+        record['alloc_mb'] = (size - current['memory']) / 2**20
+        record['peak_mb'] = (peak - current['memory']) / 2**20
+    profile['phases'].append(record)
+    profile['current'] = None
+
+
+def mark(profile, phase):
+    # Ends the running phase (if any) and starts `phase`
+    if profile is None:
+        return
+    now = time.perf_counter()
+    _close(profile, now)
+    current = {'phase': phase, 'started': now, 'cells': 0}
+    if profile['trace_memory']:
+        tracemalloc.reset_peak()
+        current['memory'] = tracemalloc.get_traced_memory()[0]
+    profile['current'] = current
+
+
+def count_cells(profile, n):
+    if profile is not None and profile['current'] is not None:
+        profile['current']['cells'] += n
+
+
+def finish_profile(profile):
+    # Closes the last phase; returns (and keeps as profile['summary']) {'phases': [...], 'total_s', 'cells'},
+    # phases in build order
+    _close(profile, time.perf_counter())
+    if profile['started_tracing']:
+        tracemalloc.stop()
+        profile['started_tracing'] = False
+    profile['summary'] = {
+        'phases': profile['phases'],
+        'total_s': time.perf_counter() - profile['started'],
+        'cells': sum(p['cells'] for p in profile['phases']),
+    }
+    return profile['summary']
+
+
+def log_profile(summary, **context):
+    # One structured line per build: "workbook_build {json}" with the phases and any context (digest, options)
+    payload = dict(context, total_s=round(summary['total_s'], 4), cells=summary['cells'],
+                   phases={p['phase']: {k: round(v, 4) if isinstance(v, float) else v for k, v in p.items() if k != 'phase'}
+                           for p in summary['phases']})
+    logger.info("workbook_build %s", json.dumps(payload))  # phases stay in build order
@@ -0,0 +1,51 @@
+from copy import copy
+
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, NamedStyle, PatternFill
+from openpyxl.styles.fonts import DEFAULT_FONT
+
+# --- NAMED STYLES ---
+# Each workbook registers its cell styles once as NamedStyles (headers, bold labels and one per number
+# format) and every cell is stamped with a copy of the registered style's array. Assigning a Font,
+# PatternFill or number format per cell looks it up in the workbook's style tables every time (headers
+# paid that three times per cell); stamping is a small array copy. The styles also show up by name in
+# Excel's Cell Styles gallery, so edits to the sheets can reuse them.
+
+HEADER_FILL = "4F81BD"
+
+# Number styles of the monthly builder: style name -> number format
+NUMBER_STYLES = {
+    "Currency": '#,##0.00', "Percent": '0.00%', "Count": '#,##0', "Ratio": '0.00', "Months": '0.0', "Whole Number": '0',
+}
+
+
+def register_styles(wb, number_styles=NUMBER_STYLES):
+    # Adds the styles to wb; returns {'header', 'header_left', 'label', number format: ...} -> style array
+    # (number_styles: {style name: number format})
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color=HEADER_FILL, end_color=HEADER_FILL, fill_type="solid")
+    named = {
+        'header': NamedStyle(name="Model Header", font=header_font, fill=header_fill, alignment=Alignment(horizontal='center')),
+        'header_left': NamedStyle(name="Model Header (Left)", font=header_font, fill=header_fill),
+        'label': NamedStyle(name="Model Label", font=Font(bold=True)),
+    }
+    for name, fmt in number_styles.items():
+        # NamedStyle's own default is a blank Font; number cells keep the workbook's Calibri 11
+        named[fmt] = NamedStyle(name=f"Model {name}", font=copy(DEFAULT_FONT), number_format=fmt)
+    styles = {}
+    for key, style in named.items():
+        wb.add_named_style(style)
+        styles[key] = style.as_tuple()
+    return styles
+
+
+def apply_style(cell, style):
+    # Stamps a registered style (None: left unstyled); returns the cell
+    if style is not None:
+        cell._style = copy(style)
+    return cell
+
+
+def styled_cell(ws, value, style):
+    # A write-only cell carrying a registered style
+    return apply_style(WriteOnlyCell(ws, value=value), style)
@@ -0,0 +1,48 @@
+import re
+
+import numpy as np
+
+# --- COLUMN WIDTH MODEL ---
+# Widths are decided before a write-only sheet streams its first row, so they come from what will be
+# written rather than from a pass over the finished cells: the known value and number format of each
+# Assumptions driver, and engine-computed values for the formula sheets. A column only needs its
+# largest and most negative value formatted (display width grows with magnitude), so sizing costs
+# O(rows) array reductions plus two string formats per column.
+
+PADDING = 2
+GENERAL_WIDTH = 11  # Excel's General format shows at most ~11 characters of a number
+
+
+def _spec(fmt):
+    # Python format spec rendering an Excel number format's text length ('#,##0.00' -> '{:,.2f}', '0.0%' -> '{:.1%}')
+    decimals = re.search(r'\.(0+)', fmt)
+    return "{:" + ("," if "," in fmt else "") + f".{len(decimals.group(1)) if decimals else 0}" + ("%" if fmt.endswith('%') else "f") + "}"
+
+
+def text_width(value, fmt=None):
+    # Displayed length of one value under an Excel number format (None: General)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return len(str(value))
+    if fmt is None:
+        return min(len(str(value)), GENERAL_WIDTH)
+    return len(_spec(fmt).format(value))
+
+
+def column_widths(rows, n_cols, minimum=0):
+    # Widest displayed value per column, plus padding. rows: (values, fmt) pairs, values of shape (..., n_cols)
+    # (batched results, e.g. one entry per scenario, count towards the same columns); NaN cells are skipped.
+    # minimum: a width or one per column (e.g. the header labels)
+    widths = np.full(n_cols, minimum)
+    by_format = {}
+    for values, fmt in rows:
+        by_format.setdefault(fmt, []).append(np.asarray(values, dtype=float).reshape(-1, n_cols))
+    for fmt, blocks in by_format.items():
+        stacked = np.vstack(blocks)
+        finite = np.isfinite(stacked)
+        if not finite.any():
+            continue
+        high = np.where(finite, stacked, -np.inf).max(axis=0)
+        low = np.where(finite, stacked, np.inf).min(axis=0)
+        for j in np.flatnonzero(finite.any(axis=0)):
+            widths[j] = max(widths[j], text_width(float(high[j]), fmt), text_width(float(low[j]), fmt))
+    return [int(w) + PADDING for w in widths]
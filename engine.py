@@ -0,0 +1,444 @@
+import functools
+
+import numpy as np
+
+import schema
+from timeline import state_timeline
+
+# --- NATIVE PROJECTION ENGINE ---
+# Computes the Month Model / KPIs rows that model_builder.generate_excel() writes as formulas,
+# directly in NumPy. Every driver may be a plain number or an array of shape (batch,):
+# results then come back as (batch, periods) so many scenarios are evaluated in one pass.
+# Periods may be months, quarters or years (periods_per_year = 12 / 4 / 1); customer drivers stay monthly.
+# Every row is one line of the model schema (schema.py): project() runs each line's calculation in the
+# order of the schema's dependency graph, the same graph the workbook's formulas are written from.
+
+
+def extract_drivers(state, scen, include_kpis=True):
+    # Reads the session-state dicts (any mapping with the same keys) for one scenario,
+    # using the same fallbacks as generate_excel(). Without include_kpis, or in a state with no
+    # kpi_assumptions (fms3mPlus.py), the customer drivers are left out and so are the KPI lines
+    tax = state['tax_assumptions']
+    wc = state['wc_assumptions']
+    fin = state['financing_assumptions']
+
+    drivers = {
+        'tax_rate': tax['tax_rate'][scen],
+        'tax_timing': 0 if tax['payment_timing'] == "Immediate" else 1,
+        'beg_nol': tax['nol_balance'],
+        'beg_cash': wc['beginning_cash'],
+        'ar_pct': wc['ar_percent'][scen],
+        'ap_pct': wc['ap_percent'][scen],
+        'dr_pct': wc['deferred_rev_percent'][scen],
+        'dio': wc['days_inventory'][scen],
+        'dpo': wc['days_payable'][scen],
+        'equity': fin['equity_raised'][scen],
+        'debt': fin['debt_issued'][scen],
+        'debt_int': fin['debt_interest_rate'][scen],
+        'cash_int': fin['cash_interest_rate'][scen],
+        'od_int': fin['overdraft_interest_rate'][scen],
+        'debt_term': fin['debt_repayment_term'][scen],
+        'maint_capex': state['capex_assumptions'].get('maintenance_pct', {}).get(scen, 0.02),
+    }
+    kpi = state.get('kpi_assumptions') if include_kpis else None
+    if kpi:
+        drivers.update({
+            'start_cust': kpi['starting_customers'][scen],
+            'new_cust': kpi['new_customers_monthly'][scen],
+            'churn_rate': kpi['churn_rate_monthly'][scen],
+            'sm_opex_items': list(kpi.get('sm_opex_items', [])),
+        })
+
+    drivers['revenue'] = []
+    for item in state['revenue_items']:
+        drivers['revenue'].append({
+            'name': item['name'],
+            'start': item['value'][scen],
+            'growth_y1': item.get('growth_y1', {}).get(scen, 0.10),
+            'growth_y2': item.get('growth_y2', {}).get(scen, 0.07),
+            'growth_y3': item.get('growth_y3', {}).get(scen, 0.04),
+        })
+
+    drivers['cogs'] = []
+    for item in state['cogs_items']:
+        drivers['cogs'].append({'name': item['name'], 'type': item['type'], 'val': item['value'][scen]})
+
+    drivers['opex'] = []
+    for item in state['opex_items']:
+        d = {'name': item['name'], 'type': item['type']}
+        if item['type'] == "Fixed Amount":
+            d['val'] = item['value'][scen]
+            d['growth'] = item.get('param2', {}).get(scen, 0.0)
+        elif item['type'] == "% of Rev":
+            d['val'] = item['value'][scen]
+        elif item['type'] == "Personnel":
+            d['count'] = item['value'][scen]
+            d['salary'] = item.get('param2', {}).get(scen, 0.0)
+            d['threshold'] = item.get('revenue_threshold', {}).get(scen, 50000.0) if item.get('revenue_threshold') else None
+        drivers['opex'].append(d)
+
+    drivers['capex'] = []
+    for item in state['capex_items']:
+        drivers['capex'].append({
+            'name': item['name'],
+            'cost': item['cost'][scen],
+            'rate': item.get('deprec_rate', {}).get(scen, 0.20),
+        })
+
+    return drivers
+
+
+def get_driver(drivers, path):
+    # path: keys / list indexes into the drivers dict, e.g. ('revenue', 0, 'growth_y1')
+    for p in path:
+        drivers = drivers[p]
+    return drivers
+
+
+def set_driver(drivers, path, value):
+    get_driver(drivers, path[:-1])[path[-1]] = value
+
+
+def _col(x):
+    # Scalar or (batch,) driver -> array that broadcasts against the period axis
+    return np.asarray(x, dtype=float)[..., None]
+
+
+def _div(num, den, cond):
+    # IF(cond, num/den, 0) without evaluating the division where cond is false
+    num, den, cond = np.broadcast_arrays(np.asarray(num, dtype=float), np.asarray(den, dtype=float), cond)
+    return np.divide(num, den, out=np.zeros(num.shape), where=cond)
+
+
+def _change(rows, shape):
+    # Current minus previous period, with an implicit zero before Period 1
+    rows = np.broadcast_to(rows, shape)
+    return rows - np.concatenate([np.zeros(shape[:-1] + (1,)), rows[..., :-1]], axis=-1)
+
+
+def _total(group):
+    # Group total: its items summed in sheet order
+    return lambda v, d, x: sum((v[(group, i)] for i in range(len(d[group]))), x['zeros'])
+
+
+def _revenue(v, d, x, i):
+    # Period 1 = Start/periods_per_year, then per-period compounding of the annual growth for that year
+    item = d['revenue'][i]
+    year, ppy = x['year'], x['ppy']
+    growth = np.where(year == 0, _col(item['growth_y1']), np.where(year == 1, _col(item['growth_y2']), _col(item['growth_y3'])))
+    factor = np.where(x['first'], 1.0, (1 + growth) ** (1 / ppy))
+    return _col(item['start']) / ppy * np.cumprod(factor, axis=-1)
+
+
+def _cogs(v, d, x, i):
+    item = d['cogs'][i]
+    if item['type'] == "% of Rev":
+        return v['total_rev'] * _col(item['val'])
+    return _col(item['val']) / x['ppy'] + x['zeros']
+
+
+def _opex(v, d, x, i):
+    item = d['opex'][i]
+    ppy = x['ppy']
+    if item['type'] == "Fixed Amount":
+        return _col(item['val']) / ppy * (1 + _col(item['growth'])) ** (x['t'] / ppy)
+    if item['type'] == "% of Rev":
+        return v['total_rev'] * _col(item['val'])
+    if item['type'] == "Personnel":
+        if item.get('threshold') is not None:
+            # One extra hire per full threshold of monthly revenue above Period 1
+            total_rev = v['total_rev']
+            with np.errstate(divide='ignore', invalid='ignore'):
+                hires = np.floor(np.maximum(0, total_rev - total_rev[..., :1]) / (_col(item['threshold']) * x['months']))
+            return (_col(item['count']) + hires) * _col(item['salary']) / ppy
+        return _col(item['count']) * _col(item['salary']) / ppy + x['zeros']
+    return x['zeros']
+
+
+def _customers(v, d, x):
+    # Customer drivers are monthly: the count follows Cust[m] = Cust[m-1] + New - Cust[m-1]*Churn month by
+    # month and is read at the end of each period (closed form with Cust[0] = Starting Customers)
+    months = x['months']
+    churn = _col(d['churn_rate'])
+    n_months = x['shape'][-1] * months
+    m = np.arange(n_months)
+    kept_new = np.cumsum(np.broadcast_to((1 - churn) ** m, x['shape'][:-1] + (n_months,)), axis=-1)
+    return (_col(d['start_cust']) * (1 - churn) ** (m + 1) + _col(d['new_cust']) * kept_new)[..., months-1::months]
+
+
+def _rev_growth(v, d, x):
+    # YoY growth is only defined from Year 2 ("N/A" in the workbook)
+    ppy = x['ppy']
+    rev = np.broadcast_to(v['total_rev'], x['shape'])
+    growth = np.full(x['shape'], np.nan)
+    prior = rev[..., :-ppy]
+    growth[..., ppy:] = _div(rev[..., ppy:] - prior, prior, prior > 0)
+    return growth
+
+
+# Per-group item calculations: (values, drivers, context, item index) -> row
+ITEM_CALCS = {'revenue': _revenue, 'cogs': _cogs, 'opex': _opex}
+
+# Line key (schema.py) -> calculation (values so far by line key, drivers, context) -> row, vectorised along
+# periods (and the batch). Rows reading their own earlier periods use closed forms or cumulative sums
+CALCS = {
+    # P&L
+    'total_rev': _total('revenue'), 'total_cogs': _total('cogs'), 'total_opex': _total('opex'),
+    'gross_profit': lambda v, d, x: v['total_rev'] - v['total_cogs'],
+    'ebitda': lambda v, d, x: v['gross_profit'] - v['total_opex'],
+    'deprec': lambda v, d, x: x['zeros'] + sum((_col(a['cost']) * _col(a['rate']) for a in d['capex']), x['zeros']) / x['ppy'],
+    'ebit': lambda v, d, x: v['ebitda'] - v['deprec'],
+    'int_exp': lambda v, d, x: v['debt'] * _col(d['debt_int']) / x['ppy'],
+    # Balance Sheet
+    'ar': lambda v, d, x: v['total_rev'] * _col(d['ar_pct']),
+    'inv': lambda v, d, x: (v['total_cogs'] / x['days']) * _col(d['dio']),
+    'fa': lambda v, d, x: -np.cumsum(np.broadcast_to(v['capex'], x['shape']), axis=-1),
+    'ad': lambda v, d, x: -np.cumsum(np.broadcast_to(v['deprec'], x['shape']), axis=-1),
+    'total_assets': lambda v, d, x: v['cash'] + v['ar'] + v['inv'] + v['fa'] + v['ad'],
+    'ap': lambda v, d, x: (v['total_cogs'] / x['days']) * _col(d['dpo']),
+    'dr': lambda v, d, x: v['total_rev'] * _col(d['dr_pct']),
+    # Straight-line repayment of the original principal from Period 2 onwards
+    'debt': lambda v, d, x: _col(d['debt']) - np.cumsum(v['repay'], axis=-1),
+    'cs': lambda v, d, x: np.broadcast_to(_col(d['beg_cash']) + _col(d['equity']), x['shape']),
+    're': lambda v, d, x: np.cumsum(v['ni'], axis=-1),
+    'total_le': lambda v, d, x: v['ap'] + v['dr'] + v['tp'] + v['debt'] + v['cs'] + v['re'],
+    # Cash Flow
+    'cf_deprec': lambda v, d, x: v['deprec'],
+    'chg_ar': lambda v, d, x: -_change(v['ar'], x['shape']),
+    'chg_inv': lambda v, d, x: -_change(v['inv'], x['shape']),
+    'chg_ap': lambda v, d, x: _change(v['ap'], x['shape']),
+    'chg_dr': lambda v, d, x: _change(v['dr'], x['shape']),
+    'capex': lambda v, d, x: np.where(x['first'], -(sum((_col(a['cost']) for a in d['capex']), x['zeros']) + v['total_rev'] * _col(d['maint_capex'])),
+                                      -v['total_rev'] * _col(d['maint_capex'])),
+    'stock_iss': lambda v, d, x: np.where(x['first'], _col(d['beg_cash']) + _col(d['equity']), 0.0),
+    'debt_iss': lambda v, d, x: np.where(x['first'], _col(d['debt']), 0.0),
+    'repay': lambda v, d, x: np.where(x['first'], 0.0, _div(_col(d['debt']), _col(d['debt_term']) * x['ppy'], _col(d['debt_term']) > 0)),
+    # KPIs: MRR, CAC and GP per customer are per month
+    'cust_count': _customers,
+    'mrr': lambda v, d, x: v['total_rev'] / x['months'],
+    'sm_spend': lambda v, d, x: sum((v[('opex', i)] for i, item in enumerate(d['opex']) if item['name'] in d.get('sm_opex_items', [])), x['zeros']),
+    'cac': lambda v, d, x: _div(v['sm_spend'], _col(d['new_cust']) * x['months'], _col(d['new_cust']) > 0),
+    'gm_pct': lambda v, d, x: _div(v['gross_profit'], v['total_rev'], v['total_rev'] > 0),
+    'arpa': lambda v, d, x: _div(v['mrr'], v['cust_count'], v['cust_count'] > 0),
+    'ltv': lambda v, d, x: _div(v['arpa'] * v['gm_pct'], _col(d['churn_rate']), _col(d['churn_rate']) > 0),
+    'ltv_cac': lambda v, d, x: _div(v['ltv'], v['cac'], v['cac'] > 0),
+    'gp_per_cust': lambda v, d, x: _div(v['gross_profit'] / x['months'], v['cust_count'], v['cust_count'] > 0),
+    'cac_payback': lambda v, d, x: _div(v['cac'], v['gp_per_cust'], v['gp_per_cust'] > 0),
+    'rev_growth': _rev_growth,
+    'ebitda_margin': lambda v, d, x: _div(v['ebitda'], v['total_rev'], v['total_rev'] > 0),
+    'rule40': lambda v, d, x: v['rev_growth'] + v['ebitda_margin'],
+}
+
+
+def _cash_block(v, d, x, inflows):
+    # The interest / tax / cash recurrence: interest is driven by the prior period's cash (Beginning Cash
+    # in Period 1), so one pass over periods suffices. inflows: the Net Cash Flow rows computed outside it
+    shape, n_periods = x['shape'], x['shape'][-1]
+    ebit_b = np.broadcast_to(v['ebit'], shape)
+    int_exp_b = np.broadcast_to(v['int_exp'], shape)
+    ncf_other_b = np.broadcast_to(inflows, shape)
+    od_rate = np.asarray(d['od_int'], dtype=float) / x['ppy']
+    cash_rate = np.asarray(d['cash_int'], dtype=float) / x['ppy']
+    tax_rate = np.asarray(d['tax_rate'], dtype=float)
+    deferred_tax = np.asarray(d['tax_timing']) != 0
+
+    od_int, int_inc, ebt, nol_beg, taxable, nol_end, tax, tp, chg_tp, ni, ncf, cash = (np.zeros(shape) for _ in range(12))
+    interest_base = np.broadcast_to(np.asarray(d['beg_cash'], dtype=float), shape[:-1])
+    nol = np.broadcast_to(np.asarray(d['beg_nol'], dtype=float), shape[:-1])
+    tp_prev = np.zeros(shape[:-1])
+    cash_prev = np.zeros(shape[:-1])
+    for k in range(n_periods):
+        od_int[..., k] = np.where(interest_base < 0, np.abs(interest_base) * od_rate, 0.0)
+        int_inc[..., k] = np.where(interest_base > 0, interest_base * cash_rate, 0.0)
+        ebt_k = ebit_b[..., k] - int_exp_b[..., k] - od_int[..., k] + int_inc[..., k]
+        ebt[..., k] = ebt_k
+        nol_beg[..., k] = nol
+        taxable[..., k] = np.maximum(0, ebt_k - nol)
+        nol = np.where(ebt_k < 0, nol - ebt_k, np.maximum(0, nol - ebt_k))
+        nol_end[..., k] = nol
+        tax[..., k] = taxable[..., k] * tax_rate
+        tp[..., k] = np.where(deferred_tax, tp_prev + tax[..., k], 0.0)
+        chg_tp[..., k] = tp[..., k] - tp_prev
+        tp_prev = tp[..., k]
+        ni[..., k] = ebt_k - tax[..., k]
+        ncf[..., k] = ni[..., k] + chg_tp[..., k] + ncf_other_b[..., k]
+        cash_prev = cash_prev + ncf[..., k]
+        cash[..., k] = cash_prev
+        interest_base = cash_prev
+    return {'od_int': od_int, 'int_inc': int_inc, 'ebt': ebt, 'nol_beg': nol_beg, 'taxable_inc': taxable,
+            'nol_end': nol_end, 'tax': tax, 'ni': ni, 'cf_ni': ni, 'tp': tp, 'chg_tp': chg_tp, 'ncf': ncf,
+            'cash': cash, 'ending_cash': cash}
+
+
+# Circular steps of the schema graph (lines feeding each other across periods): the line that names them
+# -> calculation of all of them at once, period by period
+BLOCK_CALCS = {'ncf': _cash_block}
+
+# Evaluation plans kept by _plan(), least recently used dropped first: the signature holds the item
+# names, so every renamed line item makes a new one
+PLAN_CACHE_SIZE = 64
+
+
+def _signature(drivers):
+    # What the schema depends on: the line items' names, types and thresholds, the S&M items and
+    # whether there are KPI drivers at all
+    items = tuple((group, tuple((item['name'], item.get('type'), item.get('threshold') is not None) for item in drivers[group]))
+                  for group in ('revenue', 'cogs', 'opex', 'capex'))
+    return items, tuple(drivers.get('sm_opex_items', [])), 'start_cust' in drivers
+
+
+def evaluation_plan(drivers):
+    # The schema's evaluation plan for this model structure (cached): {'order': [(step keys, block key
+    # or None)], 'graph', 'lines'}
+    return _plan(_signature(drivers))
+
+
+@functools.lru_cache(maxsize=PLAN_CACHE_SIZE)
+def _plan(key):
+    # Plan of a _signature(): the structure is rebuilt from it, so nothing else can leak into the cache
+    structure = {group: [{'name': name, 'type': kind, 'threshold': True if threshold else None}
+                         for name, kind, threshold in items] for group, items in key[0]}
+    structure['sm_opex_items'] = list(key[1])
+    kpi_lines = [(k, label, True) for k, label in schema.KPI_LINES] if key[2] else []
+    lines = schema.model_lines(structure) + kpi_lines
+    graph = schema.dependency_graph(schema.model_specs(structure, include_kpis=key[2]), lines)
+    order = []
+    for step in schema.evaluation_order(graph):
+        block = next((name for name in BLOCK_CALCS if name in step), None) if len(step) > 1 else None
+        if len(step) > 1 and block is None:
+            raise ValueError(f"no calculation for the circular lines {step}")
+        order.append((step, block))
+    return {'order': order, 'graph': graph, 'lines': [line[0] for line in lines if line]}
+
+
+def _leaves(value, path=()):
+    # (driver path, value) of every numeric driver
+    if isinstance(value, dict):
+        for k, v in value.items():
+            yield from _leaves(v, path + (k,))
+    elif isinstance(value, list):
+        for i, v in enumerate(value):
+            yield from _leaves(v, path + (i,))
+    elif not isinstance(value, (str, type(None))):
+        yield path, value
+
+
+def _batch_shape(leaves):
+    # Broadcast shape of the numeric drivers
+    return np.broadcast_shapes((), *{value.shape for value in leaves if isinstance(value, np.ndarray)})
+
+
+def _same(a, b):
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return b is not None and np.shape(a) == np.shape(b) and np.array_equal(a, b)
+    return a == b
+
+
+def _reusable(cache, plan, shape, periods_per_year, leaves):
+    # Lines of a cached run that the driver changes since can't have affected: {line key: row}
+    if cache.get('plan') is not plan or cache.get('shape') != shape or cache.get('ppy') != periods_per_year:
+        return {}
+    before = cache['drivers']
+    changed = {path for path, value in leaves.items() if not _same(value, before.get(path))}
+    stale = schema.downstream(plan['graph'], drivers=changed)
+    return {key: row for key, row in cache['values'].items() if key not in stale}
+
+
+def project(drivers, n_periods=36, periods_per_year=12, rows=None, cache=None):
+    # Evaluates the schema's lines in dependency order. rows: engine result names to return (e.g. only
+    # 'cash' and 'net_income'); lines that none of them depend on are skipped. Default: every row.
+    # cache: a dict kept between calls (e.g. one per app session and scenario). A call reuses the cached
+    # rows that no driver changed since the last call can reach (schema.downstream) and recomputes only
+    # the rest; cache['recomputed'] lists the lines it evaluated
+    plan = evaluation_plan(drivers)
+    leaves = dict(_leaves(drivers))
+    shape = _batch_shape(leaves.values()) + (n_periods,)
+    reuse = {}
+    if cache is not None:
+        leaves = {path: np.copy(value) if isinstance(value, np.ndarray) else value for path, value in leaves.items()}
+        reuse = _reusable(cache, plan, shape, periods_per_year, leaves)
+    t = np.arange(n_periods)
+    months = 12 // periods_per_year
+    x = {
+        'shape': shape, 'zeros': np.zeros(n_periods), 't': t, 'year': t // periods_per_year, 'first': (t == 0),
+        'ppy': periods_per_year, 'months': months,
+        'days': 30 * months,  # Inventory / AP use "Approx 30 days/month" like the workbook
+    }
+    needed = None
+    if rows is not None:
+        wanted = set(rows)
+        keys = [key for key, name in schema.ENGINE_ROWS.items() if name in wanted]
+        keys += [(group, i) for group, (header, total, result) in schema.GROUPS.items() if result in wanted
+                 for i in range(len(drivers[group]))]
+        needed = schema.upstream(plan['graph'], keys)
+
+    v = {}
+    recomputed = []
+    for step, block in plan['order']:
+        if needed is not None and not needed.intersection(step):
+            continue
+        if all(key in reuse for key in step):
+            v.update((key, reuse[key]) for key in step)
+            continue
+        recomputed += step
+        if block:
+            # Rows of the block's Net Cash Flow computed before it, in sheet order
+            deps = plan['graph'][block]['same']
+            inflows = sum((v[key] for key in plan['lines'] if key in deps and key not in step), x['zeros'])
+            v.update(BLOCK_CALCS[block](v, drivers, x, inflows))
+        elif isinstance(step[0], tuple):
+            v[step[0]] = ITEM_CALCS[step[0][0]](v, drivers, x, step[0][1])
+        else:
+            v[step[0]] = CALCS[step[0]](v, drivers, x)
+    # Read-only (batch, periods) views; reused rows keep the views of the cached run
+    views = cache.get('views', {}) if reuse else {}
+    views = {key: views[key] if key in reuse and key in views else np.broadcast_to(row, shape) for key, row in v.items()}
+    if cache is not None:
+        cache.update(plan=plan, shape=shape, ppy=periods_per_year, drivers=leaves, values=v, views=views, recomputed=recomputed)
+
+    result = {name: views[key] for key, name in schema.ENGINE_ROWS.items() if key in views}
+    for group, (header, total, name) in schema.GROUPS.items():
+        if all((group, i) in views for i in range(len(drivers[group]))):
+            # In item order rather than by name: two items may share a name
+            result[name] = [views[(group, i)] for i in range(len(drivers[group]))]
+    if rows is not None:
+        result = {name: series for name, series in result.items() if name in rows}
+    return result
+
+
+def stack_drivers(driver_sets):
+    # Several scenarios' drivers (same line items) -> one drivers dict whose numbers are (len(driver_sets),)
+    # arrays; names, types and other non-numeric entries come from the first set
+    first = driver_sets[0]
+    if isinstance(first, dict):
+        return {k: stack_drivers([d[k] for d in driver_sets]) for k in first}
+    if isinstance(first, list):
+        return [stack_drivers([d[i] for d in driver_sets]) for i in range(len(first))]
+    if isinstance(first, (str, type(None))):
+        return first
+    return np.array(driver_sets, dtype=float)
+
+
+def annual(series, periods_per_year, is_sum=True):
+    # (..., periods) -> (..., years): each year's sum, or its last period for balances; a partial final year included
+    n_years = -(-series.shape[-1] // periods_per_year)
+    chunks = [series[..., y*periods_per_year:(y+1)*periods_per_year] for y in range(n_years)]
+    return np.stack([c.sum(axis=-1) if is_sum else c[..., -1] for c in chunks], axis=-1)
+
+
+def compute_model(state, scen, timeline=None, cache=None, include_kpis=True):
+    # cache: see project(); keep one per scenario so an edit only recomputes what it affects
+    timeline = timeline or state_timeline(state)
+    return project(extract_drivers(state, scen, include_kpis), timeline['n_periods'], timeline['periods_per_year'], cache=cache)
+
+
+def compute_scenarios(state, scens, timeline=None, include_kpis=True):
+    # Every listed scenario in one batched pass: result rows come back as (len(scens), periods)
+    timeline = timeline or state_timeline(state)
+    drivers = stack_drivers([extract_drivers(state, scen, include_kpis) for scen in scens])
+    return project(drivers, timeline['n_periods'], timeline['periods_per_year'])
+
+
+def scenario_result(result, i):
+    # The i-th scenario of a compute_scenarios() result, shaped like compute_model()'s
+    return {key: [series[i] for series in value] if isinstance(value, list) else value[i] for key, value in result.items()}
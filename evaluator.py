@@ -0,0 +1,483 @@
+import argparse
+import math
+import re
+import sys
+from io import BytesIO
+
+from openpyxl import load_workbook
+from openpyxl.utils import column_index_from_string, get_column_letter
+
+from schema import components
+
+# --- IN-PROCESS FORMULA EVALUATOR ---
+# Computes every cell of a workbook emitted by generate_excel() without Excel.
+# Formulas are compiled to Python closures, the precedent graph is split into strongly
+# connected components (Tarjan) and evaluated in topological order; only components that
+# contain a circular reference are iterated, with the workbook's iterateCount / iterateDelta.
+
+
+class ExcelError(Exception):
+    # Error values (#DIV/0!, #VALUE!, ...) propagate through formulas like in Excel
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
+    def __eq__(self, other):
+        return isinstance(other, ExcelError) and other.code == self.code
+
+    def __hash__(self):
+        return hash(self.code)
+
+    def __repr__(self):
+        return self.code
+
+
+TOKEN = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<string>"(?:[^"]|"")*")
+  | (?P<ref>(?:(?:'(?:[^']|'')+'|[A-Za-z_][\w.]*)!)?\$?[A-Z]{1,3}\$?[0-9]+(?::\$?[A-Z]{1,3}\$?[0-9]+)?)(?![\w(])
+  | (?P<func>[A-Z][A-Z0-9.]*)(?=\()
+  | (?P<bool>TRUE|FALSE)(?![\w(])
+  | (?P<number>(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+)(?:[eE][+-]?[0-9]+)?)
+  | (?P<op><=|>=|<>|[-+*/^&=<>(),])
+""", re.VERBOSE)
+
+COMPARE = {'=': '==', '<>': '!=', '<': '<', '>': '>', '<=': '<=', '>=': '>='}
+
+
+def _tokenize(formula):
+    tokens = []
+    pos = 0
+    while pos < len(formula):
+        m = TOKEN.match(formula, pos)
+        if not m:
+            raise ValueError(f"Cannot parse formula at {formula[pos:]!r}")
+        pos = m.end()
+        if m.lastgroup != 'ws':
+            tokens.append((m.lastgroup, m.group()))
+    return tokens
+
+
+def _split_ref(text, sheet):
+    if '!' in text:
+        name, text = text.rsplit('!', 1)
+        sheet = name[1:-1].replace("''", "'") if name.startswith("'") else name
+    return sheet, text.replace('$', '')
+
+
+def _expand(sheet, area):
+    # 'B2:C3' -> [(sheet, 'B2'), (sheet, 'C2'), (sheet, 'B3'), (sheet, 'C3')]
+    if ':' not in area:
+        return [(sheet, area)]
+    start, end = area.split(':')
+    c1, r1 = re.match(r"([A-Z]+)([0-9]+)", start).groups()
+    c2, r2 = re.match(r"([A-Z]+)([0-9]+)", end).groups()
+    cols = range(min(column_index_from_string(c1), column_index_from_string(c2)), max(column_index_from_string(c1), column_index_from_string(c2)) + 1)
+    rows = range(min(int(r1), int(r2)), max(int(r1), int(r2)) + 1)
+    return [(sheet, f"{get_column_letter(c)}{r}") for r in rows for c in cols]
+
+
+class _Parser:
+    # Recursive descent over Excel precedence: comparison < & < +- < */ < ^ < unary minus
+    def __init__(self, formula, sheet):
+        self.tokens = _tokenize(formula)
+        self.pos = 0
+        self.sheet = sheet
+        self.refs = []
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, value=None):
+        kind, text = self.peek()
+        if kind is None or (value is not None and text != value):
+            raise ValueError(f"Expected {value!r}, found {text!r}")
+        self.pos += 1
+        return kind, text
+
+    def parse(self):
+        expr = self.comparison()
+        if self.pos != len(self.tokens):
+            raise ValueError(f"Unexpected token {self.peek()[1]!r}")
+        return expr
+
+    def comparison(self):
+        left = self.concat()
+        while self.peek()[1] in COMPARE:
+            op = COMPARE[self.take()[1]]
+            left = f"_cmp({left}, {self.concat()}, '{op}')"
+        return left
+
+    def concat(self):
+        left = self.additive()
+        while self.peek()[1] == '&':
+            self.take()
+            left = f"(_text({left}) + _text({self.additive()}))"
+        return left
+
+    def additive(self):
+        left = self.multiplicative()
+        while self.peek()[1] in ('+', '-'):
+            op = self.take()[1]
+            left = f"(_num({left}) {op} _num({self.multiplicative()}))"
+        return left
+
+    def multiplicative(self):
+        left = self.power()
+        while self.peek()[1] in ('*', '/'):
+            op = self.take()[1]
+            right = self.power()
+            left = f"(_num({left}) * _num({right}))" if op == '*' else f"_div({left}, {right})"
+        return left
+
+    def power(self):
+        left = self.unary()
+        while self.peek()[1] == '^':
+            self.take()
+            left = f"_pow({left}, {self.unary()})"
+        return left
+
+    def unary(self):
+        if self.peek()[1] in ('-', '+'):
+            op = self.take()[1]
+            return f"({op}_num({self.unary()}))"
+        return self.primary()
+
+    def primary(self):
+        kind, text = self.take()
+        if kind == 'number':
+            return repr(float(text))
+        if kind == 'string':
+            return repr(text[1:-1].replace('""', '"'))
+        if kind == 'bool':
+            return 'True' if text == 'TRUE' else 'False'
+        if kind == 'ref':
+            sheet, area = _split_ref(text, self.sheet)
+            keys = _expand(sheet, area)
+            self.refs.extend(keys)
+            if len(keys) == 1:
+                return f"_ref({keys[0]!r})"
+            return f"_range({keys!r})"
+        if kind == 'func':
+            self.take('(')
+            args = []
+            if self.peek()[1] != ')':
+                args.append(self.comparison())
+                while self.peek()[1] == ',':
+                    self.take()
+                    args.append(self.comparison())
+            self.take(')')
+            if text == 'IF':
+                # Lazy branches: the unused branch may hold an error (e.g. a division by zero)
+                if len(args) == 2:
+                    args.append('False')
+                return f"({args[1]} if _truthy({args[0]}) else {args[2]})"
+            if text not in FUNCTIONS:
+                raise NotImplementedError(f"Unsupported function {text}")
+            return f"_fn_{text}({', '.join(args)})"
+        if text == '(':
+            expr = self.comparison()
+            self.take(')')
+            return expr
+        raise ValueError(f"Unexpected token {text!r}")
+
+
+# --- RUNTIME HELPERS (names referenced by the compiled formulas) ---
+def _num(v):
+    if isinstance(v, ExcelError):
+        raise v
+    if v is None:
+        return 0.0
+    if isinstance(v, bool):
+        return float(v)
+    if isinstance(v, (int, float)):
+        return v
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        raise ExcelError('#VALUE!')
+
+
+def _text(v):
+    if isinstance(v, ExcelError):
+        raise v
+    if v is None:
+        return ''
+    if isinstance(v, bool):
+        return 'TRUE' if v else 'FALSE'
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return str(v)
+
+
+def _truthy(v):
+    if isinstance(v, str):
+        raise ExcelError('#VALUE!')
+    return bool(_num(v))
+
+
+def _div(a, b):
+    a, b = _num(a), _num(b)
+    if b == 0:
+        raise ExcelError('#DIV/0!')
+    return a / b
+
+
+def _pow(a, b):
+    a, b = _num(a), _num(b)
+    try:
+        result = a ** b
+    except ZeroDivisionError:
+        raise ExcelError('#DIV/0!')
+    if isinstance(result, complex):
+        raise ExcelError('#NUM!')
+    return result
+
+
+def _cmp(a, b, op):
+    for v in (a, b):
+        if isinstance(v, ExcelError):
+            raise v
+    a = 0.0 if a is None else a
+    b = 0.0 if b is None else b
+    if isinstance(a, str) != isinstance(b, str):
+        # Excel orders every number before every string
+        a, b = isinstance(a, str), isinstance(b, str)
+    elif isinstance(a, str):
+        a, b = a.lower(), b.lower()
+    return {'==': a == b, '!=': a != b, '<': a < b, '>': a > b, '<=': a <= b, '>=': a >= b}[op]
+
+
+def _numbers(args):
+    # Range arguments skip text and blanks; direct arguments must be numeric
+    for arg in args:
+        if isinstance(arg, list):
+            for v in arg:
+                if isinstance(v, ExcelError):
+                    raise v
+                if isinstance(v, (int, float)) and not isinstance(v, bool):
+                    yield v
+        else:
+            yield _num(arg)
+
+
+def _fn_SUM(*args):
+    return sum(_numbers(args))
+
+
+def _fn_MAX(*args):
+    return max(_numbers(args), default=0.0)
+
+
+def _fn_MIN(*args):
+    return min(_numbers(args), default=0.0)
+
+
+def _fn_AVERAGE(*args):
+    values = list(_numbers(args))
+    if not values:
+        raise ExcelError('#DIV/0!')
+    return sum(values) / len(values)
+
+
+def _fn_ABS(x):
+    return abs(_num(x))
+
+
+def _fn_FLOOR(x, significance=1.0):
+    x, significance = _num(x), _num(significance)
+    if significance == 0:
+        raise ExcelError('#DIV/0!')
+    if x > 0 and significance < 0:
+        raise ExcelError('#NUM!')
+    return math.floor(x / significance) * significance
+
+
+def _fn_ROUND(x, digits=0):
+    x, digits = _num(x), int(_num(digits))
+    # Excel rounds half away from zero
+    factor = 10 ** digits
+    return math.copysign(math.floor(abs(x) * factor + 0.5) / factor, x)
+
+
+def _fn_AND(*args):
+    return all(bool(v) for v in _numbers(args))
+
+
+def _fn_OR(*args):
+    return any(bool(v) for v in _numbers(args))
+
+
+def _fn_NOT(x):
+    return not _truthy(x)
+
+
+def _fn_CHOOSE(index, *values):
+    # The index is truncated like Excel's; 1 picks the first value
+    i = int(_num(index))
+    if not 1 <= i <= len(values):
+        raise ExcelError('#VALUE!')
+    return values[i - 1]
+
+
+FUNCTIONS = {name[4:] for name in list(globals()) if name.startswith('_fn_')}
+RUNTIME = {name: obj for name, obj in globals().items() if name.startswith('_fn_') or name in ('_num', '_text', '_truthy', '_div', '_pow', '_cmp')}
+
+
+def _load(source):
+    if isinstance(source, (bytes, bytearray)):
+        return load_workbook(BytesIO(source))
+    if isinstance(source, str):
+        return load_workbook(source)
+    return source
+
+
+def evaluate_workbook(source, max_iterations=None, tolerance=None):
+    # source: openpyxl Workbook (formulas, not data_only), path or .xlsx bytes.
+    # Returns {'values': {(sheet, coord): value}, 'iterations': max iterations used by any
+    # circular component, 'cyclic_components': [sizes], 'converged': bool, 'cells': formula count}
+    wb = _load(source)
+    if max_iterations is None:
+        max_iterations = (wb.calculation.iterateCount or 100) if wb.calculation.iterate else 1
+    if tolerance is None:
+        tolerance = wb.calculation.iterateDelta or 0.001
+
+    values = {}
+    compiled = {}
+    graph = {}
+    sheet_order = {title: i for i, title in enumerate(wb.sheetnames)}
+
+    def _ref(key):
+        v = values.get(key)
+        if isinstance(v, ExcelError):
+            raise v
+        return v
+
+    def _range(keys):
+        return [values.get(key) for key in keys]
+
+    env = dict(RUNTIME, _ref=_ref, _range=_range)
+    for ws in wb.worksheets:
+        for row in ws.iter_rows():
+            for cell in row:
+                key = (ws.title, cell.coordinate)
+                v = cell.value
+                if isinstance(v, str) and v.startswith('=') and len(v) > 1:
+                    parser = _Parser(v[1:], ws.title)
+                    code = parser.parse()
+                    compiled[key] = eval(f"lambda: {code}", env)
+                    graph[key] = parser.refs
+                    values[key] = 0.0
+                elif v is not None:
+                    values[key] = v
+
+    def compute(key):
+        try:
+            v = compiled[key]()
+        except ExcelError as e:
+            return e
+        except ZeroDivisionError:
+            return ExcelError('#DIV/0!')
+        except (TypeError, ValueError, OverflowError):
+            return ExcelError('#VALUE!')
+        return 0.0 if v is None else v
+
+    def position(key):
+        col, row = re.match(r"([A-Z]+)([0-9]+)", key[1]).groups()
+        return sheet_order[key[0]], int(row), column_index_from_string(col)
+
+    cyclic = []
+    iterations = 0
+    converged = True
+    for component in components(graph):
+        if len(component) == 1 and component[0] not in graph[component[0]]:
+            values[component[0]] = compute(component[0])
+            continue
+        # Circular block: Gauss-Seidel sweeps in sheet/row/column order until the largest change < tolerance
+        component.sort(key=position)
+        cyclic.append(len(component))
+        used = 0
+        settled = False
+        while used < max_iterations and not settled:
+            used += 1
+            settled = True
+            for key in component:
+                old = values.get(key)
+                new = compute(key)
+                values[key] = new
+                if isinstance(new, (int, float)) and isinstance(old, (int, float)):
+                    if abs(new - old) >= tolerance:
+                        settled = False
+                elif new != old:
+                    settled = False
+        iterations = max(iterations, used)
+        converged = converged and settled
+
+    return {
+        'values': values,
+        'iterations': iterations,
+        'cyclic_components': cyclic,
+        'converged': converged,
+        'cells': len(compiled),
+    }
+
+
+def compare_cached_values(source, evaluation, rel_tol=1e-6, abs_tol=1e-6, uncached=None):
+    # Checks the cached values stored in an export against a fresh evaluation;
+    # returns [(sheet, coord, cached, evaluated)] for every mismatch. Formulas saved without
+    # a cached value (exports built without values) are not mismatches: they are skipped,
+    # and their (sheet, coord) appended to uncached when a list is given
+    data = source if isinstance(source, (bytes, bytearray)) else open(source, 'rb').read()
+    formulas = load_workbook(BytesIO(data))
+    cached = load_workbook(BytesIO(data), data_only=True)
+    mismatches = []
+    for ws in formulas.worksheets:
+        for row in ws.iter_rows():
+            for cell in row:
+                if not (isinstance(cell.value, str) and cell.value.startswith('=')):
+                    continue
+                key = (ws.title, cell.coordinate)
+                stored = cached[ws.title][cell.coordinate].value
+                computed = evaluation['values'].get(key)
+                if isinstance(stored, (int, float)) and isinstance(computed, (int, float)):
+                    if math.isclose(stored, computed, rel_tol=rel_tol, abs_tol=abs_tol):
+                        continue
+                elif stored == computed or (stored is None and isinstance(computed, ExcelError)):
+                    continue
+                elif stored is None:
+                    if uncached is not None:
+                        uncached.append(key)
+                    continue
+                mismatches.append((ws.title, cell.coordinate, stored, computed))
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate a generated financial model workbook without Excel")
+    parser.add_argument('workbooks', nargs='+', help=".xlsx files to evaluate")
+    parser.add_argument('--check-cached', action='store_true', help="fail if stored cached values disagree with the evaluation")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for path in args.workbooks:
+        evaluation = evaluate_workbook(path)
+        errors = sum(isinstance(v, ExcelError) for v in evaluation['values'].values())
+        print(f"{path}: {evaluation['cells']} formulas, {len(evaluation['cyclic_components'])} circular blocks, "
+              f"{evaluation['iterations']} iterations, converged={evaluation['converged']}, {errors} error cells")
+        if not evaluation['converged']:
+            failed = True
+        if args.check_cached:
+            uncached = []
+            mismatches = compare_cached_values(path, evaluation, uncached=uncached)
+            for sheet, coord, stored, computed in mismatches[:20]:
+                print(f"  {sheet}!{coord}: cached {stored!r} != evaluated {computed!r}")
+            if uncached:
+                print(f"  {len(uncached)} formulas have no cached value (not checked)")
+            if mismatches:
+                print(f"  {len(mismatches)} cached values differ")
+                failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
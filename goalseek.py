@@ -0,0 +1,79 @@
+import copy
+
+import numpy as np
+
+from engine import extract_drivers, project, set_driver
+from timeline import state_timeline
+
+# --- GOAL SEEK ---
+# Solves for an input on the native engine instead of guess-and-download. Each bracketing pass evaluates a
+# whole row of candidates as one batched project() call and keeps the interval where the target is first
+# met, so an answer to the dollar takes a handful of engine calls (a few milliseconds).
+
+SEARCH_POINTS = 33  # candidates per pass: the bracket shrinks 32x per engine call
+MAX_PASSES = 20
+EXPANSIONS = 48  # upper bound search: hi, 2hi, 4hi, ... in one batch
+
+FUNDING_DRIVERS = {'equity': "Equity Raised", 'debt': "Debt Issued"}
+
+
+def _evaluate(base, timeline, apply, xs, measure):
+    drivers = copy.deepcopy(base)
+    apply(drivers, xs)
+    return measure(project(drivers, timeline['n_periods'], timeline['periods_per_year']))
+
+
+def minimum_input(base, timeline, apply, measure, target, lo, hi, tol):
+    # Smallest x >= lo (to within tol) with measure(x) >= target, or None if no x up to hi * 2^EXPANSIONS gets there.
+    # apply(drivers, xs) writes the (n,) candidates into the drivers; measure(result) returns one value per candidate.
+    # The measure should rise with x; otherwise the first crossing on the search grid is returned.
+    if _evaluate(base, timeline, apply, np.array([lo]), measure)[0] >= target:
+        return lo
+    uppers = lo + (hi - lo) * 2.0 ** np.arange(EXPANSIONS)
+    met = _evaluate(base, timeline, apply, uppers, measure) >= target
+    if not met.any():
+        return None
+    k = int(met.argmax())
+    a, b = (lo if k == 0 else uppers[k-1]), uppers[k]
+    for _ in range(MAX_PASSES):
+        if b - a <= tol:
+            break
+        xs = np.linspace(a, b, SEARCH_POINTS)
+        met = _evaluate(base, timeline, apply, xs, measure) >= target
+        i = int(met.argmax())  # met[-1] holds (b met the target), so i >= 1
+        a, b = xs[i-1], xs[i]
+    return float(b)
+
+
+def minimum_funding(state, scen, source='equity', cash_floor=0.0, tol=1.0):
+    # Least equity raised / debt issued ($, to within tol) that keeps cash >= cash_floor in every period,
+    # other drivers at the scenario value; None if no amount does (e.g. debt repaid within the horizon)
+    tl = state_timeline(state)
+    base = extract_drivers(state, scen)
+    hi = max(abs(float(base['beg_cash'])), 10000.0)
+    return minimum_input(
+        base, tl, lambda d, xs: set_driver(d, (source,), xs),
+        lambda r: r['cash'].min(axis=-1), cash_floor, 0.0, hi, tol)
+
+
+def breakeven_month(state, scen, row='net_income'):
+    # First month whose period value of an engine row (net_income, ebitda, net_cash_flow, ...) is >= 0; None if never
+    tl = state_timeline(state)
+    series = project(extract_drivers(state, scen), tl['n_periods'], tl['periods_per_year'])[row]
+    hit = np.flatnonzero(series >= 0)
+    return int(hit[0] + 1) * tl['months_per_period'] if hit.size else None
+
+
+def required_growth(state, scen, month, row='net_income', tol=1e-4):
+    # Least annual growth, applied to Y1-Y3 of every revenue item, that brings `row` to >= 0 in the given month
+    tl = state_timeline(state)
+    base = extract_drivers(state, scen)
+    period = -(-int(month) // tl['months_per_period']) - 1
+    if not 0 <= period < tl['n_periods']:
+        raise ValueError(f"month {month} is outside the {tl['horizon_months']} month horizon")
+
+    def apply(drivers, xs):
+        for item in drivers['revenue']:
+            for y in ('growth_y1', 'growth_y2', 'growth_y3'):
+                item[y] = xs
+    return minimum_input(base, tl, apply, lambda r: r[row][..., period], 0.0, -0.99, 1.0, tol)
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+# --- LINE ITEM TABLES ---
+# Revenue, COGS, OpEx and CapEx items are edited as one table per category (the app's st.data_editor)
+# instead of a row of widgets per item: one row per item, one column per driver and scenario shown.
+# An edit comes back as the whole DataFrame and is checked and converted column by column; only the
+# write-back into the state's item dicts walks the items.
+
+OPEX_TYPES = ["Fixed Amount", "% of Rev", "Personnel"]
+COGS_TYPES = ["% of Rev", "Fixed Amount"]
+
+# Category (state key) -> (type options, default type), for categories whose items have a type
+LINE_TYPES = {'cogs_items': (COGS_TYPES, '% of Rev'), 'opex_items': (OPEX_TYPES, 'Fixed Amount')}
+
+# Category -> per-scenario fields: (item key, column label, default, shown in %). "Shown in %" is
+# True / False, or the item types it applies to (an OpEx value is a % for "% of Rev", $ otherwise)
+LINE_FIELDS = {
+    'revenue_items': [
+        ('value', "Year 1 Value ($)", 0.0, False),
+        ('growth_y1', "Y1 Growth (%)", 0.10, True),
+        ('growth_y2', "Y2 Growth (%)", 0.07, True),
+        ('growth_y3', "Y3 Growth (%)", 0.04, True),
+    ],
+    'cogs_items': [
+        ('value', "% of Rev / Fixed ($)", 0.10, {'% of Rev'}),
+    ],
+    'opex_items': [
+        ('value', "Fixed ($) / % of Rev / Headcount", 5000.0, {'% of Rev'}),
+        ('param2', "Growth (%) / Avg Salary ($/yr)", 0.0, {'Fixed Amount'}),
+        ('revenue_threshold', "Revenue per New Hire ($)", 50000.0, False),
+    ],
+    'capex_items': [
+        ('cost', "Cost ($)", 1000.0, False),
+        ('deprec_rate', "Deprec Rate (%)", 0.20, True),
+    ],
+}
+
+
+# Hidden column of an editor table: the row's position in the stored items. The editor's own index
+# can't tell rows apart (a row added after deleting the last one gets the deleted row's index), so
+# stored items are matched on this, and added rows, which leave it blank, start from the defaults
+ITEM_ID = "_item"
+
+
+def column_name(label, scen):
+    return f"{label} [{scen}]"
+
+
+def _scale(types, pct, n):
+    # Per-row display factor of a field: 100 where it is shown as a percentage
+    if isinstance(pct, bool):
+        return np.full(n, 100.0 if pct else 1.0)
+    return np.where(np.isin(types, list(pct)), 100.0, 1.0)
+
+
+def items_frame(items, category, scenarios):
+    # Editor table of a category: the hidden ITEM_ID, Name, Type (COGS / OpEx), then each field once per scenario
+    n = len(items)
+    data = {ITEM_ID: np.arange(n), 'Name': [item['name'] for item in items]}
+    types = None
+    if category in LINE_TYPES:
+        types = np.array([item.get('type', LINE_TYPES[category][1]) for item in items], dtype=object)
+        data['Type'] = types
+    for field, label, default, pct in LINE_FIELDS[category]:
+        scale = _scale(types, pct, n)
+        for scen in scenarios:
+            values = np.array([item.get(field, {}).get(scen, default) for item in items], dtype=float)
+            data[column_name(label, scen)] = values * scale
+    return pd.DataFrame(data)
+
+
+def frame_items(df, items, category, scenarios, all_scenarios):
+    # Items of an edited items_frame() table. Rows without a name are dropped, repeated names get a
+    # " (2)", " (3)" suffix, unknown types and blank or non-numeric cells take the defaults, and
+    # percentages go back to fractions. A row carrying an item's ITEM_ID keeps that item's other keys
+    # and its values for the scenarios not shown; added rows start from the defaults
+    names = df['Name'].fillna('').astype(str).str.strip()
+    keep = (names != '').to_numpy()
+    df, names = df[keep], names[keep]
+    repeat = names.groupby(names).cumcount()
+    names = names.where(repeat == 0, names + " (" + (repeat + 1).astype(str) + ")").tolist()
+    n = len(df)
+    ids = pd.to_numeric(df[ITEM_ID], errors='coerce').to_numpy(dtype=float)
+    ids = np.where(np.isfinite(ids) & (ids >= 0) & (ids < len(items)), ids, -1).astype(int).tolist()
+
+    types = None
+    if category in LINE_TYPES:
+        options, default = LINE_TYPES[category]
+        types = df['Type'].where(df['Type'].isin(options), default).to_numpy()
+    columns = {}
+    for field, label, default, pct in LINE_FIELDS[category]:
+        scale = _scale(types, pct, n)
+        for scen in scenarios:
+            values = pd.to_numeric(df[column_name(label, scen)], errors='coerce').to_numpy(dtype=float)
+            # Rounded so that a % shown as 7.000000000000001 comes back as 0.07
+            columns[field, scen] = np.where(np.isfinite(values), np.round(values / scale, 12), default).tolist()
+
+    out = []
+    for row, index in enumerate(ids):
+        old = items[index] if index >= 0 else {}
+        item = {**old, 'name': names[row]}
+        if types is not None:
+            item['type'] = types[row]
+        for field, label, default, pct in LINE_FIELDS[category]:
+            item[field] = {**{s: default for s in all_scenarios}, **old.get(field, {}),
+                           **{scen: columns[field, scen][row] for scen in scenarios}}
+        out.append(item)
+    return out
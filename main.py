@@ -1,12 +1,22 @@
 import streamlit as st
 import pandas as pd
-from io import BytesIO
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.utils import get_column_letter
+import json
+from model_builder import default_state, scenario_names, state_digest, workbook_bytes
+import altair as alt
+import numpy as np
+import os
+from buildprofile import configure_logging, start_profile
+from line_items import ITEM_ID, LINE_TYPES, frame_items, items_frame
+from goalseek import FUNDING_DRIVERS, breakeven_month, minimum_funding, required_growth
+from montecarlo import DISTRIBUTIONS, METRICS, base_values, cash_shortfall_probability, percentile_table, simulate
+from scenarios import clone_scenario, diff_scenarios, remove_scenario, scenario_outputs, scenario_store, write_scenario
+from sensitivity import DEFAULT_PCT, OUTPUTS, driver_values, grid_sweep, grid_values, ranked, sensitivity
+from statements import KPI_PCT_ROWS, KPI_RATIO_ROWS, statement_tables
+from timeline import GRANULARITIES, state_timeline
 
 # Set up the Streamlit page (must be the first command)
 st.set_page_config(layout="wide")  # Use the full width of the screen
+configure_logging()  # One "workbook_build" line per build on stderr
 
 # Hide Streamlit menu, footer, and prevent code inspection
 st.markdown("""
@@ -31,1000 +41,140 @@ st.markdown("""
     """, unsafe_allow_html=True)
 
 # --- GLOBAL VARIABLES ---
-SCENARIOS = ["Base", "Optimistic", "Pessimistic"]
-periods = [f"Month {i+1}" for i in range(36)]
+EXCEL_CACHE_MAX_ENTRIES = 64  # LRU bound on cached .xlsx files (shared across sessions)
+STATEMENT_CACHE_MAX_ENTRIES = 256  # LRU bound on cached live statement tables
+SIMULATION_CACHE_MAX_ENTRIES = 16  # LRU bound on cached Monte Carlo runs
+SIMULATION_PATHS = [1000, 5000, 10000, 25000, 50000, 100000]
+GRID_MAX_STEPS = 100  # per axis
+# Build profile panel: MODEL_DEBUG=1 in the environment or ?debug=1 in the URL
+DEBUG_PANEL = os.environ.get('MODEL_DEBUG') == '1' or st.query_params.get('debug') == '1'
 
 # --- SESSION STATE INITIALIZATION ---
 if 'scenario_to_edit' not in st.session_state:
     st.session_state.scenario_to_edit = "Base"
-if 'scenario_to_run' not in st.session_state:
-    st.session_state.scenario_to_run = "Base"
-
-def init_scenario_val(val):
-    return {s: val for s in SCENARIOS}
-
-if 'revenue_items' not in st.session_state:
-    st.session_state.revenue_items = [
-        {'name': 'Product Sales', 'value': init_scenario_val(100000.0), 
-         'growth_y1': init_scenario_val(0.10), 'growth_y2': init_scenario_val(0.07), 'growth_y3': init_scenario_val(0.04)},
-        {'name': 'Service Revenue', 'value': init_scenario_val(50000.0), 
-         'growth_y1': init_scenario_val(0.05), 'growth_y2': init_scenario_val(0.03), 'growth_y3': init_scenario_val(0.02)}
-    ]
-    
-if 'cogs_items' not in st.session_state:
-    st.session_state.cogs_items = [
-        {'name': 'Hosting Costs', 'value': init_scenario_val(0.20), 'type': '% of Rev'},
-        {'name': 'Support Staff', 'value': init_scenario_val(20000.0), 'type': 'Fixed Amount'}
-    ]
-
-if 'opex_items' not in st.session_state:
-    st.session_state.opex_items = [
-        {'name': 'Marketing', 'value': init_scenario_val(10000.0), 'type': 'Fixed Amount', 'param2': init_scenario_val(0.05)},
-        {'name': 'Sales Team', 'value': init_scenario_val(2.0), 'type': 'Personnel', 'param2': init_scenario_val(60000.0), 'revenue_threshold': init_scenario_val(50000.0)}
-    ]
-
-if 'capex_items' not in st.session_state:
-    st.session_state.capex_items = [
-        {'name': 'Servers', 'cost': init_scenario_val(50000.0), 'deprec_rate': init_scenario_val(0.20)},
-        {'name': 'Laptops', 'cost': init_scenario_val(10000.0), 'deprec_rate': init_scenario_val(0.33)}
-    ]
-
-if 'tax_assumptions' not in st.session_state:
-    st.session_state.tax_assumptions = {
-        'tax_rate': init_scenario_val(0.25),
-        'payment_timing': 'Immediate',
-        'nol_balance': 0.0
-    }
-
-if 'wc_assumptions' not in st.session_state:
-    st.session_state.wc_assumptions = {
-        'beginning_cash': 50000.0,
-        'ar_percent': init_scenario_val(0.10),
-        'ap_percent': init_scenario_val(0.10),
-        'deferred_rev_percent': init_scenario_val(0.0),
-        'days_inventory': init_scenario_val(30.0),
-        'days_payable': init_scenario_val(30.0)
-    }
-
-if 'financing_assumptions' not in st.session_state:
-    st.session_state.financing_assumptions = {
-        'equity_raised': init_scenario_val(0.0),
-        'debt_issued': init_scenario_val(0.0),
-        'debt_interest_rate': init_scenario_val(0.05),
-        'cash_interest_rate': init_scenario_val(0.02),
-        'overdraft_interest_rate': init_scenario_val(0.10),
-        'debt_repayment_term': init_scenario_val(5)
-    }
-
-if 'capex_assumptions' not in st.session_state:
-    st.session_state.capex_assumptions = {
-        'maintenance_pct': init_scenario_val(0.02)  # 2% of revenue per month
-    }
-
-if 'kpi_assumptions' not in st.session_state:
-    st.session_state.kpi_assumptions = {
-        'starting_customers': init_scenario_val(100.0),  # Initial customer count
-        'new_customers_monthly': init_scenario_val(10.0),  # New customers per month
-        'churn_rate_monthly': init_scenario_val(0.02),  # 2% monthly churn
-        'sm_opex_items': ['Marketing', 'Sales Team']  # Default S&M items
-    }
-
-# --- EXCEL GENERATION FUNCTION ---
-def generate_excel():
-    wb = Workbook()
-    # Enable Iterative Calculation for Circular References
-    wb.calculation.iterate = True
-    wb.calculation.iterateCount = 100
-    wb.calculation.iterateDelta = 0.001
-    
-    scen = st.session_state.scenario_to_run
-    
-    # 1. Assumptions Sheet
-    ws_assump = wb.active
-    ws_assump.title = "Assumptions"
-    
-    # Styles
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
-    bold_font = Font(bold=True)
-    currency_fmt = '#,##0.00'
-    pct_fmt = '0.00%'
-    
-    ws_assump.append(["Category", "Driver", "Value", "Notes"])
-    for cell in ws_assump[1]:
-        cell.font = header_font
-        cell.fill = header_fill
-    
-    row_idx = 2
-    refs = {} 
-    
-    def add_assump(category, driver, value, fmt=None, key=None):
-        nonlocal row_idx
-        ws_assump.cell(row=row_idx, column=1, value=category)
-        ws_assump.cell(row=row_idx, column=2, value=driver)
-        c = ws_assump.cell(row=row_idx, column=3, value=value)
-        if fmt: c.number_format = fmt
-        ref = f"Assumptions!$C${row_idx}"
-        if key: refs[key] = ref
-        row_idx += 1
-        return ref
-
-    # Global Assumptions
-    add_assump("Global", "Tax Rate", st.session_state.tax_assumptions['tax_rate'][scen], pct_fmt, 'tax_rate')
-    add_assump("Global", "Tax Payment (0=Imm, 1=NextYr)", 0 if st.session_state.tax_assumptions['payment_timing'] == "Immediate" else 1, None, 'tax_timing')
-    refs['beg_nol'] = add_assump("Global", "NOL Beginning Balance", st.session_state.tax_assumptions['nol_balance'], currency_fmt)
-    
-    # Working Capital
-    add_assump("Working Capital", "Beginning Cash", st.session_state.wc_assumptions['beginning_cash'], currency_fmt, 'beg_cash')
-    add_assump("Working Capital", "AR % of Rev", st.session_state.wc_assumptions['ar_percent'][scen], pct_fmt, 'ar_pct')
-    add_assump("Working Capital", "AP % of OpEx", st.session_state.wc_assumptions['ap_percent'][scen], pct_fmt, 'ap_pct')
-    add_assump("Working Capital", "Deferred Rev %", st.session_state.wc_assumptions['deferred_rev_percent'][scen], pct_fmt, 'dr_pct')
-    add_assump("Working Capital", "Days Inventory Outstanding (DIO)", st.session_state.wc_assumptions['days_inventory'][scen], None, 'dio')
-    add_assump("Working Capital", "Days Payable Outstanding (DPO)", st.session_state.wc_assumptions['days_payable'][scen], None, 'dpo')
-    
-    # Financing
-    add_assump("Financing", "Equity Raised", st.session_state.financing_assumptions['equity_raised'][scen], currency_fmt, 'equity')
-    add_assump("Financing", "Debt Issued", st.session_state.financing_assumptions['debt_issued'][scen], currency_fmt, 'debt')
-    add_assump("Financing", "Debt Interest Rate", st.session_state.financing_assumptions['debt_interest_rate'][scen], pct_fmt, 'debt_int')
-    add_assump("Financing", "Cash Interest Rate", st.session_state.financing_assumptions['cash_interest_rate'][scen], pct_fmt, 'cash_int')
-    add_assump("Financing", "Overdraft Interest Rate", st.session_state.financing_assumptions['overdraft_interest_rate'][scen], pct_fmt, 'od_int')
-    add_assump("Financing", "Debt Repayment Term (Years)", st.session_state.financing_assumptions['debt_repayment_term'][scen], None, 'debt_term')
-
-    refs['revenue'] = {}
-    for item in st.session_state.revenue_items:
-        refs['revenue'][item['name']] = {}
-        refs['revenue'][item['name']]['start'] = add_assump("Revenue", f"{item['name']} - Start Value", item['value'][scen], currency_fmt)
-        refs['revenue'][item['name']]['growth_y1'] = add_assump("Revenue", f"{item['name']} - Y1 Growth", item.get('growth_y1', {}).get(scen, 0.10), pct_fmt)
-        refs['revenue'][item['name']]['growth_y2'] = add_assump("Revenue", f"{item['name']} - Y2 Growth", item.get('growth_y2', {}).get(scen, 0.07), pct_fmt)
-        refs['revenue'][item['name']]['growth_y3'] = add_assump("Revenue", f"{item['name']} - Y3 Growth", item.get('growth_y3', {}).get(scen, 0.04), pct_fmt)
-        
-    refs['cogs'] = {}
-    for item in st.session_state.cogs_items:
-        refs['cogs'][item['name']] = {}
-        if item['type'] == "% of Rev":
-            refs['cogs'][item['name']]['val'] = add_assump("COGS", f"{item['name']} - % of Rev", item['value'][scen], pct_fmt)
-        else:
-            refs['cogs'][item['name']]['val'] = add_assump("COGS", f"{item['name']} - Fixed Amt", item['value'][scen], currency_fmt)
-            
-    refs['opex'] = {}
-    for item in st.session_state.opex_items:
-        refs['opex'][item['name']] = {}
-        if item['type'] == "Fixed Amount":
-            refs['opex'][item['name']]['val'] = add_assump("OpEx", f"{item['name']} - Start Value", item['value'][scen], currency_fmt)
-            refs['opex'][item['name']]['growth'] = add_assump("OpEx", f"{item['name']} - Growth", item.get('param2', {}).get(scen, 0.0), pct_fmt)
-        elif item['type'] == "% of Rev":
-            refs['opex'][item['name']]['val'] = add_assump("OpEx", f"{item['name']} - % of Rev", item['value'][scen], pct_fmt)
-        elif item['type'] == "Personnel":
-            refs['opex'][item['name']]['count'] = add_assump("OpEx", f"{item['name']} - Headcount", item['value'][scen], None)
-            refs['opex'][item['name']]['salary'] = add_assump("OpEx", f"{item['name']} - Avg Salary", item.get('param2', {}).get(scen, 0.0), currency_fmt)
-            if item.get('revenue_threshold'):
-                refs['opex'][item['name']]['threshold'] = add_assump("OpEx", f"{item['name']} - Revenue Threshold ($)", item.get('revenue_threshold', {}).get(scen, 50000.0), currency_fmt)
-
-    refs['capex'] = {}
-    for item in st.session_state.capex_items:
-        refs['capex'][item['name']] = {}
-        refs['capex'][item['name']]['cost'] = add_assump("CapEx", f"{item['name']} - Cost", item['cost'][scen], currency_fmt)
-        refs['capex'][item['name']]['rate'] = add_assump("CapEx", f"{item['name']} - Deprec Rate", item.get('deprec_rate', {}).get(scen, 0.20), pct_fmt)
-    
-    # Maintenance CapEx
-    add_assump("CapEx", "Maintenance CapEx (% of Revenue)", st.session_state.capex_assumptions.get('maintenance_pct', {}).get(scen, 0.02), pct_fmt, 'maint_capex')
-
-    ws_assump.column_dimensions['A'].width = 20
-    ws_assump.column_dimensions['B'].width = 30
-    ws_assump.column_dimensions['C'].width = 15
-
-    # 2. Main Sheet
-    ws = wb.create_sheet("36 Month Model")
-    
-    headers = ["Item"] + periods
-    ws.append(headers)
-    for cell in ws[1]:
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal='center')
-    
-    row_idx = 2
-    
-    # --- P&L ---
-    ws.cell(row=row_idx, column=1, value="PROFIT & LOSS").font = bold_font
-    row_idx += 1
-    
-    # Revenue
-    ws.cell(row=row_idx, column=1, value="Revenue").font = bold_font
-    row_idx += 1
-    rev_start_row = row_idx
-    for item in st.session_state.revenue_items:
-        ws.cell(row=row_idx, column=1, value=item['name'])
-        start_ref = refs['revenue'][item['name']]['start']
-        growth_y1 = refs['revenue'][item['name']]['growth_y1']
-        growth_y2 = refs['revenue'][item['name']]['growth_y2']
-        growth_y3 = refs['revenue'][item['name']]['growth_y3']
-        for i, p in enumerate(periods):
-            col_letter = get_column_letter(i+2)
-            if i == 0:
-                ws.cell(row=row_idx, column=i+2, value=f"={start_ref}/12").number_format = currency_fmt
-            else:
-                prev_col = get_column_letter(i+1)
-                month_num = i + 1
-                formula = f"={prev_col}{row_idx}*((1+IF({month_num}<=12,{growth_y1},IF({month_num}<=24,{growth_y2},{growth_y3})))^(1/12))"
-                ws.cell(row=row_idx, column=i+2, value=formula).number_format = currency_fmt
-        row_idx += 1
-    
-    ws.cell(row=row_idx, column=1, value="Total Revenue").font = bold_font
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        ws.cell(row=row_idx, column=i+2, value=f"=SUM({col_letter}{rev_start_row}:{col_letter}{row_idx-1})").number_format = currency_fmt
-    total_rev_row = row_idx
-    row_idx += 1
-    
-    # COGS
-    ws.cell(row=row_idx, column=1, value="Cost of Goods Sold").font = bold_font
-    row_idx += 1
-    cogs_start_row = row_idx
-    for item in st.session_state.cogs_items:
-        ws.cell(row=row_idx, column=1, value=item['name'])
-        val_ref = refs['cogs'][item['name']]['val']
-        for i, p in enumerate(periods):
-            col_letter = get_column_letter(i+2)
-            if item['type'] == "% of Rev":
-                ws.cell(row=row_idx, column=i+2, value=f"={col_letter}{total_rev_row}*{val_ref}").number_format = currency_fmt
-            else:
-                ws.cell(row=row_idx, column=i+2, value=f"={val_ref}/12").number_format = currency_fmt
-        row_idx += 1
-        
-    ws.cell(row=row_idx, column=1, value="Total COGS").font = bold_font
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        ws.cell(row=row_idx, column=i+2, value=f"=SUM({col_letter}{cogs_start_row}:{col_letter}{row_idx-1})").number_format = currency_fmt
-    total_cogs_row = row_idx
-    row_idx += 1
-    
-    # Gross Profit
-    ws.cell(row=row_idx, column=1, value="Gross Profit").font = bold_font
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        ws.cell(row=row_idx, column=i+2, value=f"={col_letter}{total_rev_row}-{col_letter}{total_cogs_row}").number_format = currency_fmt
-    gross_profit_row = row_idx
-    row_idx += 2
-    
-    # OpEx
-    ws.cell(row=row_idx, column=1, value="Operating Expenses").font = bold_font
-    row_idx += 1
-    opex_start_row = row_idx
-    for item in st.session_state.opex_items:
-        ws.cell(row=row_idx, column=1, value=item['name'])
-        for i, p in enumerate(periods):
-            col_letter = get_column_letter(i+2)
-            if item['type'] == "Fixed Amount":
-                start_ref = refs['opex'][item['name']]['val']
-                growth_ref = refs['opex'][item['name']]['growth']
-                if i == 0:
-                    ws.cell(row=row_idx, column=i+2, value=f"={start_ref}/12").number_format = currency_fmt
-                else:
-                    prev_col = get_column_letter(i+1)
-                    ws.cell(row=row_idx, column=i+2, value=f"={prev_col}{row_idx}*((1+{growth_ref})^(1/12))").number_format = currency_fmt
-            elif item['type'] == "% of Rev":
-                val_ref = refs['opex'][item['name']]['val']
-                ws.cell(row=row_idx, column=i+2, value=f"={col_letter}{total_rev_row}*{val_ref}").number_format = currency_fmt
-            elif item['type'] == "Personnel":
-                count_ref = refs['opex'][item['name']]['count']
-                sal_ref = refs['opex'][item['name']]['salary']
-                if item.get('revenue_threshold'):
-                    thresh_ref = refs['opex'][item['name']].get('threshold', count_ref)
-                    formula = f"=(({count_ref}+FLOOR(MAX(0,{col_letter}{total_rev_row}-B{total_rev_row})/{thresh_ref},1))*{sal_ref})/12"
-                    ws.cell(row=row_idx, column=i+2, value=formula).number_format = currency_fmt
-                else:
-                    ws.cell(row=row_idx, column=i+2, value=f"=({count_ref}*{sal_ref})/12").number_format = currency_fmt
-        row_idx += 1
-        
-    ws.cell(row=row_idx, column=1, value="Total Opex").font = bold_font
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        ws.cell(row=row_idx, column=i+2, value=f"=SUM({col_letter}{opex_start_row}:{col_letter}{row_idx-1})").number_format = currency_fmt
-    total_opex_row = row_idx
-    row_idx += 1
-    
-    # EBITDA
-    ws.cell(row=row_idx, column=1, value="EBITDA").font = bold_font
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        ws.cell(row=row_idx, column=i+2, value=f"={col_letter}{gross_profit_row}-{col_letter}{total_opex_row}").number_format = currency_fmt
-    ebitda_row = row_idx
-    row_idx += 1
-    
-    # Depreciation
-    ws.cell(row=row_idx, column=1, value="Depreciation")
-    deprec_row = row_idx
-    # Formula: Sum(Cost * Rate) / 12 for monthly
-    deprec_formula_parts = []
-    for item in st.session_state.capex_items:
-        cost_ref = refs['capex'][item['name']]['cost']
-        rate_ref = refs['capex'][item['name']]['rate']
-        deprec_formula_parts.append(f"({cost_ref}*{rate_ref})")
-    
-    deprec_formula = "=(" + "+".join(deprec_formula_parts) + ")/12" if deprec_formula_parts else "=0"
-    
-    for i, p in enumerate(periods):
-        ws.cell(row=row_idx, column=i+2, value=deprec_formula).number_format = currency_fmt
-    row_idx += 1
-    
-    # EBIT
-    ws.cell(row=row_idx, column=1, value="EBIT").font = bold_font
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        ws.cell(row=row_idx, column=i+2, value=f"={col_letter}{ebitda_row}-{col_letter}{deprec_row}").number_format = currency_fmt
-    ebit_row = row_idx
-    row_idx += 1
-    
-    # Interest Expense (Debt * Rate / 12)
-    ws.cell(row=row_idx, column=1, value="Interest Expense (Debt)")
-    int_exp_row = row_idx
-    int_exp_cells = []
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        # Placeholder {DEBT_ROW}
-        cell = ws.cell(row=row_idx, column=i+2, value=f"={{DEBT_ROW}}*{refs['debt_int']}/12")
-        cell.number_format = currency_fmt
-        int_exp_cells.append(cell)
-    row_idx += 1
-
-    # Overdraft Interest (Cash < 0)
-    ws.cell(row=row_idx, column=1, value="Interest Expense (Overdraft)")
-    od_int_row = row_idx
-    od_int_cells = []
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        # Use Beginning Cash to avoid circular reference
-        # IF(Beg_Cash < 0, ABS(Beg_Cash) * Rate/12, 0)
-        if i == 0:
-            cell = ws.cell(row=row_idx, column=i+2, value=f"=IF({refs['beg_cash']}<0, ABS({refs['beg_cash']})*{refs['od_int']}/12, 0)")
-        else:
-            prev_col = get_column_letter(i+1)
-            cell = ws.cell(row=row_idx, column=i+2, value=f"=IF({prev_col}{{CASH_ROW}}<0, ABS({prev_col}{{CASH_ROW}})*{refs['od_int']}/12, 0)")
-        cell.number_format = currency_fmt
-        od_int_cells.append(cell)
-    row_idx += 1
-    
-    # Interest Income (Cash > 0)
-    ws.cell(row=row_idx, column=1, value="Interest Income")
-    int_inc_row = row_idx
-    int_inc_cells = []
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        # Use Beginning Cash to avoid circular reference
-        # IF(Beg_Cash > 0, Beg_Cash * Rate/12, 0)
-        if i == 0:
-            cell = ws.cell(row=row_idx, column=i+2, value=f"=IF({refs['beg_cash']}>0, {refs['beg_cash']}*{refs['cash_int']}/12, 0)")
-        else:
-            prev_col = get_column_letter(i+1)
-            cell = ws.cell(row=row_idx, column=i+2, value=f"=IF({prev_col}{{CASH_ROW}}>0, {prev_col}{{CASH_ROW}}*{refs['cash_int']}/12, 0)")
-        cell.number_format = currency_fmt
-        int_inc_cells.append(cell)
-    row_idx += 1
-    
-    # EBT
-    ws.cell(row=row_idx, column=1, value="EBT").font = bold_font
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        ws.cell(row=row_idx, column=i+2, value=f"={col_letter}{ebit_row}-{col_letter}{int_exp_row}-{col_letter}{od_int_row}+{col_letter}{int_inc_row}").number_format = currency_fmt
-    ebt_row = row_idx
-    row_idx += 1
-    
-    # Taxes (NOL Logic)
-    ws.cell(row=row_idx, column=1, value="NOL Beginning Balance")
-    nol_beg_row = row_idx
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        if i == 0:
-            ws.cell(row=row_idx, column=i+2, value=f"={refs['beg_nol']}").number_format = currency_fmt
-        else:
-            prev_col = get_column_letter(i+1)
-            ws.cell(row=row_idx, column=i+2, value=f"={prev_col}{row_idx+2}").number_format = currency_fmt
-    row_idx += 1
-    
-    ws.cell(row=row_idx, column=1, value="Taxable Income")
-    taxable_inc_row = row_idx
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        ws.cell(row=row_idx, column=i+2, value=f"=MAX(0, {col_letter}{ebt_row}-{col_letter}{nol_beg_row})").number_format = currency_fmt
-    row_idx += 1
-    
-    ws.cell(row=row_idx, column=1, value="NOL Ending Balance")
-    nol_end_row = row_idx
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        ws.cell(row=row_idx, column=i+2, value=f"=IF({col_letter}{ebt_row}<0, {col_letter}{nol_beg_row}-{col_letter}{ebt_row}, MAX(0, {col_letter}{nol_beg_row}-{col_letter}{ebt_row}))").number_format = currency_fmt
-    row_idx += 1
-    
-    ws.cell(row=row_idx, column=1, value="Income Tax")
-    tax_row = row_idx
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        ws.cell(row=row_idx, column=i+2, value=f"={col_letter}{taxable_inc_row}*{refs['tax_rate']}").number_format = currency_fmt
-    row_idx += 1
-    
-    # Net Income
-    ws.cell(row=row_idx, column=1, value="Net Income").font = bold_font
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        ws.cell(row=row_idx, column=i+2, value=f"={col_letter}{ebt_row}-{col_letter}{tax_row}").number_format = currency_fmt
-    ni_row = row_idx
-    row_idx += 3
-    
-    # --- BALANCE SHEET ---
-    ws.cell(row=row_idx, column=1, value="BALANCE SHEET").font = bold_font
-    row_idx += 1
-    
-    ws.cell(row=row_idx, column=1, value="Assets").font = bold_font
-    row_idx += 1
-    
-    ws.cell(row=row_idx, column=1, value="Cash & Equivalents")
-    cash_row = row_idx
-    # Update Interest Income cells
-    for cell in int_inc_cells:
-        if "{CASH_ROW}" in str(cell.value):
-            cell.value = cell.value.replace("{CASH_ROW}", str(cash_row))
-    # Update Overdraft Interest cells
-    for cell in od_int_cells:
-        if "{CASH_ROW}" in str(cell.value):
-            cell.value = cell.value.replace("{CASH_ROW}", str(cash_row))
-    row_idx += 1
-    
-    ws.cell(row=row_idx, column=1, value="Accounts Receivable")
-    ar_row = row_idx
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        ws.cell(row=row_idx, column=i+2, value=f"={col_letter}{total_rev_row}*{refs['ar_pct']}").number_format = currency_fmt
-    row_idx += 1
-    
-    ws.cell(row=row_idx, column=1, value="Inventory")
-    inv_row = row_idx
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        ws.cell(row=row_idx, column=i+2, value=f"=({col_letter}{total_cogs_row}/30)*{refs['dio']}").number_format = currency_fmt # Approx 30 days/month
-    row_idx += 1
-    
-    # Fixed Assets
-    ws.cell(row=row_idx, column=1, value="Fixed Assets (Gross)")
-    fa_row = row_idx
-    fa_cells = []
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        if i == 0:
-            cell = ws.cell(row=row_idx, column=i+2, value=f"=-{col_letter}{{CAPEX_ROW}}")
-        else:
-            prev_col = get_column_letter(i+1)
-            cell = ws.cell(row=row_idx, column=i+2, value=f"={prev_col}{row_idx}-{col_letter}{{CAPEX_ROW}}")
-        cell.number_format = currency_fmt
-        fa_cells.append(cell)
-    row_idx += 1
-    
-    ws.cell(row=row_idx, column=1, value="Accumulated Depreciation")
-    ad_row = row_idx
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        if i == 0:
-            ws.cell(row=row_idx, column=i+2, value=f"=-{col_letter}{deprec_row}").number_format = currency_fmt
-        else:
-            prev_col = get_column_letter(i+1)
-            ws.cell(row=row_idx, column=i+2, value=f"={prev_col}{row_idx}-{col_letter}{deprec_row}").number_format = currency_fmt
-    row_idx += 1
-    
-    ws.cell(row=row_idx, column=1, value="Total Assets").font = bold_font
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        ws.cell(row=row_idx, column=i+2, value=f"=SUM({col_letter}{cash_row}:{col_letter}{ad_row})").number_format = currency_fmt
-    row_idx += 2
-    
-    ws.cell(row=row_idx, column=1, value="Liabilities & Equity").font = bold_font
-    row_idx += 1
-    
-    ws.cell(row=row_idx, column=1, value="Accounts Payable")
-    ap_row = row_idx
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        ws.cell(row=row_idx, column=i+2, value=f"=({col_letter}{total_cogs_row}/30)*{refs['dpo']}").number_format = currency_fmt # Approx 30 days/month
-    row_idx += 1
-    
-    ws.cell(row=row_idx, column=1, value="Deferred Revenue")
-    dr_row = row_idx
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        ws.cell(row=row_idx, column=i+2, value=f"={col_letter}{total_rev_row}*{refs['dr_pct']}").number_format = currency_fmt
-    row_idx += 1
-    
-    ws.cell(row=row_idx, column=1, value="Tax Payable")
-    tp_row = row_idx
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        # Simplified: If Immediate, 0. If Next Year, accumulate.
-        # For monthly, "Next Year" is tricky. Let's assume "Deferred" means pay in Month 4 of next year or similar?
-        # For simplicity in this model: Immediate = 0, Deferred = Accumulate and never pay (needs logic) or pay in Month 13?
-        # Let's keep it simple: Deferred = Accumulate.
-        ws.cell(row=row_idx, column=i+2, value=f"=IF({refs['tax_timing']}=0, 0, {col_letter}{tax_row})").number_format = currency_fmt
-        # Note: This simple formula for deferred just sets it to current tax. Real deferred tax logic is complex.
-        # Let's improve: If Deferred, TP = Prev_TP + Tax_Exp.
-        if i == 0:
-             ws.cell(row=row_idx, column=i+2, value=f"=IF({refs['tax_timing']}=0, 0, {col_letter}{tax_row})").number_format = currency_fmt
-        else:
-             prev_col = get_column_letter(i+1)
-             ws.cell(row=row_idx, column=i+2, value=f"=IF({refs['tax_timing']}=0, 0, {prev_col}{row_idx}+{col_letter}{tax_row})").number_format = currency_fmt
-             
-    row_idx += 1
-    
-    ws.cell(row=row_idx, column=1, value="Long Term Debt")
-    debt_row = row_idx
-    # Update Interest Expense cells
-    for cell in int_exp_cells:
-        if "{DEBT_ROW}" in str(cell.value):
-            cell.value = cell.value.replace("{DEBT_ROW}", str(debt_row))
-            
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        if i == 0:
-             ws.cell(row=row_idx, column=i+2, value=f"={refs['debt']}").number_format = currency_fmt
-        else:
-             prev_col = get_column_letter(i+1)
-             ws.cell(row=row_idx, column=i+2, value=f"={prev_col}{row_idx}-{col_letter}{{REPAY_ROW}}").number_format = currency_fmt
-    row_idx += 1
-    
-    ws.cell(row=row_idx, column=1, value="Common Stock")
-    cs_row = row_idx
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        ws.cell(row=row_idx, column=i+2, value=f"={refs['beg_cash']}+{refs['equity']}").number_format = currency_fmt
-    row_idx += 1
-    
-    ws.cell(row=row_idx, column=1, value="Retained Earnings")
-    re_row = row_idx
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        if i == 0:
-            ws.cell(row=row_idx, column=i+2, value=f"={col_letter}{ni_row}").number_format = currency_fmt
-        else:
-            prev_col = get_column_letter(i+1)
-            ws.cell(row=row_idx, column=i+2, value=f"={prev_col}{re_row}+{col_letter}{ni_row}").number_format = currency_fmt
-    row_idx += 1
-    
-    ws.cell(row=row_idx, column=1, value="Total Liab & Equity").font = bold_font
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        ws.cell(row=row_idx, column=i+2, value=f"=SUM({col_letter}{ap_row}:{col_letter}{re_row})").number_format = currency_fmt
-    row_idx += 3
-    
-    # --- CASH FLOW ---
-    ws.cell(row=row_idx, column=1, value="CASH FLOW STATEMENT").font = bold_font
-    row_idx += 1
-    
-    ws.cell(row=row_idx, column=1, value="Cash from Operations").font = bold_font
-    row_idx += 1
-    cfo_start_row = row_idx
-    
-    ws.cell(row=row_idx, column=1, value="Net Income")
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        ws.cell(row=row_idx, column=i+2, value=f"={col_letter}{ni_row}").number_format = currency_fmt
-    row_idx += 1
-    
-    ws.cell(row=row_idx, column=1, value="Depreciation")
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        ws.cell(row=row_idx, column=i+2, value=f"={col_letter}{deprec_row}").number_format = currency_fmt
-    row_idx += 1
-    
-    ws.cell(row=row_idx, column=1, value="Change in AR")
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        if i == 0:
-            ws.cell(row=row_idx, column=i+2, value=f"=-{col_letter}{ar_row}").number_format = currency_fmt
-        else:
-            prev_col = get_column_letter(i+1)
-            ws.cell(row=row_idx, column=i+2, value=f"={prev_col}{ar_row}-{col_letter}{ar_row}").number_format = currency_fmt
-    row_idx += 1
-    
-    ws.cell(row=row_idx, column=1, value="Change in Inventory")
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        if i == 0:
-            ws.cell(row=row_idx, column=i+2, value=f"=-{col_letter}{inv_row}").number_format = currency_fmt
-        else:
-            prev_col = get_column_letter(i+1)
-            ws.cell(row=row_idx, column=i+2, value=f"={prev_col}{inv_row}-{col_letter}{inv_row}").number_format = currency_fmt
-    row_idx += 1
-    
-    ws.cell(row=row_idx, column=1, value="Change in AP")
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        if i == 0:
-            ws.cell(row=row_idx, column=i+2, value=f"={col_letter}{ap_row}").number_format = currency_fmt
-        else:
-            prev_col = get_column_letter(i+1)
-            ws.cell(row=row_idx, column=i+2, value=f"={col_letter}{ap_row}-{prev_col}{ap_row}").number_format = currency_fmt
-    row_idx += 1
-    
-    ws.cell(row=row_idx, column=1, value="Change in Deferred Rev")
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        if i == 0:
-            ws.cell(row=row_idx, column=i+2, value=f"={col_letter}{dr_row}").number_format = currency_fmt
-        else:
-            prev_col = get_column_letter(i+1)
-            ws.cell(row=row_idx, column=i+2, value=f"={col_letter}{dr_row}-{prev_col}{dr_row}").number_format = currency_fmt
-    row_idx += 1
-    
-    ws.cell(row=row_idx, column=1, value="Change in Tax Payable")
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        if i == 0:
-            ws.cell(row=row_idx, column=i+2, value=f"={col_letter}{tp_row}").number_format = currency_fmt
-        else:
-            prev_col = get_column_letter(i+1)
-            ws.cell(row=row_idx, column=i+2, value=f"={col_letter}{tp_row}-{prev_col}{tp_row}").number_format = currency_fmt
-    row_idx += 1
-    cfo_end_row = row_idx - 1
-    
-    ws.cell(row=row_idx, column=1, value="Cash from Investing").font = bold_font
-    row_idx += 1
-    cfi_start_row = row_idx
-    
-    ws.cell(row=row_idx, column=1, value="CapEx")
-    
-    # Update Fixed Assets formulas
-    for cell in fa_cells:
-        cell.value = cell.value.replace("{CAPEX_ROW}", str(row_idx))
-    
-    # Formula: Sum of Cost Assumptions.
-    capex_formula_parts = []
-    for item in st.session_state.capex_items:
-        capex_formula_parts.append(refs['capex'][item['name']]['cost'])
-    capex_formula = "(" + "+".join(capex_formula_parts) + ")" if capex_formula_parts else "0"
-    
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        if i == 0:
-            formula = f"=-({capex_formula}+{col_letter}{total_rev_row}*{refs['maint_capex']})"
-            ws.cell(row=row_idx, column=i+2, value=formula).number_format = currency_fmt
-        else:
-            formula = f"=-{col_letter}{total_rev_row}*{refs['maint_capex']}"
-            ws.cell(row=row_idx, column=i+2, value=formula).number_format = currency_fmt
-    row_idx += 1
-    cfi_end_row = row_idx - 1
-    
-    ws.cell(row=row_idx, column=1, value="Cash from Financing").font = bold_font
-    row_idx += 1
-    cff_start_row = row_idx
-    
-    ws.cell(row=row_idx, column=1, value="Issuance of Common Stock")
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        if i == 0:
-             ws.cell(row=row_idx, column=i+2, value=f"={refs['beg_cash']}+{refs['equity']}").number_format = currency_fmt
-        else:
-             ws.cell(row=row_idx, column=i+2, value=0).number_format = currency_fmt
-    row_idx += 1
-    
-    ws.cell(row=row_idx, column=1, value="Issuance of Debt")
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        if i == 0:
-             ws.cell(row=row_idx, column=i+2, value=f"={refs['debt']}").number_format = currency_fmt
-        else:
-             ws.cell(row=row_idx, column=i+2, value=0).number_format = currency_fmt
-    row_idx += 1
-    
-    ws.cell(row=row_idx, column=1, value="Debt Repayment")
-    repay_row = row_idx
-    
-    # Update Debt Row with Repayment Row
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        cell = ws.cell(row=debt_row, column=i+2)
-        if "{REPAY_ROW}" in str(cell.value):
-            cell.value = cell.value.replace("{REPAY_ROW}", str(repay_row))
-            
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        if i == 0:
-             ws.cell(row=row_idx, column=i+2, value=0).number_format = currency_fmt
-        else:
-             prev_col = get_column_letter(i+1)
-             # Repayment = Prev_Debt / (Term * 12) if Term > 0
-             ws.cell(row=row_idx, column=i+2, value=f"=IF({refs['debt_term']}>0, {refs['debt']}/({refs['debt_term']}*12), 0)").number_format = currency_fmt
-    row_idx += 1
-    
-    cff_end_row = row_idx - 1
-    
-    ws.cell(row=row_idx, column=1, value="Net Cash Flow").font = bold_font
-    ncf_row = row_idx
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        ws.cell(row=row_idx, column=i+2, value=f"=SUM({col_letter}{cfo_start_row}:{col_letter}{cfo_end_row})+SUM({col_letter}{cfi_start_row}:{col_letter}{cfi_end_row})+SUM({col_letter}{cff_start_row}:{col_letter}{cff_end_row})").number_format = currency_fmt
-    row_idx += 2
-    
-    ws.cell(row=row_idx, column=1, value="Ending Cash Balance").font = bold_font
-    ec_row = row_idx
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        if i == 0:
-             ws.cell(row=row_idx, column=i+2, value=f"=0+{col_letter}{ncf_row}").number_format = currency_fmt
-        else:
-             prev_col = get_column_letter(i+1)
-             ws.cell(row=row_idx, column=i+2, value=f"={prev_col}{row_idx}+{col_letter}{ncf_row}").number_format = currency_fmt
-             
-    # Link BS Cash
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        ws.cell(row=cash_row, column=i+2, value=f"={col_letter}{ec_row}").number_format = currency_fmt
-    
-    ws.column_dimensions['A'].width = 30
-    for col in ['B','C','D','E']:
-        ws.column_dimensions[col].width = 15
-        
-    # 3. Annual Summary Sheet
-    ws_summ = wb.create_sheet("Annual Summary")
-    summ_headers = ["Item", "Year 1", "Year 2", "Year 3"]
-    ws_summ.append(summ_headers)
-    for cell in ws_summ[1]:
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal='center')
-        
-    # Helper to sum 12 columns
-    def add_summ_row(label, src_row, is_sum=True):
-        r = ws_summ.max_row + 1
-        ws_summ.cell(row=r, column=1, value=label)
-        # Year 1: Sum B-M (2-13)
-        # Year 2: Sum N-Y (14-25)
-        # Year 3: Sum Z-AK (26-37)
-        ranges = [('B', 'M'), ('N', 'Y'), ('Z', 'AK')]
-        for i, (start, end) in enumerate(ranges):
-            if is_sum:
-                ws_summ.cell(row=r, column=i+2, value=f"=SUM('36 Month Model'!{start}{src_row}:{end}{src_row})").number_format = currency_fmt
-            else:
-                # For Balance Sheet items, take the ending value (last month of year)
-                end_col = end
-                ws_summ.cell(row=r, column=i+2, value=f"='36 Month Model'!{end_col}{src_row}").number_format = currency_fmt
-
-    ws_summ.append(["PROFIT & LOSS"])
-    ws_summ.cell(row=ws_summ.max_row, column=1).font = bold_font
-    add_summ_row("Total Revenue", total_rev_row)
-    add_summ_row("Total COGS", total_cogs_row)
-    add_summ_row("Gross Profit", gross_profit_row)
-    add_summ_row("Total OpEx", total_opex_row)
-    add_summ_row("EBITDA", ebitda_row)
-    add_summ_row("Depreciation", deprec_row)
-    add_summ_row("EBIT", ebit_row)
-    add_summ_row("Interest Expense", int_exp_row)
-    add_summ_row("Interest Income", int_inc_row)
-    add_summ_row("EBT", ebt_row)
-    add_summ_row("Income Tax", tax_row)
-    add_summ_row("Net Income", ni_row)
-    
-    ws_summ.append([""])
-    ws_summ.append(["BALANCE SHEET"])
-    ws_summ.cell(row=ws_summ.max_row, column=1).font = bold_font
-    add_summ_row("Cash", cash_row, is_sum=False)
-    add_summ_row("Accounts Receivable", ar_row, is_sum=False)
-    add_summ_row("Inventory", inv_row, is_sum=False)
-    add_summ_row("Total Assets", ad_row+1, is_sum=False) # Total Assets Row
-    add_summ_row("Accounts Payable", ap_row, is_sum=False)
-    add_summ_row("Long Term Debt", debt_row, is_sum=False)
-    add_summ_row("Total Equity", re_row+1, is_sum=False) # Total Liab & Equity Row (approx)
-
-
-    # 4. KPIs Sheet
-    ws_kpi = wb.create_sheet("KPIs")
-    
-    headers_kpi = ["Metric"] + periods
-    ws_kpi.append(headers_kpi)
-    for cell in ws_kpi[1]:
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal='center')
-    
-    kpi_row = 2
-    
-    # KPI Assumptions Export
-    add_assump("KPIs", "Starting Customers", st.session_state.kpi_assumptions['starting_customers'][scen], None, 'start_cust')
-    add_assump("KPIs", "New Customers Monthly", st.session_state.kpi_assumptions['new_customers_monthly'][scen], None, 'new_cust')
-    add_assump("KPIs", "Monthly Churn Rate", st.session_state.kpi_assumptions['churn_rate_monthly'][scen], pct_fmt, 'churn_rate')
-    
-    # Customer Count
-    ws_kpi.cell(row=kpi_row, column=1, value="Customer Count").font = bold_font
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        if i == 0:
-            ws_kpi.cell(row=kpi_row, column=i+2, value=f"={refs['start_cust']}+{refs['new_cust']}-(({refs['start_cust']})*{refs['churn_rate']})").number_format = '#,##0'
-        else:
-            prev_col = get_column_letter(i+1)
-            ws_kpi.cell(row=kpi_row, column=i+2, value=f"={prev_col}{kpi_row}+{refs['new_cust']}-(({prev_col}{kpi_row})*{refs['churn_rate']})").number_format = '#,##0'
-    cust_count_row = kpi_row
-    kpi_row += 1
-    
-    # MRR (Monthly Recurring Revenue)
-    ws_kpi.cell(row=kpi_row, column=1, value="MRR").font = bold_font
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        ws_kpi.cell(row=kpi_row, column=i+2, value=f"='36 Month Model'!{col_letter}{total_rev_row}").number_format = currency_fmt
-    mrr_row = kpi_row
-    kpi_row += 1
-    
-    # S&M Spend (sum of OpEx items marked as S&M)
-    ws_kpi.cell(row=kpi_row, column=1, value="S&M Spend").font = bold_font
-    sm_opex_list = st.session_state.kpi_assumptions.get('sm_opex_items', [])
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        # Create formula to sum S&M opex items from 36 Month Model
-        sm_refs = []
-        for opex_idx, item in enumerate(st.session_state.opex_items):
-            if item['name'] in sm_opex_list:
-                sm_row = opex_start_row + opex_idx
-                sm_refs.append(f"'36 Month Model'!{col_letter}{sm_row}")
-        if sm_refs:
-            formula = "=" + "+".join(sm_refs)
-        else:
-            formula = "=0"
-        ws_kpi.cell(row=kpi_row, column=i+2, value=formula).number_format = currency_fmt
-    sm_spend_row = kpi_row
-    kpi_row += 1
-    
-    # CAC (Customer Acquisition Cost)
-    ws_kpi.cell(row=kpi_row, column=1, value="CAC").font = bold_font
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        ws_kpi.cell(row=kpi_row, column=i+2, value=f"=IF({refs['new_cust']}>0, {col_letter}{sm_spend_row}/{refs['new_cust']}, 0)").number_format = currency_fmt
-    cac_row = kpi_row
-    kpi_row += 1
-    
-    # Gross Margin %
-    ws_kpi.cell(row=kpi_row, column=1, value="Gross Margin %").font = bold_font
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        ws_kpi.cell(row=kpi_row, column=i+2, value=f"=IF('36 Month Model'!{col_letter}{total_rev_row}>0, '36 Month Model'!{col_letter}{gross_profit_row}/'36 Month Model'!{col_letter}{total_rev_row}, 0)").number_format = pct_fmt
-    gm_pct_row = kpi_row
-    kpi_row += 1
-    
-    # ARPA (Average Revenue Per Account)
-    ws_kpi.cell(row=kpi_row, column=1, value="ARPA").font = bold_font
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        ws_kpi.cell(row=kpi_row, column=i+2, value=f"=IF({col_letter}{cust_count_row}>0, {col_letter}{mrr_row}/{col_letter}{cust_count_row}, 0)").number_format = currency_fmt
-    arpa_row = kpi_row
-    kpi_row += 1
-    
-    # LTV (Lifetime Value)
-    ws_kpi.cell(row=kpi_row, column=1, value="LTV").font = bold_font
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        ws_kpi.cell(row=kpi_row, column=i+2, value=f"=IF({refs['churn_rate']}>0, ({col_letter}{arpa_row}*{col_letter}{gm_pct_row})/{refs['churn_rate']}, 0)").number_format = currency_fmt
-    ltv_row = kpi_row
-    kpi_row += 1
-    
-    # LTV:CAC Ratio
-    ws_kpi.cell(row=kpi_row, column=1, value="LTV:CAC Ratio").font = bold_font
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        ws_kpi.cell(row=kpi_row, column=i+2, value=f"=IF({col_letter}{cac_row}>0, {col_letter}{ltv_row}/{col_letter}{cac_row}, 0)").number_format = '0.00'
-    ltv_cac_row = kpi_row
-    kpi_row += 1
-    
-    # Gross Profit per Customer
-    ws_kpi.cell(row=kpi_row, column=1, value="Gross Profit per Customer").font = bold_font
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        ws_kpi.cell(row=kpi_row, column=i+2, value=f"=IF({col_letter}{cust_count_row}>0, '36 Month Model'!{col_letter}{gross_profit_row}/{col_letter}{cust_count_row}, 0)").number_format = currency_fmt
-    gp_per_cust_row = kpi_row
-    kpi_row += 1
-    
-    # CAC Payback (Months to Recover CAC)
-    ws_kpi.cell(row=kpi_row, column=1, value="CAC Payback (Months)").font = bold_font
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        ws_kpi.cell(row=kpi_row, column=i+2, value=f"=IF({col_letter}{gp_per_cust_row}>0, {col_letter}{cac_row}/{col_letter}{gp_per_cust_row}, 0)").number_format = '0.0'
-    cac_payback_row = kpi_row
-    kpi_row += 1
-    
-    # Revenue Growth % (YoY)
-    ws_kpi.cell(row=kpi_row, column=1, value="Revenue Growth % (YoY)").font = bold_font
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        if i < 12:
-            ws_kpi.cell(row=kpi_row, column=i+2, value="N/A")
-        else:
-            prev_year_col = get_column_letter(i+2-12)
-            ws_kpi.cell(row=kpi_row, column=i+2, value=f"=IF('36 Month Model'!{prev_year_col}{total_rev_row}>0, ('36 Month Model'!{col_letter}{total_rev_row}-'36 Month Model'!{prev_year_col}{total_rev_row})/'36 Month Model'!{prev_year_col}{total_rev_row}, 0)").number_format = pct_fmt
-    rev_growth_row = kpi_row
-    kpi_row += 1
-    
-    # EBITDA Margin %
-    ws_kpi.cell(row=kpi_row, column=1, value="EBITDA Margin %").font = bold_font
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        ws_kpi.cell(row=kpi_row, column=i+2, value=f"=IF('36 Month Model'!{col_letter}{total_rev_row}>0, '36 Month Model'!{col_letter}{ebitda_row}/'36 Month Model'!{col_letter}{total_rev_row}, 0)").number_format = pct_fmt
-    ebitda_margin_row = kpi_row
-    kpi_row += 1
-    
-    # Rule of 40
-    ws_kpi.cell(row=kpi_row, column=1, value="Rule of 40").font = bold_font
-    for i, p in enumerate(periods):
-        col_letter = get_column_letter(i+2)
-        if i < 12:
-            ws_kpi.cell(row=kpi_row, column=i+2, value="N/A")
-        else:
-            ws_kpi.cell(row=kpi_row, column=i+2, value=f"={col_letter}{rev_growth_row}+{col_letter}{ebitda_margin_row}").number_format = pct_fmt
-    rule40_row = kpi_row
-    
-    # Column sizing for KPIs will be done later with other sheets
-
-    # --- SMART COLUMN SIZING ---
-    
-    # 1. Assumptions Sheet (Static Values)
-    # Estimate width based on formatted value
-    for col in ws_assump.columns:
-        max_len = 0
-        col_letter = get_column_letter(col[0].column)
-        for cell in col:
-            try:
-                val = cell.value
-                fmt = cell.number_format
-                if val is not None:
-                    if isinstance(val, (int, float)):
-                        if fmt == currency_fmt: # '#,##0.00'
-                            l = len("{:,.2f}".format(val))
-                        elif fmt == pct_fmt: # '0.00%'
-                            l = len("{:.2%}".format(val))
-                        else:
-                            l = len(str(val))
-                    else:
-                        l = len(str(val))
-                    max_len = max(max_len, l)
-            except: pass
-        ws_assump.column_dimensions[col_letter].width = max_len + 2
-
-    # 2. Main & Summary Sheets (Formulas)
-    # Calculate required width based on maximum financial assumptions
-    max_val = 0.0
-    
-    # Check Revenue (Year 1 + Growth projection)
+for key, value in default_state().items():
+    if key not in st.session_state:
+        st.session_state[key] = value
+
+
+# --- WORKBOOK CACHE ---
+def model_state_digest():
+    # Same digest as the build log's, so a logged build can be matched to its cache entry
+    return state_digest(st.session_state)
+
+@st.cache_data(max_entries=EXCEL_CACHE_MAX_ENTRIES, show_spinner=False)
+def build_excel_bytes(state_digest, with_values=False, sensitivity_pct=None, grid_json=None, all_scenarios=False, trace_memory=False):
+    # state_digest is the cache key: it covers everything generate_excel() reads,
+    # so identical assumptions (from any session) reuse the serialized file.
+    # Returns (bytes, build profile summary); a cache hit returns the profile of the original build
+    grid_spec = json.loads(grid_json) if grid_json else None
+    profile = start_profile(trace_memory)
+    data = workbook_bytes(st.session_state, with_values, sensitivity_pct=sensitivity_pct, grid_spec=grid_spec,
+                          all_scenarios=all_scenarios, profile=profile)
+    return data, profile['summary']
+
+@st.cache_data(max_entries=STATEMENT_CACHE_MAX_ENTRIES, show_spinner=False)
+def sensitivity_sweep(state_digest, scen, pct):
+    return sensitivity(st.session_state, scen, pct)
+
+@st.cache_data(max_entries=STATEMENT_CACHE_MAX_ENTRIES, show_spinner=False)
+def grid_table(state_digest, scen, grid_json):
+    spec = json.loads(grid_json)
+    return grid_sweep(st.session_state, scen, spec['x'], spec['x_values'], spec['y'], spec['y_values'])[spec['output']]
+
+def engine_cache(scen):
+    # This session's engine rows for one scenario: after an edit, only the rows downstream of the
+    # changed drivers are recomputed (engine.project); kept outside the digested model state
+    if 'engine_caches' not in st.session_state:
+        st.session_state.engine_caches = {}
+    return st.session_state.engine_caches.setdefault(scen, {})
+
+@st.cache_data(max_entries=STATEMENT_CACHE_MAX_ENTRIES, show_spinner=False)
+def live_statements(state_digest, scen):
+    # Same digest key as the workbook cache: the engine run is reused until an assumption changes,
+    # and then only the affected rows are recomputed
+    return statement_tables(st.session_state, scen, engine_cache(scen))
+
+@st.cache_data(max_entries=SIMULATION_CACHE_MAX_ENTRIES, show_spinner=False)
+def run_simulation(state_digest, scen, specs_json, n_paths, seed, workers):
+    # specs_json (canonical JSON of the distribution specs) is part of the cache key
+    return simulate(st.session_state, scen, json.loads(specs_json), n_paths, seed, workers=workers)
+
+@st.cache_data(max_entries=STATEMENT_CACHE_MAX_ENTRIES, show_spinner=False)
+def goal_seek(state_digest, scen, goal, param):
+    # goal: 'equity' / 'debt' (param = cash floor), 'breakeven' (param = engine row), 'growth' (param = month)
+    if goal in FUNDING_DRIVERS:
+        return minimum_funding(st.session_state, scen, goal, cash_floor=param)
+    if goal == 'breakeven':
+        return breakeven_month(st.session_state, scen, param)
+    return required_growth(st.session_state, scen, param)
+
+@st.cache_data(max_entries=STATEMENT_CACHE_MAX_ENTRIES, show_spinner=False)
+def scenario_diff(state_digest, a, b):
+    return diff_scenarios(scenario_store(st.session_state), a, b)
+
+@st.cache_data(max_entries=STATEMENT_CACHE_MAX_ENTRIES, show_spinner=False)
+def scenario_summary(state_digest):
+    # Every scenario in one batched engine run
+    return scenario_outputs(st.session_state)
+
+def add_scenario(source):
+    # Button callback: the new scenario starts as a copy of the one being edited and is opened for editing
+    name = st.session_state.new_scenario_name.strip()
+    store = clone_scenario(scenario_store(st.session_state), source, name)
+    write_scenario(st.session_state, store, name)
+    st.session_state.scenario_to_edit = name
+    st.session_state.new_scenario_name = ""
+
+def delete_scenario(name):
+    remove_scenario(st.session_state, name)
+
+def apply_funding(source, scen, amount):
+    # Button callback: runs before the next script pass, so the input widget can still be updated
+    key = 'equity_raised' if source == 'equity' else 'debt_issued'
+    st.session_state.financing_assumptions[key][scen] = amount
+    st.session_state[f"{'eq' if source == 'equity' else 'debt'}_{scen}"] = amount
+
+def apply_growth(scen, growth):
     for item in st.session_state.revenue_items:
-        v = item['value'][scen]
-        # Use the highest growth rate for width calculation
-        g = max(
-            item.get('growth_y1', {}).get(scen, 0.10),
-            item.get('growth_y2', {}).get(scen, 0.07),
-            item.get('growth_y3', {}).get(scen, 0.04)
-        )
-        # Project to Year 3 (approx)
-        v_y3 = v * ((1+g)**3)
-        max_val = max(max_val, v_y3)
-        
-    # Check Financing
-    max_val = max(max_val, st.session_state.financing_assumptions['equity_raised'][scen])
-    max_val = max(max_val, st.session_state.financing_assumptions['debt_issued'][scen])
-    
-    # Safety buffer for totals (e.g. Total Revenue > Single Stream)
-    # 5x buffer covers most aggregations
-    safe_max_val = max_val * 5 if max_val > 0 else 1000000 
-    
-    # Calculate width needed for this max value
-    data_width = len("{:,.2f}".format(safe_max_val)) + 3 # +3 padding for safety
-    
-    # Apply to Main Sheet
-    ws.column_dimensions['A'].width = 30 # Label column
-    for i in range(2, ws.max_column + 1):
-        ws.column_dimensions[get_column_letter(i)].width = data_width
-        
-    # Apply to Summary Sheet
-    ws_summ.column_dimensions['A'].width = 30
-    for i in range(2, ws_summ.max_column + 1):
-        ws_summ.column_dimensions[get_column_letter(i)].width = data_width
-    
-    # Apply to KPIs Sheet
-    ws_kpi.column_dimensions['A'].width = 30
-    for i in range(2, ws_kpi.max_column + 1):
-        ws_kpi.column_dimensions[get_column_letter(i)].width = data_width
-
-    return wb
+        for y in ('growth_y1', 'growth_y2', 'growth_y3'):
+            item[y][scen] = growth
+
+# --- BATCHED EDITS ---
+# With batching on, each assumption section is an st.form: its widgets only report back when the
+# section's Apply button is pressed, so editing five inputs costs one rerun and one engine recompute
+# instead of five.
+def section_form(name):
+    if st.session_state.get('batch_edits', True):
+        return st.form(f"form_{name}", border=False)
+    return st.container()
+
+def apply_button():
+    if st.session_state.get('batch_edits', True):
+        st.form_submit_button("Apply", type="primary")
+
+def line_item_editor(category):
+    # One data editor per line item category (line_items.py). Its widget id covers the data, so once an
+    # edit is written back the next run starts a fresh editor from the updated state
+    items = st.session_state[category]
+    frame = items_frame(items, category, shown_scenarios)
+    config = {ITEM_ID: None, 'Name': st.column_config.TextColumn("Name", required=True)}
+    if category in LINE_TYPES:
+        config['Type'] = st.column_config.SelectboxColumn("Type", options=LINE_TYPES[category][0], required=True)
+    for column in frame.columns[len(config):]:
+        config[column] = st.column_config.NumberColumn(column, format="%.2f")
+    edited = st.data_editor(frame, column_config=config, num_rows="dynamic", hide_index=True,
+                            use_container_width=True, key=f"{category}_editor")
+    if not edited.equals(frame):
+        st.session_state[category] = frame_items(edited, items, category, shown_scenarios, scenario_list)
+
+def styled_table(name, df):
+    # Currency like the workbook; KPI percentages / ratios keep their own formats; "N/A" before Year 2 growth
+    styler = df.style.format("{:,.2f}", na_rep="N/A")
+    if name == "KPIs":
+        styler = styler.format("{:.1%}", na_rep="N/A", subset=pd.IndexSlice[KPI_PCT_ROWS, :])
+        styler = styler.format("{:,.1f}", na_rep="N/A", subset=pd.IndexSlice[KPI_RATIO_ROWS, :])
+    return styler
 
 # --- TITLE & CREDITS ---
 st.title("Dynamic 3-Statement Financial Model")
@@ -1032,229 +182,392 @@ st.markdown("Made by [Avishek Kumar Jaiswal](https://www.linkedin.com/in/avishek
 st.markdown("---")
 
 # --- DOWNLOAD BUTTON ---
+# The workbook is only built when the user asks for it, so editing never waits on openpyxl.
+# A prepared file is kept until the assumptions change (its digest no longer matches).
 try:
-    wb = generate_excel()
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-    
     col_dl1, col_dl2 = st.columns([3, 1])
-    with col_dl2:
-        st.download_button(
-            label="📥 Download Dynamic Model (.xlsx)",
-            data=buffer,
-            file_name="Dynamic_Financial_Model.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            use_container_width=True
+    with col_dl1:
+        with_values = st.checkbox(
+            "Include calculated values",
+            value=True,
+            key="excel_with_values",
+            help="Store computed results next to each formula so the file opens without a full recalculation and non-calculating readers see numbers"
+        )
+        with_sensitivity = st.checkbox(
+            "Include sensitivity sheet",
+            value=False,
+            key="excel_with_sensitivity",
+            help="Add a Sensitivity sheet with the tornado sweep (step set under Sensitivity Analysis)"
+        )
+        with_grid = st.checkbox(
+            "Include grid sweep sheet",
+            value=False,
+            key="excel_with_grid",
+            help="Add the two-driver data table set up under Grid Sweep as a values sheet"
         )
+        all_scenarios = st.checkbox(
+            "All scenarios",
+            value=False,
+            key="excel_all_scenarios",
+            help="List every scenario on the Assumptions sheet with an Active Scenario switch cell driving the model, and add a Scenario Comparison sheet"
+        )
+    sensitivity_pct = st.session_state.get('tornado_pct', DEFAULT_PCT * 100) / 100 if with_sensitivity else None
+    grid_json = st.session_state.get('grid_json') if with_grid else None
+    trace_memory = DEBUG_PANEL and st.session_state.get('excel_trace_memory', False)
+    export_key = (model_state_digest(), with_values, sensitivity_pct, grid_json, all_scenarios, trace_memory)
+    with col_dl2:
+        if st.session_state.get('excel_digest') != export_key:
+            if st.button("⚙️ Prepare Download (.xlsx)", use_container_width=True):
+                with st.spinner("Building workbook..."):
+                    st.session_state.excel_bytes, st.session_state.excel_profile = build_excel_bytes(*export_key)
+                    st.session_state.excel_digest = export_key
+        if st.session_state.get('excel_digest') == export_key:
+            st.download_button(
+                label="📥 Download Dynamic Model (.xlsx)",
+                data=st.session_state.excel_bytes,
+                file_name="Dynamic_Financial_Model.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                use_container_width=True
+            )
 except Exception as e:
     st.error(f"Error generating Excel file: {e}")
+
+# --- BUILD PROFILE (DEBUG) ---
+# Where the last prepared workbook spent its time: one row per builder phase, serialization included
+if DEBUG_PANEL:
+    with st.expander("Build Profile (Debug)", expanded=False):
+        st.checkbox("Trace allocations", value=False, key="excel_trace_memory",
+                    help="Record memory allocated per phase (tracemalloc); builds get noticeably slower")
+        summary = st.session_state.get('excel_profile')
+        if summary:
+            phases = pd.DataFrame(summary['phases']).set_index('phase')
+            phases.insert(1, 'share', phases['seconds'] / summary['total_s'])
+            formats = {'seconds': "{:.4f}", 'share': "{:.1%}", 'cells': "{:,.0f}", 'alloc_mb': "{:.2f}", 'peak_mb': "{:.2f}"}
+            st.dataframe(phases.style.format({k: v for k, v in formats.items() if k in phases}), use_container_width=True)
+            st.caption(f"Total {summary['total_s']:.3f}s, {summary['cells']:,} cells")
+        else:
+            st.caption("Prepare a download to profile its build.")
     
     
+scenario_list = scenario_names(st.session_state)
 col_scen1, col_scen2 = st.columns(2)
 with col_scen1:
-    st.session_state.scenario_to_edit = st.selectbox("Scenario to Edit", SCENARIOS, index=SCENARIOS.index(st.session_state.scenario_to_edit))
+    st.session_state.scenario_to_edit = st.selectbox("Scenario to Edit", scenario_list, index=scenario_list.index(st.session_state.scenario_to_edit))
 with col_scen2:
-    st.session_state.scenario_to_run = st.selectbox("Scenario to Run (Excel)", SCENARIOS, index=SCENARIOS.index(st.session_state.scenario_to_run))
+    st.session_state.scenario_to_run = st.selectbox("Scenario to Run (Excel)", scenario_list, index=scenario_list.index(st.session_state.scenario_to_run))
+
+col_tl1, col_tl2 = st.columns(2)
+with col_tl1:
+    st.session_state.horizon_months = int(st.number_input("Projection Horizon (Months)", min_value=12, max_value=240, value=int(st.session_state.horizon_months), step=12))
+with col_tl2:
+    st.session_state.granularity = st.selectbox("Period Granularity", list(GRANULARITIES), index=list(GRANULARITIES).index(st.session_state.granularity))
+# step=12 doesn't snap typed values: a horizon that isn't whole periods (30 months, annual) stops the page
+# here rather than in every section that plans the timeline
+try:
+    state_timeline(st.session_state)
+except ValueError as e:
+    st.error(f"Projection horizon: {e}. Pick a horizon that is a multiple of the period length.")
+    st.stop()
 
 st.info(f"Editing values for: **{st.session_state.scenario_to_edit}**")
+st.toggle("Batch edits (apply each section with its Apply button)", value=True, key="batch_edits")
 curr_scen = st.session_state.scenario_to_edit
+# Line item tables show their per-scenario drivers for these scenarios
+shown_scenarios = st.multiselect("Scenario columns", scenario_list, default=[curr_scen]) or [curr_scen]
 
 col_main1, col_main2 = st.columns(2)
 
 with col_main1:
     # 1. Revenue Streams
     with st.expander("1. Revenue Streams", expanded=True):
-        for i, item in enumerate(st.session_state.revenue_items):
-            st.markdown(f"**{item['name']}**")
-            c1, c2 = st.columns(2)
-            item['value'][curr_scen] = c1.number_input(f"Year 1 Value ($) ##{i}", value=item['value'][curr_scen], step=1000.0, key=f"rev_val_{i}_{curr_scen}")
-            # Growth Tapering: Separate rates for each year
-            st.markdown("**Growth Rates (Annual)**")
-            c1, c2, c3 = st.columns(3)
-            item['growth_y1'] = item.get('growth_y1', init_scenario_val(0.10))
-            item['growth_y2'] = item.get('growth_y2', init_scenario_val(0.07))
-            item['growth_y3'] = item.get('growth_y3', init_scenario_val(0.04))
-            item['growth_y1'][curr_scen] = c1.number_input(f"Year 1 (%) ##{i}", value=item['growth_y1'][curr_scen]*100, step=1.0, key=f"rev_gr_y1_{i}_{curr_scen}") / 100
-            item['growth_y2'][curr_scen] = c2.number_input(f"Year 2 (%) ##{i}", value=item['growth_y2'][curr_scen]*100, step=1.0, key=f"rev_gr_y2_{i}_{curr_scen}") / 100
-            item['growth_y3'][curr_scen] = c3.number_input(f"Year 3 (%) ##{i}", value=item['growth_y3'][curr_scen]*100, step=1.0, key=f"rev_gr_y3_{i}_{curr_scen}") / 100
-            if st.button(f"Remove {item['name']}", key=f"del_rev_{i}"):
-                st.session_state.revenue_items.pop(i)
-                st.rerun()
-        
-        st.markdown("---")
-        new_rev_name = st.text_input("New Revenue Name", key="new_rev_name")
-        if st.button("Add Revenue Stream"):
-            if new_rev_name:
-                st.session_state.revenue_items.append({
-                    'name': new_rev_name, 
-                    'value': init_scenario_val(0.0), 
-                    'growth_y1': init_scenario_val(0.10),
-                    'growth_y2': init_scenario_val(0.07),
-                    'growth_y3': init_scenario_val(0.04)
-                })
-                st.rerun()
+        with section_form("revenue"):
+            line_item_editor('revenue_items')
+            apply_button()
 
     # 3. OpEx
     with st.expander("3. OpEx (People vs Fixed)", expanded=False):
-        for i, item in enumerate(st.session_state.opex_items):
-            st.markdown(f"**{item['name']}**")
-            type_opts = ["Fixed Amount", "% of Rev", "Personnel"]
-            curr_type_idx = type_opts.index(item.get('type', 'Fixed Amount'))
-            item['type'] = st.selectbox(f"Type ##{i}", type_opts, index=curr_type_idx, key=f"opex_type_{i}")
-            
-            c1, c2 = st.columns(2)
-            if item['type'] == "Fixed Amount":
-                item['value'][curr_scen] = c1.number_input(f"Fixed Amount ($) ##{i}", value=float(item['value'][curr_scen]), step=1000.0, key=f"opex_val_{i}_{curr_scen}")
-                item['param2'][curr_scen] = c2.number_input(f"Growth (%) ##{i}", value=float(item.get('param2', {}).get(curr_scen, 0.0))*100, step=1.0, key=f"opex_p2_{i}_{curr_scen}") / 100
-            elif item['type'] == "% of Rev":
-                item['value'][curr_scen] = c1.number_input(f"% of Revenue ##{i}", value=float(item['value'][curr_scen])*100, step=1.0, key=f"opex_val_{i}_{curr_scen}") / 100
-                # param2 unused for % of Rev
-            elif item['type'] == "Personnel":
-                item['value'][curr_scen] = c1.number_input(f"Headcount (Start) ##{i}", value=float(item['value'][curr_scen]), step=1.0, key=f"opex_val_{i}_{curr_scen}")
-                item['param2'][curr_scen] = c2.number_input(f"Avg Salary ($/yr) ##{i}", value=float(item.get('param2', {}).get(curr_scen, 50000.0)), step=1000.0, key=f"opex_p2_{i}_{curr_scen}")
-                # Dynamic Headcount: Revenue threshold for hiring
-                st.markdown("**Dynamic Headcount Settings**")
-                item['revenue_threshold'] = item.get('revenue_threshold', init_scenario_val(50000.0))
-                item['revenue_threshold'][curr_scen] = st.number_input(
-                    f"Revenue per New Hire ($) ##{i}", 
-                    value=float(item.get('revenue_threshold', {}).get(curr_scen, 50000.0)), 
-                    step=5000.0, 
-                    key=f"opex_threshold_{i}_{curr_scen}",
-                    help="Hire 1 additional person for every $X increase in monthly revenue"
-                )
-
-            if st.button(f"Remove {item['name']}", key=f"del_opex_{i}"):
-                st.session_state.opex_items.pop(i)
-                st.rerun()
-
-        st.markdown("---")
-        new_opex_name = st.text_input("New OpEx Name", key="new_opex_name")
-        if st.button("Add OpEx Item"):
-            if new_opex_name:
-                st.session_state.opex_items.append({'name': new_opex_name, 'value': init_scenario_val(5000.0), 'type': 'Fixed Amount', 'param2': init_scenario_val(0.0)})
-                st.rerun()
+        with section_form("opex"):
+            line_item_editor('opex_items')
+            st.caption("Personnel rows: headcount, average salary, and one more hire per *Revenue per New Hire* increase in monthly revenue")
+            apply_button()
 
     # 5. Assets & Taxation
     with st.expander("5. Assets & Taxation", expanded=False):
-        st.markdown("**Assets**")
-        for i, item in enumerate(st.session_state.capex_items):
-            st.markdown(f"**{item['name']}**")
-            c1, c2 = st.columns(2)
-            item['cost'][curr_scen] = c1.number_input(f"Cost ($) ##{i}", value=item['cost'][curr_scen], step=500.0, key=f"capex_cost_{i}_{curr_scen}")
-            item['deprec_rate'][curr_scen] = c2.number_input(f"Deprec Rate (%) ##{i}", value=item.get('deprec_rate', {}).get(curr_scen, 0.20)*100, step=1.0, key=f"capex_rate_{i}_{curr_scen}") / 100
-            if st.button(f"Remove {item['name']}", key=f"del_capex_{i}"):
-                st.session_state.capex_items.pop(i)
-                st.rerun()
-        
-        new_capex_name = st.text_input("New Asset Name", key="new_capex_name")
-        if st.button("Add Asset"):
-            if new_capex_name:
-                st.session_state.capex_items.append({'name': new_capex_name, 'cost': init_scenario_val(1000.0), 'deprec_rate': init_scenario_val(0.20)})
-                st.rerun()
+        with section_form("assets"):
+            st.markdown("**Assets**")
+            line_item_editor('capex_items')
         
-        st.markdown("---")
-        st.markdown("**Maintenance CapEx**")
-        st.session_state.capex_assumptions['maintenance_pct'][curr_scen] = st.slider(
-            "Ongoing CapEx (% of Monthly Revenue)", 
-            0.0, 10.0, 
-            float(st.session_state.capex_assumptions.get('maintenance_pct', {}).get(curr_scen, 2.0)*100), 
-            0.1,
-            key=f"maint_capex_{curr_scen}",
-            help="Monthly capital expenditure as a percentage of revenue"
-        ) / 100
+            st.markdown("---")
+            st.markdown("**Maintenance CapEx**")
+            st.session_state.capex_assumptions['maintenance_pct'][curr_scen] = st.slider(
+                "Ongoing CapEx (% of Monthly Revenue)", 
+                0.0, 10.0, 
+                float(st.session_state.capex_assumptions.get('maintenance_pct', {}).get(curr_scen, 2.0)*100), 
+                0.1,
+                key=f"maint_capex_{curr_scen}",
+                help="Monthly capital expenditure as a percentage of revenue"
+            ) / 100
         
-        st.markdown("---")
-        st.markdown("**Taxation**")
-        st.session_state.tax_assumptions['tax_rate'][curr_scen] = st.slider("Tax Rate (%)", 0, 50, int(st.session_state.tax_assumptions['tax_rate'][curr_scen]*100), key=f"tax_rate_{curr_scen}") / 100
-        st.session_state.tax_assumptions['payment_timing'] = st.radio("Tax Payment Timing", ["Immediate", "Next Year"], index=0 if st.session_state.tax_assumptions['payment_timing'] == "Immediate" else 1)
-        st.session_state.tax_assumptions['nol_balance'] = st.number_input("NOL Beginning Balance ($)", value=st.session_state.tax_assumptions.get('nol_balance', 0.0), step=1000.0)
+            st.markdown("---")
+            st.markdown("**Taxation**")
+            st.session_state.tax_assumptions['tax_rate'][curr_scen] = st.slider("Tax Rate (%)", 0, 50, int(st.session_state.tax_assumptions['tax_rate'][curr_scen]*100), key=f"tax_rate_{curr_scen}") / 100
+            st.session_state.tax_assumptions['payment_timing'] = st.radio("Tax Payment Timing", ["Immediate", "Next Year"], index=0 if st.session_state.tax_assumptions['payment_timing'] == "Immediate" else 1)
+            st.session_state.tax_assumptions['nol_balance'] = st.number_input("NOL Beginning Balance ($)", value=st.session_state.tax_assumptions.get('nol_balance', 0.0), step=1000.0)
+            apply_button()
 
 
 with col_main2:
     # 2. COGS
     with st.expander("2. COGS", expanded=False):
-        for i, item in enumerate(st.session_state.cogs_items):
-            st.markdown(f"**{item['name']}**")
-            c1, c2 = st.columns(2)
-            item['type'] = c1.selectbox(f"Type ##{i}", ["% of Rev", "Fixed Amount"], index=0 if item['type'] == "% of Rev" else 1, key=f"cogs_type_{i}")
-            
-            if item['type'] == "% of Rev":
-                val = c2.number_input(f"% of Rev ##{i}", value=item['value'][curr_scen]*100, step=1.0, key=f"cogs_val_{i}_{curr_scen}") / 100
-            else:
-                val = c2.number_input(f"Fixed ($) ##{i}", value=item['value'][curr_scen], step=500.0, key=f"cogs_val_{i}_{curr_scen}")
-            item['value'][curr_scen] = val
-            
-            if st.button(f"Remove {item['name']}", key=f"del_cogs_{i}"):
-                st.session_state.cogs_items.pop(i)
-                st.rerun()
-
-        st.markdown("---")
-        new_cogs_name = st.text_input("New COGS Name", key="new_cogs_name")
-        if st.button("Add COGS Item"):
-            if new_cogs_name:
-                st.session_state.cogs_items.append({'name': new_cogs_name, 'value': init_scenario_val(0.10), 'type': '% of Rev'})
-                st.rerun()
+        with section_form("cogs"):
+            line_item_editor('cogs_items')
+            apply_button()
 
     # 4. Working Capital
     with st.expander("4. Working Capital", expanded=False):
-        st.session_state.wc_assumptions['beginning_cash'] = st.number_input("Beginning Cash Balance ($)", value=st.session_state.wc_assumptions['beginning_cash'], step=1000.0)
-        st.session_state.wc_assumptions['ar_percent'][curr_scen] = st.slider("AR as % of Rev (DSO Proxy)", 0, 50, int(st.session_state.wc_assumptions['ar_percent'][curr_scen]*100), key=f"ar_{curr_scen}") / 100
-        st.session_state.wc_assumptions['ap_percent'][curr_scen] = st.slider("AP as % of Opex (DPO Proxy)", 0, 50, int(st.session_state.wc_assumptions['ap_percent'][curr_scen]*100), key=f"ap_{curr_scen}") / 100
-        st.session_state.wc_assumptions['deferred_rev_percent'][curr_scen] = st.slider("Deferred Revenue (% of Sales)", 0, 50, int(st.session_state.wc_assumptions.get('deferred_rev_percent', {}).get(curr_scen, 0.0)*100), key=f"dr_{curr_scen}") / 100
-        st.markdown("**Inventory**")
-        st.session_state.wc_assumptions['days_inventory'][curr_scen] = st.number_input("Days Inventory Outstanding (DIO)", value=st.session_state.wc_assumptions.get('days_inventory', {}).get(curr_scen, 30.0), step=1.0, key=f"dio_{curr_scen}")
-        st.session_state.wc_assumptions['days_payable'][curr_scen] = st.number_input("Days Payable Outstanding (DPO)", value=st.session_state.wc_assumptions.get('days_payable', {}).get(curr_scen, 30.0), step=1.0, key=f"dpo_{curr_scen}")
+        with section_form("wc"):
+            st.session_state.wc_assumptions['beginning_cash'] = st.number_input("Beginning Cash Balance ($)", value=st.session_state.wc_assumptions['beginning_cash'], step=1000.0)
+            st.session_state.wc_assumptions['ar_percent'][curr_scen] = st.slider("AR as % of Rev (DSO Proxy)", 0, 50, int(st.session_state.wc_assumptions['ar_percent'][curr_scen]*100), key=f"ar_{curr_scen}") / 100
+            st.session_state.wc_assumptions['ap_percent'][curr_scen] = st.slider("AP as % of Opex (DPO Proxy)", 0, 50, int(st.session_state.wc_assumptions['ap_percent'][curr_scen]*100), key=f"ap_{curr_scen}") / 100
+            st.session_state.wc_assumptions['deferred_rev_percent'][curr_scen] = st.slider("Deferred Revenue (% of Sales)", 0, 50, int(st.session_state.wc_assumptions.get('deferred_rev_percent', {}).get(curr_scen, 0.0)*100), key=f"dr_{curr_scen}") / 100
+            st.markdown("**Inventory**")
+            st.session_state.wc_assumptions['days_inventory'][curr_scen] = st.number_input("Days Inventory Outstanding (DIO)", value=st.session_state.wc_assumptions.get('days_inventory', {}).get(curr_scen, 30.0), step=1.0, key=f"dio_{curr_scen}")
+            st.session_state.wc_assumptions['days_payable'][curr_scen] = st.number_input("Days Payable Outstanding (DPO)", value=st.session_state.wc_assumptions.get('days_payable', {}).get(curr_scen, 30.0), step=1.0, key=f"dpo_{curr_scen}")
+            apply_button()
 
     # 6. Financing
     with st.expander("6. Financing", expanded=False):
-        st.session_state.financing_assumptions['equity_raised'][curr_scen] = st.number_input("New Equity Raised ($)", value=st.session_state.financing_assumptions['equity_raised'][curr_scen], step=1000.0, key=f"eq_{curr_scen}")
-        st.session_state.financing_assumptions['debt_issued'][curr_scen] = st.number_input("New Debt Issued ($)", value=st.session_state.financing_assumptions['debt_issued'][curr_scen], step=1000.0, key=f"debt_{curr_scen}")
-        st.session_state.financing_assumptions['debt_interest_rate'][curr_scen] = st.number_input("Interest Rate on Debt (%)", value=st.session_state.financing_assumptions['debt_interest_rate'][curr_scen]*100, step=0.1, key=f"d_int_{curr_scen}") / 100
-        st.session_state.financing_assumptions['cash_interest_rate'][curr_scen] = st.number_input("Interest on Cash (%)", value=st.session_state.financing_assumptions['cash_interest_rate'][curr_scen]*100, step=0.1, key=f"c_int_{curr_scen}") / 100
-        st.session_state.financing_assumptions['overdraft_interest_rate'][curr_scen] = st.number_input("Overdraft Interest Rate (%)", value=st.session_state.financing_assumptions.get('overdraft_interest_rate', {}).get(curr_scen, 0.10)*100, step=0.1, key=f"od_int_{curr_scen}") / 100
-        st.session_state.financing_assumptions['debt_repayment_term'][curr_scen] = st.number_input("Debt Repayment Term (Years)", value=int(st.session_state.financing_assumptions.get('debt_repayment_term', {}).get(curr_scen, 5)), step=1, key=f"term_{curr_scen}")
+        with section_form("financing"):
+            st.session_state.financing_assumptions['equity_raised'][curr_scen] = st.number_input("New Equity Raised ($)", value=st.session_state.financing_assumptions['equity_raised'][curr_scen], step=1000.0, key=f"eq_{curr_scen}")
+            st.session_state.financing_assumptions['debt_issued'][curr_scen] = st.number_input("New Debt Issued ($)", value=st.session_state.financing_assumptions['debt_issued'][curr_scen], step=1000.0, key=f"debt_{curr_scen}")
+            st.session_state.financing_assumptions['debt_interest_rate'][curr_scen] = st.number_input("Interest Rate on Debt (%)", value=st.session_state.financing_assumptions['debt_interest_rate'][curr_scen]*100, step=0.1, key=f"d_int_{curr_scen}") / 100
+            st.session_state.financing_assumptions['cash_interest_rate'][curr_scen] = st.number_input("Interest on Cash (%)", value=st.session_state.financing_assumptions['cash_interest_rate'][curr_scen]*100, step=0.1, key=f"c_int_{curr_scen}") / 100
+            st.session_state.financing_assumptions['overdraft_interest_rate'][curr_scen] = st.number_input("Overdraft Interest Rate (%)", value=st.session_state.financing_assumptions.get('overdraft_interest_rate', {}).get(curr_scen, 0.10)*100, step=0.1, key=f"od_int_{curr_scen}") / 100
+            st.session_state.financing_assumptions['debt_repayment_term'][curr_scen] = st.number_input("Debt Repayment Term (Years)", value=int(st.session_state.financing_assumptions.get('debt_repayment_term', {}).get(curr_scen, 5)), step=1, key=f"term_{curr_scen}")
+            apply_button()
 
 
     # 7. KPI Assumptions
     with st.expander("7. KPI Assumptions", expanded=False):
-        st.markdown("**Customer Metrics**")
-        st.session_state.kpi_assumptions['starting_customers'][curr_scen] = st.number_input(
-            "Starting Customer Count", 
-            value=float(st.session_state.kpi_assumptions['starting_customers'][curr_scen]), 
-            step=10.0, 
-            key=f"start_cust_{curr_scen}"
-        )
-        st.session_state.kpi_assumptions['new_customers_monthly'][curr_scen] = st.number_input(
-            "New Customers per Month", 
-            value=float(st.session_state.kpi_assumptions['new_customers_monthly'][curr_scen]), 
-            step=5.0, 
-            key=f"new_cust_{curr_scen}",
-            help="Average number of new customers acquired each month"
-        )
-        st.session_state.kpi_assumptions['churn_rate_monthly'][curr_scen] = st.number_input(
-            "Monthly Churn Rate (%)", 
-            value=float(st.session_state.kpi_assumptions['churn_rate_monthly'][curr_scen])*100, 
-            step=0.5, 
-            key=f"churn_{curr_scen}",
-            help="Percentage of customers lost each month"
-        ) / 100
+        with section_form("kpi"):
+            st.markdown("**Customer Metrics**")
+            st.session_state.kpi_assumptions['starting_customers'][curr_scen] = st.number_input(
+                "Starting Customer Count", 
+                value=float(st.session_state.kpi_assumptions['starting_customers'][curr_scen]), 
+                step=10.0, 
+                key=f"start_cust_{curr_scen}"
+            )
+            st.session_state.kpi_assumptions['new_customers_monthly'][curr_scen] = st.number_input(
+                "New Customers per Month", 
+                value=float(st.session_state.kpi_assumptions['new_customers_monthly'][curr_scen]), 
+                step=5.0, 
+                key=f"new_cust_{curr_scen}",
+                help="Average number of new customers acquired each month"
+            )
+            st.session_state.kpi_assumptions['churn_rate_monthly'][curr_scen] = st.number_input(
+                "Monthly Churn Rate (%)", 
+                value=float(st.session_state.kpi_assumptions['churn_rate_monthly'][curr_scen])*100, 
+                step=0.5, 
+                key=f"churn_{curr_scen}",
+                help="Percentage of customers lost each month"
+            ) / 100
         
-        st.markdown("---")
-        st.markdown("**Sales & Marketing Classification**")
-        st.info("Select which OpEx items should be counted as Sales & Marketing spend for CAC calculation")
+            st.markdown("---")
+            st.markdown("**Sales & Marketing Classification**")
+            st.info("Select which OpEx items should be counted as Sales & Marketing spend for CAC calculation")
         
-        sm_items = st.session_state.kpi_assumptions.get('sm_opex_items', [])
-        for item in st.session_state.opex_items:
-            is_sm = st.checkbox(
-                f"{item['name']} is Sales & Marketing", 
-                value=item['name'] in sm_items,
-                key=f"sm_{item['name']}_{curr_scen}"
-            )
-            if is_sm and item['name'] not in sm_items:
-                sm_items.append(item['name'])
-            elif not is_sm and item['name'] in sm_items:
-                sm_items.remove(item['name'])
-        st.session_state.kpi_assumptions['sm_opex_items'] = sm_items
+            sm_items = st.session_state.kpi_assumptions.get('sm_opex_items', [])
+            for item in st.session_state.opex_items:
+                is_sm = st.checkbox(
+                    f"{item['name']} is Sales & Marketing", 
+                    value=item['name'] in sm_items,
+                    key=f"sm_{item['name']}_{curr_scen}"
+                )
+                if is_sm and item['name'] not in sm_items:
+                    sm_items.append(item['name'])
+                elif not is_sm and item['name'] in sm_items:
+                    sm_items.remove(item['name'])
+            st.session_state.kpi_assumptions['sm_opex_items'] = sm_items
+            apply_button()
 
 st.markdown("---")
+
+# --- LIVE STATEMENTS ---
+# Rendered from the native engine on every rerun, so edits show up without exporting the workbook
+st.markdown("### Live Statements")
+st.caption(f"Scenario: **{curr_scen}** · {st.session_state.horizon_months} months, {st.session_state.granularity.lower()}")
+try:
+    tables = live_statements(model_state_digest(), curr_scen)
+    for tab, (name, df) in zip(st.tabs(list(tables)), tables.items()):
+        with tab:
+            st.dataframe(styled_table(name, df), use_container_width=True)
+except Exception as e:
+    st.error(f"Error computing statements: {e}")
+
+# --- SCENARIO MANAGER ---
+# Scenarios are user-defined: clone the one being edited, delete it, or diff it against another.
+# Only the edited scenario has widgets, so the page costs the same with 3 scenarios or 40.
+with st.expander("Scenarios", expanded=False):
+    sm1, sm2, sm3 = st.columns([2, 1, 1])
+    new_name = sm1.text_input("New Scenario Name", key="new_scenario_name").strip()
+    sm2.button(
+        f"Clone '{st.session_state.scenario_to_edit}'", on_click=add_scenario, args=(st.session_state.scenario_to_edit,),
+        disabled=not new_name or new_name in scenario_list, use_container_width=True,
+        help="Add a scenario that starts as a copy of the one being edited"
+    )
+    sm3.button(
+        f"Delete '{st.session_state.scenario_to_edit}'", on_click=delete_scenario, args=(st.session_state.scenario_to_edit,),
+        disabled=len(scenario_list) == 1, use_container_width=True
+    )
+    if new_name and new_name in scenario_list:
+        st.caption(f"A scenario named '{new_name}' already exists.")
+
+    others = [name for name in scenario_list if name != st.session_state.scenario_to_edit]
+    if others:
+        other = st.selectbox(f"Compare '{st.session_state.scenario_to_edit}' With", others, key="scenario_compare")
+        diffs = scenario_diff(model_state_digest(), st.session_state.scenario_to_edit, other)
+        if diffs:
+            st.dataframe(pd.DataFrame(diffs, columns=["Driver", st.session_state.scenario_to_edit, other]).set_index("Driver"), use_container_width=True)
+        else:
+            st.caption("No driver differs between the two scenarios.")
+
+    st.markdown("**Outputs by Scenario**")
+    summary = pd.DataFrame(scenario_summary(model_state_digest())).T.rename(columns=OUTPUTS)
+    st.dataframe(summary.style.format("{:,.2f}", na_rep="N/A").format("{:.1%}", na_rep="N/A", subset=[OUTPUTS['rule_of_40']]).format("{:.0f}", subset=[OUTPUTS['min_cash_month']]), use_container_width=True)
+
+# --- SENSITIVITY ANALYSIS ---
+# Every Assumptions driver moved down / up one at a time; the whole sweep is one batched engine run
+with st.expander("Sensitivity Analysis (Tornado)", expanded=False):
+    c1, c2 = st.columns(2)
+    pct = c1.slider("Driver Change (±%)", min_value=1, max_value=50, value=int(DEFAULT_PCT * 100), key="tornado_pct") / 100
+    output = c2.selectbox("Output", list(OUTPUTS), format_func=OUTPUTS.get, key="tornado_output")
+    sweep = sensitivity_sweep(model_state_digest(), curr_scen, pct)
+    base_value = sweep['base'][output]
+    st.caption(f"Base case {OUTPUTS[output]}: {base_value:,.2f} · Scenario: {curr_scen}")
+    top = ranked(sweep, output)[:20]
+    bars = pd.DataFrame(
+        [{"Driver": row['driver'], "Case": f"-{pct:.0%}", "Change": row['low'][output] - base_value} for row in top] +
+        [{"Driver": row['driver'], "Case": f"+{pct:.0%}", "Change": row['high'][output] - base_value} for row in top]
+    )
+    chart = alt.Chart(bars).mark_bar().encode(
+        x=alt.X("Change:Q", title=f"Change in {OUTPUTS[output]}"),
+        y=alt.Y("Driver:N", sort=[row['driver'] for row in top], title=None),
+        color=alt.Color("Case:N", title=None),
+        tooltip=["Driver", "Case", alt.Tooltip("Change:Q", format=",.2f")],
+    )
+    st.altair_chart(chart, use_container_width=True)
+
+# --- GRID SWEEP ---
+# Two-driver what-if data table evaluated as one batched engine run
+with st.expander("Grid Sweep (Data Table)", expanded=False):
+    # Drivers are picked by key (labels repeat when two line items share a name)
+    grid_drivers = driver_values(st.session_state, curr_scen)
+    keys = list(grid_drivers)
+    first_growth = next((k for k in keys if k.endswith(".growth_y1")), keys[0])
+    axes = {}
+    for axis, col, default in (("x", st.columns(4), "churn_rate"), ("y", st.columns(4), first_growth)):
+        driver = col[0].selectbox(f"{axis.upper()} Driver", keys, index=keys.index(default) if default in keys else 0,
+                                  format_func=lambda k: grid_drivers[k][0], key=f"grid_{axis}_driver")
+        v = grid_drivers[driver][1]
+        low = col[1].number_input(f"{axis.upper()} Low", value=v * 0.5, format="%.4f", key=f"grid_{axis}_low_{driver}")
+        high = col[2].number_input(f"{axis.upper()} High", value=v * 1.5 if v else 1.0, format="%.4f", key=f"grid_{axis}_high_{driver}")
+        steps = col[3].number_input(f"{axis.upper()} Steps", min_value=2, max_value=GRID_MAX_STEPS, value=11, step=1, key=f"grid_{axis}_steps")
+        axes[axis] = (driver, [float(v) for v in grid_values(low, high, steps)])
+    grid_output = st.selectbox("Output", list(OUTPUTS), format_func=OUTPUTS.get, key="grid_output")
+    if axes['x'][0] == axes['y'][0]:
+        st.warning("Pick two different drivers.")
+    else:
+        spec = {'x': axes['x'][0], 'x_values': axes['x'][1], 'y': axes['y'][0], 'y_values': axes['y'][1], 'output': grid_output}
+        x_title, y_title = grid_drivers[spec['x']][0], grid_drivers[spec['y']][0]
+        st.session_state.grid_json = json.dumps(spec, sort_keys=True)
+        grid = grid_table(model_state_digest(), curr_scen, st.session_state.grid_json)
+        cells = pd.DataFrame(
+            [{"x": x, "y": y, "Value": grid[i][j]} for i, y in enumerate(spec['y_values']) for j, x in enumerate(spec['x_values'])]
+        )
+        heatmap = alt.Chart(cells).mark_rect().encode(
+            x=alt.X("x:O", title=x_title, axis=alt.Axis(format=".4~g")),
+            y=alt.Y("y:O", title=y_title, sort="descending", axis=alt.Axis(format=".4~g")),
+            color=alt.Color("Value:Q", title=OUTPUTS[grid_output], scale=alt.Scale(scheme="redyellowgreen")),
+            tooltip=[alt.Tooltip("x:Q", title=x_title), alt.Tooltip("y:Q", title=y_title), alt.Tooltip("Value:Q", format=",.2f")],
+        )
+        st.altair_chart(heatmap, use_container_width=True)
+        st.dataframe(pd.DataFrame(grid, index=pd.Index(spec['y_values'], name=y_title), columns=spec['x_values']), use_container_width=True)
+
+# --- MONTE CARLO SIMULATION ---
+# Distributions over the scenario's growth, churn, COGS %, working-capital % and interest-rate drivers;
+# all paths run through the batched engine
+with st.expander("Monte Carlo Simulation", expanded=False):
+    base = base_values(st.session_state, curr_scen)
+    spec_df = pd.DataFrame({
+        "Driver": list(base),
+        "Distribution": "Normal",
+        "Mean / Mode": list(base.values()),
+        "Low": [v * 0.8 for v in base.values()],
+        "High": [v * 1.2 for v in base.values()],
+        "Std Dev": [abs(v) * 0.1 for v in base.values()],
+    })
+    st.caption("Normal uses Mean and Std Dev, Uniform uses Low and High, Triangular uses Low, Mode and High; Fixed keeps the scenario value.")
+    spec_df = st.data_editor(
+        spec_df, hide_index=True, use_container_width=True, key=f"mc_specs_{curr_scen}",
+        column_config={
+            "Driver": st.column_config.TextColumn(disabled=True),
+            "Distribution": st.column_config.SelectboxColumn(options=["Fixed"] + DISTRIBUTIONS, required=True),
+        }
+    )
+    c1, c2, c3 = st.columns(3)
+    n_paths = c1.select_slider("Paths", options=SIMULATION_PATHS, value=10000)
+    seed = int(c2.number_input("Random Seed", value=42, step=1))
+    workers = int(c3.number_input("Worker Processes", min_value=1, max_value=os.cpu_count() or 1, value=1, step=1))
+
+    specs = {}
+    for _, row in spec_df.iterrows():
+        if row["Distribution"] == "Normal":
+            specs[row["Driver"]] = {'dist': "Normal", 'mean': row["Mean / Mode"], 'sd': row["Std Dev"]}
+        elif row["Distribution"] == "Uniform":
+            specs[row["Driver"]] = {'dist': "Uniform", 'low': row["Low"], 'high': row["High"]}
+        elif row["Distribution"] == "Triangular":
+            specs[row["Driver"]] = {'dist': "Triangular", 'low': row["Low"], 'mode': row["Mean / Mode"], 'high': row["High"]}
+
+    if st.button("Run Simulation"):
+        specs_json = json.dumps(specs, sort_keys=True)
+        with st.spinner(f"Simulating {n_paths:,} paths..."):
+            st.session_state.mc_metrics = run_simulation(model_state_digest(), curr_scen, specs_json, n_paths, seed, workers)
+
+    if 'mc_metrics' in st.session_state:
+        metrics = st.session_state.mc_metrics
+        st.metric("Paths with Negative Cash", f"{cash_shortfall_probability(metrics):.1%}")
+        st.dataframe(pd.DataFrame(percentile_table(metrics)).T.style.format("{:,.2f}", na_rep="N/A"), use_container_width=True)
+        metric = st.selectbox("Distribution of", list(METRICS), format_func=METRICS.get)
+        counts, edges = np.histogram(metrics[metric][np.isfinite(metrics[metric])], bins=40)
+        st.bar_chart(pd.DataFrame({"Paths": counts}, index=[f"{e:,.0f}" for e in edges[:-1]]))
+
+# --- GOAL SEEK (SIDEBAR) ---
+# Solved live on the native engine for the scenario being edited
+with st.sidebar:
+    st.header("Goal Seek")
+    st.caption(f"Scenario: **{curr_scen}**")
+    goal = st.radio("Solve for", ["Minimum Funding", "Breakeven Month", "Required Growth"], key="goal_kind")
+    digest = model_state_digest()
+    if goal == "Minimum Funding":
+        source = st.selectbox("Funding Source", list(FUNDING_DRIVERS), format_func=FUNDING_DRIVERS.get, key="goal_source")
+        floor = st.number_input("Minimum Cash Balance ($)", value=0.0, step=1000.0, key="goal_cash_floor")
+        amount = goal_seek(digest, curr_scen, source, floor)
+        if amount is None:
+            st.warning(f"No amount of {FUNDING_DRIVERS[source].lower()} keeps cash above {floor:,.0f} in every period.")
+        else:
+            st.metric(f"Minimum {FUNDING_DRIVERS[source]}", f"${amount:,.0f}")
+            st.button("Apply to Scenario", key="goal_apply_funding", on_click=apply_funding, args=(source, curr_scen, float(np.ceil(amount))))
+    elif goal == "Breakeven Month":
+        rows = {'net_income': "Net Income", 'ebitda': "EBITDA", 'net_cash_flow': "Net Cash Flow"}
+        row = st.selectbox("Measure", list(rows), format_func=rows.get, key="goal_row")
+        month = goal_seek(digest, curr_scen, 'breakeven', row)
+        st.metric(f"{rows[row]} Breakeven", f"Month {month}" if month else f"Not within {st.session_state.horizon_months} months")
+    else:
+        target_month = int(st.number_input("Net Income ≥ 0 by Month", min_value=1, max_value=int(st.session_state.horizon_months),
+                                           value=min(24, int(st.session_state.horizon_months)), step=1, key="goal_month"))
+        growth = goal_seek(digest, curr_scen, 'growth', target_month)
+        if growth is None:
+            st.warning("No growth rate reaches breakeven by that month.")
+        else:
+            st.metric("Required Annual Growth (all revenue, Y1-Y3)", f"{growth:.2%}")
+            st.button("Apply to Scenario", key="goal_apply_growth", on_click=apply_growth, args=(curr_scen, growth))
@@ -0,0 +1,665 @@
+import hashlib
+import json
+from io import BytesIO
+from itertools import count
+from openpyxl import Workbook
+from openpyxl.formatting.rule import ColorScaleRule
+from openpyxl.worksheet.datavalidation import DataValidation
+from openpyxl.utils import get_column_letter
+
+from buildprofile import count_cells, finish_profile, log_profile, mark, start_profile
+from cellstyles import apply_style, register_styles, styled_cell
+from colwidths import PADDING, column_widths, text_width
+from rowtemplates import spec_emitter
+from schema import (ENGINE_ROWS, GROUPS, KPI_FORMATS, KPI_LINES, QUARTERLY_LINES, key_name, model_lines, model_specs, quarterly_specs,
+                    state_structure)
+from timeline import DEFAULT_GRANULARITY, DEFAULT_HORIZON_MONTHS, plan_timeline, state_timeline
+
+# --- MODEL BUILDER ---
+# Workbook generation decoupled from Streamlit: every builder reads an explicit `state`
+# mapping with the same keys as the apps' session state (main.py / fms3mPlus.py use
+# generate_excel, fms3mDone.py uses generate_quarterly_excel). Importing this module only
+# pulls in openpyxl, so batch workers, tests and benchmarks never load streamlit or pandas.
+# Period columns (horizon and granularity) come from timeline.plan_timeline().
+
+# Default scenarios; a state's own list (state['scenarios'], any length) takes precedence
+SCENARIOS = ["Base", "Optimistic", "Pessimistic"]
+
+SUMMARY_SHEET = "Annual Summary"
+KPI_SHEET = "KPIs"
+SENSITIVITY_SHEET = "Sensitivity"
+GRID_SHEET = "Grid Sweep"
+COMPARISON_SHEET = "Scenario Comparison"
+
+
+# Every state key that feeds generate_excel(); the app's workbook cache is keyed on a digest of these
+MODEL_STATE_KEYS = [
+    'revenue_items', 'cogs_items', 'opex_items', 'capex_items',
+    'tax_assumptions', 'wc_assumptions', 'financing_assumptions', 'capex_assumptions', 'kpi_assumptions',
+    'scenario_to_run', 'horizon_months', 'granularity', 'scenarios'
+]
+
+# Every state key that feeds generate_quarterly_excel()
+QUARTERLY_STATE_KEYS = [
+    'revenue_items', 'cogs_items', 'opex_items', 'capex_items',
+    'wc_assumptions', 'tax_assumptions', 'financing_assumptions', 'horizon_months'
+]
+
+def state_digest(state, keys=MODEL_STATE_KEYS):
+    # sha256 of the keys' canonical JSON (sorted keys, fixed separators), so equal assumptions always hash
+    # the same; keys the state doesn't have (e.g. kpi_assumptions in fms3mPlus.py) are left out
+    snapshot = {key: state[key] for key in keys if key in state}
+    payload = json.dumps(snapshot, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def init_scenario_val(val, names=SCENARIOS):
+    return {s: val for s in names}
+
+def scenario_names(state):
+    # The state's scenario list; files saved before scenarios were user-defined have the three defaults
+    return list(state.get('scenarios', SCENARIOS))
+
+def switch_label(names):
+    # Active Scenario driver of the all-scenarios export (Assumptions!$C$2); long lists point at the headers
+    if len(names) <= 5:
+        return "Active Scenario (" + ", ".join(f"{i+1}={s}" for i, s in enumerate(names)) + ")"
+    return f"Active Scenario (1-{len(names)}, in header order)"
+
+# --- DEFAULT ASSUMPTIONS ---
+def default_state():
+    return {
+        'scenario_to_run': "Base",
+        'scenarios': list(SCENARIOS),
+        'horizon_months': DEFAULT_HORIZON_MONTHS,
+        'granularity': DEFAULT_GRANULARITY,
+        'revenue_items': [
+            {'name': 'Product Sales', 'value': init_scenario_val(100000.0), 
+             'growth_y1': init_scenario_val(0.10), 'growth_y2': init_scenario_val(0.07), 'growth_y3': init_scenario_val(0.04)},
+            {'name': 'Service Revenue', 'value': init_scenario_val(50000.0), 
+             'growth_y1': init_scenario_val(0.05), 'growth_y2': init_scenario_val(0.03), 'growth_y3': init_scenario_val(0.02)}
+        ],
+        'cogs_items': [
+            {'name': 'Hosting Costs', 'value': init_scenario_val(0.20), 'type': '% of Rev'},
+            {'name': 'Support Staff', 'value': init_scenario_val(20000.0), 'type': 'Fixed Amount'}
+        ],
+        'opex_items': [
+            {'name': 'Marketing', 'value': init_scenario_val(10000.0), 'type': 'Fixed Amount', 'param2': init_scenario_val(0.05)},
+            {'name': 'Sales Team', 'value': init_scenario_val(2.0), 'type': 'Personnel', 'param2': init_scenario_val(60000.0), 'revenue_threshold': init_scenario_val(50000.0)}
+        ],
+        'capex_items': [
+            {'name': 'Servers', 'cost': init_scenario_val(50000.0), 'deprec_rate': init_scenario_val(0.20)},
+            {'name': 'Laptops', 'cost': init_scenario_val(10000.0), 'deprec_rate': init_scenario_val(0.33)}
+        ],
+        'tax_assumptions': {
+            'tax_rate': init_scenario_val(0.25),
+            'payment_timing': 'Immediate',
+            'nol_balance': 0.0
+        },
+        'wc_assumptions': {
+            'beginning_cash': 50000.0,
+            'ar_percent': init_scenario_val(0.10),
+            'ap_percent': init_scenario_val(0.10),
+            'deferred_rev_percent': init_scenario_val(0.0),
+            'days_inventory': init_scenario_val(30.0),
+            'days_payable': init_scenario_val(30.0)
+        },
+        'financing_assumptions': {
+            'equity_raised': init_scenario_val(0.0),
+            'debt_issued': init_scenario_val(0.0),
+            'debt_interest_rate': init_scenario_val(0.05),
+            'cash_interest_rate': init_scenario_val(0.02),
+            'overdraft_interest_rate': init_scenario_val(0.10),
+            'debt_repayment_term': init_scenario_val(5)
+        },
+        'capex_assumptions': {
+            'maintenance_pct': init_scenario_val(0.02)  # 2% of revenue per month
+        },
+        'kpi_assumptions': {
+            'starting_customers': init_scenario_val(100.0),  # Initial customer count
+            'new_customers_monthly': init_scenario_val(10.0),  # New customers per month
+            'churn_rate_monthly': init_scenario_val(0.02),  # 2% monthly churn
+            'sm_opex_items': ['Marketing', 'Sales Team']  # Default S&M items
+        }
+    }
+
+def default_quarterly_state():
+    return {
+        'horizon_months': 12,  # four quarters
+        'revenue_items': [{'name': 'Subscription Revenue', 'value': 50000.0, 'growth': 0.05}],
+        'cogs_items': [{'name': 'Hosting Costs', 'value': 0.20, 'type': '% of Rev'}],
+        'opex_items': [{'name': 'Salaries', 'value': 15000.0, 'type': 'Fixed Amount', 'param2': 0.0}],
+        'capex_items': [{'name': 'Laptops', 'cost': 2000.0, 'deprec_rate': 0.20}],
+        'wc_assumptions': {
+            'beginning_cash': 10000.0,
+            'ar_percent': 0.10, 
+            'ap_percent': 0.10,
+            'deferred_rev_percent': 0.0
+        },
+        'tax_assumptions': {
+            'tax_rate': 0.25,
+            'payment_timing': 'Immediate' 
+        },
+        'financing_assumptions': {
+            'equity_raised': 0.0,
+            'debt_issued': 0.0,
+            'debt_interest_rate': 0.05,
+            'cash_interest_rate': 0.01
+        }
+    }
+
+# --- ROW LAYOUT ---
+# Every line of the formula sheets is planned before any cell is written: formulas can point at rows further
+# down (cash, debt, repayment, capex) without placeholder back-patching, and rows can be streamed out in order.
+# Each sheet is a list of (key, label, bold) lines, None for a blank row; row 1 is the period header.
+# The model sheet is titled after the horizon ("36 Month Model", "120 Month Model", ...). Its lines and the
+# KPI lines are declared in schema.py, together with their formulas.
+
+# Annual Summary lines: (label, model row key, summed over the year; otherwise the year-end balance)
+SUMMARY_PL_LINES = [
+    ("Total Revenue", 'total_rev', True), ("Total COGS", 'total_cogs', True), ("Gross Profit", 'gross_profit', True),
+    ("Total OpEx", 'total_opex', True), ("EBITDA", 'ebitda', True), ("Depreciation", 'deprec', True),
+    ("EBIT", 'ebit', True), ("Interest Expense", 'int_exp', True), ("Interest Income", 'int_inc', True),
+    ("EBT", 'ebt', True), ("Income Tax", 'tax', True), ("Net Income", 'ni', True),
+]
+SUMMARY_BS_LINES = [
+    ("Cash", 'cash', False), ("Accounts Receivable", 'ar', False), ("Inventory", 'inv', False),
+    ("Total Assets", 'total_assets', False), ("Accounts Payable", 'ap', False), ("Long Term Debt", 'debt', False),
+    ("Total Equity", 'total_le', False),  # Total Liab & Equity Row (approx)
+]
+
+
+def model_layout(state, include_kpis=True, timeline=None):
+    model = model_lines(state_structure(state))
+
+    summary = [('pl', "PROFIT & LOSS", True)]
+    summary += [(('year', src, is_sum), label, False) for label, src, is_sum in SUMMARY_PL_LINES]
+    summary += [('blank', "", False), ('bs', "BALANCE SHEET", True)]
+    summary += [(('year', src, is_sum), label, False) for label, src, is_sum in SUMMARY_BS_LINES]
+
+    layout = {(timeline or state_timeline(state))['sheet']: model, SUMMARY_SHEET: summary}
+    if include_kpis:
+        layout[KPI_SHEET] = [(key, label, True) for key, label in KPI_LINES]
+    return layout
+
+def row_numbers(lines):
+    # {key: worksheet row} for one planned sheet
+    return {line[0]: r for r, line in enumerate(lines, start=2) if line}
+
+# --- ASSUMPTIONS ---
+def assumption_rows(state, scen, include_kpis=True, switch=False):
+    # Assumptions sheet rows [(category, driver, value, number format)] for one scenario and the
+    # {key: Value-column reference} map the model formulas are built from, keyed like the engine's
+    # driver paths ('ar_pct', 'revenue.0.start'; see schema.py). switch puts the
+    # all-scenarios export's Active Scenario cell (1-3) first, at Assumptions!$C$2
+    currency_fmt = '#,##0.00'
+    pct_fmt = '0.00%'
+    assump_rows = []
+    refs = {}
+
+    def add_assump(category, driver, value, fmt=None, key=None):
+        ref = f"Assumptions!$C${len(assump_rows) + 2}"
+        assump_rows.append((category, driver, value, fmt))
+        if key: refs[key] = ref
+        return ref
+
+    if switch:
+        names = scenario_names(state)
+        add_assump("Global", switch_label(names), names.index(scen) + 1, None, 'scenario')
+    # Global Assumptions
+    add_assump("Global", "Tax Rate", state['tax_assumptions']['tax_rate'][scen], pct_fmt, 'tax_rate')
+    add_assump("Global", "Tax Payment (0=Imm, 1=NextYr)", 0 if state['tax_assumptions']['payment_timing'] == "Immediate" else 1, None, 'tax_timing')
+    add_assump("Global", "NOL Beginning Balance", state['tax_assumptions']['nol_balance'], currency_fmt, 'beg_nol')
+
+    # Working Capital
+    add_assump("Working Capital", "Beginning Cash", state['wc_assumptions']['beginning_cash'], currency_fmt, 'beg_cash')
+    add_assump("Working Capital", "AR % of Rev", state['wc_assumptions']['ar_percent'][scen], pct_fmt, 'ar_pct')
+    add_assump("Working Capital", "AP % of OpEx", state['wc_assumptions']['ap_percent'][scen], pct_fmt, 'ap_pct')
+    add_assump("Working Capital", "Deferred Rev %", state['wc_assumptions']['deferred_rev_percent'][scen], pct_fmt, 'dr_pct')
+    add_assump("Working Capital", "Days Inventory Outstanding (DIO)", state['wc_assumptions']['days_inventory'][scen], None, 'dio')
+    add_assump("Working Capital", "Days Payable Outstanding (DPO)", state['wc_assumptions']['days_payable'][scen], None, 'dpo')
+
+    # Financing
+    add_assump("Financing", "Equity Raised", state['financing_assumptions']['equity_raised'][scen], currency_fmt, 'equity')
+    add_assump("Financing", "Debt Issued", state['financing_assumptions']['debt_issued'][scen], currency_fmt, 'debt')
+    add_assump("Financing", "Debt Interest Rate", state['financing_assumptions']['debt_interest_rate'][scen], pct_fmt, 'debt_int')
+    add_assump("Financing", "Cash Interest Rate", state['financing_assumptions']['cash_interest_rate'][scen], pct_fmt, 'cash_int')
+    add_assump("Financing", "Overdraft Interest Rate", state['financing_assumptions']['overdraft_interest_rate'][scen], pct_fmt, 'od_int')
+    add_assump("Financing", "Debt Repayment Term (Years)", state['financing_assumptions']['debt_repayment_term'][scen], None, 'debt_term')
+
+    for i, item in enumerate(state['revenue_items']):
+        add_assump("Revenue", f"{item['name']} - Start Value", item['value'][scen], currency_fmt, f"revenue.{i}.start")
+        add_assump("Revenue", f"{item['name']} - Y1 Growth", item.get('growth_y1', {}).get(scen, 0.10), pct_fmt, f"revenue.{i}.growth_y1")
+        add_assump("Revenue", f"{item['name']} - Y2 Growth", item.get('growth_y2', {}).get(scen, 0.07), pct_fmt, f"revenue.{i}.growth_y2")
+        add_assump("Revenue", f"{item['name']} - Y3 Growth", item.get('growth_y3', {}).get(scen, 0.04), pct_fmt, f"revenue.{i}.growth_y3")
+
+    for i, item in enumerate(state['cogs_items']):
+        if item['type'] == "% of Rev":
+            add_assump("COGS", f"{item['name']} - % of Rev", item['value'][scen], pct_fmt, f"cogs.{i}.val")
+        else:
+            add_assump("COGS", f"{item['name']} - Fixed Amt", item['value'][scen], currency_fmt, f"cogs.{i}.val")
+
+    for i, item in enumerate(state['opex_items']):
+        if item['type'] == "Fixed Amount":
+            add_assump("OpEx", f"{item['name']} - Start Value", item['value'][scen], currency_fmt, f"opex.{i}.val")
+            add_assump("OpEx", f"{item['name']} - Growth", item.get('param2', {}).get(scen, 0.0), pct_fmt, f"opex.{i}.growth")
+        elif item['type'] == "% of Rev":
+            add_assump("OpEx", f"{item['name']} - % of Rev", item['value'][scen], pct_fmt, f"opex.{i}.val")
+        elif item['type'] == "Personnel":
+            add_assump("OpEx", f"{item['name']} - Headcount", item['value'][scen], None, f"opex.{i}.count")
+            add_assump("OpEx", f"{item['name']} - Avg Salary", item.get('param2', {}).get(scen, 0.0), currency_fmt, f"opex.{i}.salary")
+            if item.get('revenue_threshold'):
+                add_assump("OpEx", f"{item['name']} - Revenue Threshold ($)", item.get('revenue_threshold', {}).get(scen, 50000.0), currency_fmt, f"opex.{i}.threshold")
+
+    for i, item in enumerate(state['capex_items']):
+        add_assump("CapEx", f"{item['name']} - Cost", item['cost'][scen], currency_fmt, f"capex.{i}.cost")
+        add_assump("CapEx", f"{item['name']} - Deprec Rate", item.get('deprec_rate', {}).get(scen, 0.20), pct_fmt, f"capex.{i}.rate")
+
+    # Maintenance CapEx
+    add_assump("CapEx", "Maintenance CapEx (% of Revenue)", state['capex_assumptions'].get('maintenance_pct', {}).get(scen, 0.02), pct_fmt, 'maint_capex')
+
+    # KPI Assumptions Export
+    if include_kpis:
+        add_assump("KPIs", "Starting Customers", state['kpi_assumptions']['starting_customers'][scen], None, 'start_cust')
+        add_assump("KPIs", "New Customers Monthly", state['kpi_assumptions']['new_customers_monthly'][scen], None, 'new_cust')
+        add_assump("KPIs", "Monthly Churn Rate", state['kpi_assumptions']['churn_rate_monthly'][scen], pct_fmt, 'churn_rate')
+
+    return assump_rows, refs
+
+def assumption_formats(assump_rows, refs):
+    # {driver key: number format} of assumption_rows() output (refs point at the rows' Value cells)
+    return {key: assump_rows[int(ref.rsplit('$', 1)[1]) - 2][3] for key, ref in refs.items()}
+
+# --- EXCEL GENERATION FUNCTION (planned horizon, scenarios) ---
+def generate_excel(state, include_kpis=True, write_only=False, sensitivity_pct=None, grid_spec=None, all_scenarios=False, profile=None, result=None):
+    # write_only streams each row to disk as it is appended (flat memory for long horizons); the
+    # returned workbook can then only be saved once. sensitivity_pct (e.g. 0.10) adds a Sensitivity
+    # sheet of engine-computed +/- sweeps over every Assumptions driver; grid_spec
+    # ({'x', 'x_values', 'y', 'y_values', 'output'}) adds a two-driver Grid Sweep values sheet.
+    # all_scenarios lists every scenario on the Assumptions sheet behind an Active Scenario switch
+    # (one live model for whichever is picked) and adds a Scenario Comparison sheet of all of them.
+    # profile (buildprofile.start_profile()) records time, cells and allocations per phase.
+    # result is the engine run to size columns from (compute_model() of scenario_to_run, or
+    # compute_scenarios() of every scenario with all_scenarios); made here when not given
+    mark(profile, "Setup")
+    wb = Workbook(write_only=write_only)
+    if not write_only:
+        wb.remove(wb.active) # sheets are created in order below
+    # Enable Iterative Calculation for Circular References
+    wb.calculation.iterate = True
+    wb.calculation.iterateCount = 100
+    wb.calculation.iterateDelta = 0.001
+
+    scen = state['scenario_to_run']
+    tl = state_timeline(state)
+    ppy = tl['periods_per_year']
+    mpp = tl['months_per_period']
+    model_sheet = tl['sheet']
+
+    # Styles: registered once, stamped onto cells by number format (KPI and sensitivity formats included)
+    styles = register_styles(wb)
+    currency_fmt = '#,##0.00'
+
+    # 1. Assumptions (collected first: the KPI drivers are listed last but referenced by the model)
+    mark(profile, "Assumptions")
+    assump_rows, refs = assumption_rows(state, scen, include_kpis, switch=all_scenarios)
+    # All-scenarios export: every scenario's values side by side, the Value column picks one via the switch cell
+    names = scenario_names(state)
+    scenario_rows = [assumption_rows(state, s, include_kpis, switch=True)[0] for s in names] if all_scenarios else []
+
+    layout = model_layout(state, include_kpis, tl)
+    rows = row_numbers(layout[model_sheet])
+    kpi_rows = row_numbers(layout[KPI_SHEET]) if include_kpis else {}
+
+    # --- COLUMN SIZING ---
+    mark(profile, "Column Sizing")
+    # Widths must be known before the first row is streamed, so they come from the inputs rather than the written cells
+
+    # 1. Assumptions Sheet (Static Values): each driver's value as displayed in its number format
+    assump_header = ["Category", "Driver", "Active"] + names if all_scenarios else ["Category", "Driver", "Value", "Notes"]
+    assump_widths = [len(h) for h in assump_header]
+    for j, rows_j in enumerate([assump_rows] + scenario_rows):
+        for category, driver, value, fmt in rows_j:
+            assump_widths[0] = max(assump_widths[0], len(str(category)))
+            assump_widths[1] = max(assump_widths[1], len(str(driver)))
+            assump_widths[2+j] = max(assump_widths[2+j], text_width(value, fmt))
+
+    # 2. Formula Sheets: the widest engine-computed value of each column (of any scenario when the model is switchable)
+    from engine import annual, compute_model, compute_scenarios
+    from xlsx_values import line_series
+    if result is None and all_scenarios:
+        result = compute_scenarios(state, names, tl, include_kpis=include_kpis)
+    elif result is None:
+        result = compute_model(state, scen, tl, include_kpis=include_kpis)
+    n_years = len(tl['years'])
+    summary_series = {key: annual(result[ENGINE_ROWS[key[1]]], ppy, key[2])
+                      for key, label, bold in filter(None, layout[SUMMARY_SHEET]) if key[0] == 'year'}
+    # Header labels are the minimum widths
+    period_min = [len(label) for label in tl['labels']]
+    model_widths = column_widths([(series, currency_fmt) for row, label, series in
+                                  line_series(layout[model_sheet], result)], len(tl['cols']), period_min)
+    summary_widths = column_widths([(series, currency_fmt) for series in summary_series.values()], n_years, [len(f"Year {y+1}") for y in range(n_years)])
+    if include_kpis:
+        kpi_fmts = {label: KPI_FORMATS.get(key, currency_fmt) for key, label in KPI_LINES}
+        kpi_widths = column_widths([(series, kpi_fmts[label]) for row, label, series in
+                                    line_series(layout[KPI_SHEET], result)], len(tl['cols']), [max(w, len("N/A")) for w in period_min])
+
+    def append(ws, cells):
+        count_cells(profile, len(cells))
+        ws.append(cells)
+
+    def header_row(ws, values, align=True):
+        style = styles['header' if align else 'header_left']
+        append(ws, [styled_cell(ws, v, style) for v in values])
+
+    def number_cell(ws, value, fmt):
+        return styled_cell(ws, value, styles[fmt] if fmt else None)
+
+    def period_sheet(title, lines, header, values, widths, phases=None):
+        # Streams one planned sheet: label column plus one cell per period from values[key]().
+        # widths: one per value column; phases: {line key: profile phase started at that line}
+        ws = wb.create_sheet(title)
+        ws.column_dimensions['A'].width = max(len(str(line[1])) for line in lines + [(None, header[0])] if line) + PADDING # Label column
+        for i, width in enumerate(widths):
+            ws.column_dimensions[get_column_letter(i+2)].width = width
+        header_row(ws, header)
+        for line in lines:
+            if line is None:
+                append(ws, [])
+                continue
+            key, label, bold = line
+            if phases and key in phases:
+                mark(profile, phases[key])
+            cells = [styled_cell(ws, label, styles['label'] if bold else None)]
+            cells += [number_cell(ws, v, fmt) for v, fmt in (values[key]() if key in values else ())]
+            append(ws, cells)
+
+    mark(profile, "Assumptions Sheet")
+    ws_assump = wb.create_sheet("Assumptions")
+    for i, width in enumerate(assump_widths):
+        ws_assump.column_dimensions[get_column_letter(i+1)].width = width + 2
+    header_row(ws_assump, assump_header, align=False)
+    for i, (category, driver, value, fmt) in enumerate(assump_rows):
+        if all_scenarios and i > 0:
+            # Value column: =CHOOSE(switch, first scenario, second, ...) of this row
+            r_a = i + 2
+            value = "=CHOOSE($C$2," + ",".join(f"{get_column_letter(4+j)}{r_a}" for j in range(len(names))) + ")"
+        cells = [category, driver, number_cell(ws_assump, value, fmt)]
+        if all_scenarios and i > 0:
+            cells += [number_cell(ws_assump, rows_j[i][2], fmt) for rows_j in scenario_rows]
+        append(ws_assump, cells)
+    if all_scenarios:
+        switch = DataValidation(type="whole", operator="between", formula1="1", formula2=str(len(names)), showErrorMessage=True)
+        switch.add("C2")
+        ws_assump.data_validations.append(switch)
+
+    # 2. Main Sheet
+    # Every formula comes from the line templates of schema.model_specs(), filled in against the planned rows.
+    # values[key]() returns the row's (value, number format) per period; rows are only expanded while their
+    # sheet is streamed, so one row of formulas is resident at a time. Steady-state periods are written as
+    # shared formulas (rowtemplates.spec_emitter)
+    mark(profile, "Model Formulas")
+    specs = model_specs(state_structure(state), mpp, include_kpis)
+    fields = {
+        'row': {key_name(key): r for key, r in list(rows.items()) + list(kpi_rows.items())},
+        'ref': refs, 'ppy': ppy, 'mpp': mpp, 'days': tl['days_per_period'], 'm': f"'{model_sheet}'!",
+        'first': {group: rows[header] + 1 for group, (header, total, result) in GROUPS.items()},
+        'last': {group: rows[total] - 1 for group, (header, total, result) in GROUPS.items()},
+    }
+    model_ids = count()  # shared formula indexes, per sheet
+    values = {key: spec_emitter(specs[key], r, tl, fields, currency_fmt, model_ids) for key, r in rows.items() if key in specs}
+
+    period_sheet(model_sheet, layout[model_sheet], ["Item"] + tl['labels'], values, model_widths,
+                 {'pl': "Profit & Loss", 'bs': "Balance Sheet", 'cf': "Cash Flow"})
+
+    # 3. Annual Summary Sheet
+    # Year n sums its periods of the model (B-M, N-Y, Z-AK for 36 months); balances take the last period
+    mark(profile, SUMMARY_SHEET)
+    years = tl['years']
+    summ_values = {}
+    for key, label, bold in filter(None, layout[SUMMARY_SHEET]):
+        if key[0] != 'year':
+            continue
+        src_row = rows[key[1]]
+        if key[2]:
+            summ_values[key] = lambda src_row=src_row: [(f"=SUM('{model_sheet}'!{start}{src_row}:{end}{src_row})", currency_fmt) for start, end in years]
+        else:
+            summ_values[key] = lambda src_row=src_row: [(f"='{model_sheet}'!{end}{src_row}", currency_fmt) for start, end in years]
+    period_sheet(SUMMARY_SHEET, layout[SUMMARY_SHEET], ["Item"] + [f"Year {y+1}" for y in range(len(years))], summ_values, summary_widths)
+
+    # 4. KPIs Sheet (main app only)
+    if include_kpis:
+        mark(profile, KPI_SHEET)
+        kpi_ids = count()
+        kpi_values = {key: spec_emitter(specs[key], r, tl, fields, KPI_FORMATS.get(key, currency_fmt), kpi_ids) for key, r in kpi_rows.items()}
+
+        period_sheet(KPI_SHEET, layout[KPI_SHEET], ["Metric"] + tl['labels'], kpi_values, kpi_widths)
+
+    # 5. Sensitivity Sheet (values, not formulas): one row per driver in tornado order
+    if sensitivity_pct:
+        mark(profile, SENSITIVITY_SHEET)
+        from sensitivity import OUTPUTS, OUTPUT_FORMATS, ranked, sensitivity, swing
+        sweep = sensitivity(state, scen, sensitivity_pct)
+        driver_fmts = assumption_formats(assump_rows, refs)
+        step = f"{sensitivity_pct:.0%}"
+        header = ["Driver", "Base Value", f"-{step} Value", f"+{step} Value"]
+        for label in OUTPUTS.values():
+            header += [f"{label} -{step}", f"{label} +{step}", f"{label} Swing"]
+
+        ws_sens = wb.create_sheet(SENSITIVITY_SHEET)
+        ws_sens.column_dimensions['A'].width = max(len(row['driver']) for row in sweep['rows'] + [{'driver': "Base Case"}]) + 2
+        for i in range(2, len(header) + 1):
+            ws_sens.column_dimensions[get_column_letter(i)].width = max(16, len(header[i-1]) + 2)
+        header_row(ws_sens, header)
+
+        def sens_cell(value, fmt):
+            return number_cell(ws_sens, value, fmt)
+
+        cells = [styled_cell(ws_sens, "Base Case", styles['label']), None, None, None]
+        for key in OUTPUTS:
+            cells += [sens_cell(sweep['base'][key], OUTPUT_FORMATS[key]), sens_cell(sweep['base'][key], OUTPUT_FORMATS[key]), None]
+        append(ws_sens, cells)
+        for row in ranked(sweep, next(iter(OUTPUTS))):
+            fmt = driver_fmts.get(row['key'])
+            cells = [row['driver'], sens_cell(row['base'], fmt), sens_cell(row['low_value'], fmt), sens_cell(row['high_value'], fmt)]
+            for key in OUTPUTS:
+                # NaN outputs (e.g. Rule of 40 inside Year 1) are left blank
+                low, high = (None if v != v else v for v in (row['low'][key], row['high'][key]))
+                cells += [sens_cell(low, OUTPUT_FORMATS[key]), sens_cell(high, OUTPUT_FORMATS[key]), sens_cell(swing(row, key), OUTPUT_FORMATS[key])]
+            append(ws_sens, cells)
+
+    # 6. Grid Sweep Sheet (values, not formulas): output for every (y, x) driver pair, colour-scaled
+    if grid_spec:
+        mark(profile, GRID_SHEET)
+        from sensitivity import OUTPUTS, OUTPUT_FORMATS, driver_values, grid_sweep
+        # Drivers by key; their display labels only go into the corner cell
+        x_key, y_key, output = grid_spec['x'], grid_spec['y'], grid_spec['output']
+        grid = grid_sweep(state, scen, x_key, grid_spec['x_values'], y_key, grid_spec['y_values'])[output]
+        driver_fmts = assumption_formats(assump_rows, refs)
+        sweep_drivers = driver_values(state, scen)
+        x_label, y_label = sweep_drivers[x_key][0], sweep_drivers[y_key][0]
+        out_fmt = OUTPUT_FORMATS[output]
+        corner = f"{y_label} (rows) / {x_label} (columns)"
+
+        ws_grid = wb.create_sheet(GRID_SHEET)
+        ws_grid.column_dimensions['A'].width = max(len(corner), len(OUTPUTS[output])) + 2
+        for i in range(len(grid_spec['x_values'])):
+            ws_grid.column_dimensions[get_column_letter(i+2)].width = 16
+
+        append(ws_grid, [styled_cell(ws_grid, OUTPUTS[output], styles['label'])])
+        # Driver values on the axes: header / label styles with the driver's number format on top
+        header = [styled_cell(ws_grid, corner, styles['header'])] + [styled_cell(ws_grid, float(v), styles['header']) for v in grid_spec['x_values']]
+        for cell in header[1:]:
+            if driver_fmts.get(x_key):
+                cell.number_format = driver_fmts[x_key]
+        append(ws_grid, header)
+        for y, row in zip(grid_spec['y_values'], grid):
+            y_cell = styled_cell(ws_grid, float(y), styles['label'])
+            if driver_fmts.get(y_key):
+                y_cell.number_format = driver_fmts[y_key]
+            append(ws_grid, [y_cell] + [number_cell(ws_grid, None if v != v else float(v), out_fmt) for v in row])
+        data_range = f"B3:{get_column_letter(len(grid_spec['x_values']) + 1)}{len(grid_spec['y_values']) + 2}"
+        ws_grid.conditional_formatting.add(data_range, ColorScaleRule(
+            start_type='min', start_color='F8696B', mid_type='percentile', mid_value=50, mid_color='FFEB84',
+            end_type='max', end_color='63BE7B'))
+
+    # 7. Scenario Comparison Sheet (values): Annual Summary lines, every scenario side by side per year,
+    # from one batched engine run
+    if all_scenarios:
+        mark(profile, COMPARISON_SHEET)
+        # The sizing run above is already batched over every scenario: (scenarios, years) per line,
+        # laid out year by year
+        comp_series = {key: series.T.reshape(-1) for key, series in summary_series.items()}
+        comp_values = {key: lambda series=series: [(float(v), currency_fmt) for v in series] for key, series in comp_series.items()}
+        header = ["Item"] + [f"Year {y+1} {s}" for y in range(len(years)) for s in names]
+        comp_widths = column_widths([(series, currency_fmt) for series in comp_series.values()], len(header) - 1,
+                                    [len(h) for h in header[1:]])
+        period_sheet(COMPARISON_SHEET, layout[SUMMARY_SHEET], header, comp_values, comp_widths)
+
+    return wb
+
+# --- EXCEL GENERATION FUNCTION (quarters, single case) ---
+def generate_quarterly_excel(state):
+    wb = Workbook()
+    tl = plan_timeline(state.get('horizon_months', 12), "Quarterly")
+    quarters = tl['labels']
+    ppy = tl['periods_per_year']
+    
+    # 1. Assumptions Sheet
+    ws_assump = wb.active
+    ws_assump.title = "Assumptions"
+    
+    # Styles
+    currency_fmt = '#,##0'
+    pct_fmt = '0.0%'
+    styles = register_styles(wb, {"Currency": currency_fmt, "Percent": pct_fmt})
+    currency = styles[currency_fmt]
+    label = styles['label']
+    
+    ws_assump.append(["Category", "Driver", "Value", "Notes"])
+    for cell in ws_assump[1]:
+        apply_style(cell, styles['header_left'])
+    
+    row_idx = 2
+    refs = {} # Store cell references: refs['tax_rate'] = "Assumptions!C5"
+    
+    def add_assump(category, driver, value, fmt=None, key=None):
+        nonlocal row_idx
+        ws_assump.cell(row=row_idx, column=1, value=category)
+        ws_assump.cell(row=row_idx, column=2, value=driver)
+        apply_style(ws_assump.cell(row=row_idx, column=3, value=value), styles[fmt] if fmt else None)
+        ref = f"Assumptions!$C${row_idx}"
+        if key: refs[key] = ref
+        row_idx += 1
+        return ref
+
+    # Global Assumptions
+    add_assump("Global", "Tax Rate", state['tax_assumptions']['tax_rate'], pct_fmt, 'tax_rate')
+    add_assump("Global", "Tax Payment (0=Imm, 1=NextYr)", 0 if state['tax_assumptions']['payment_timing'] == "Immediate" else 1, None, 'tax_timing')
+    add_assump("Working Capital", "Beginning Cash", state['wc_assumptions']['beginning_cash'], currency_fmt, 'beg_cash')
+    add_assump("Working Capital", "AR % of Rev", state['wc_assumptions']['ar_percent'], pct_fmt, 'ar_pct')
+    add_assump("Working Capital", "AP % of OpEx", state['wc_assumptions']['ap_percent'], pct_fmt, 'ap_pct')
+    add_assump("Working Capital", "Deferred Rev %", state['wc_assumptions'].get('deferred_rev_percent', 0.0), pct_fmt, 'dr_pct')
+    add_assump("Financing", "Equity Raised", state['financing_assumptions']['equity_raised'], currency_fmt, 'equity')
+    add_assump("Financing", "Debt Issued", state['financing_assumptions']['debt_issued'], currency_fmt, 'debt')
+    add_assump("Financing", "Debt Interest Rate", state['financing_assumptions']['debt_interest_rate'], pct_fmt, 'debt_int')
+    add_assump("Financing", "Cash Interest Rate", state['financing_assumptions']['cash_interest_rate'], pct_fmt, 'cash_int')
+    
+    # Item Drivers (keyed by driver path, like the monthly model's; see schema.py)
+    for i, item in enumerate(state['revenue_items']):
+        add_assump("Revenue", f"{item['name']} - Start Value", item['value'], currency_fmt, f"revenue.{i}.start")
+        add_assump("Revenue", f"{item['name']} - Growth", item['growth'], pct_fmt, f"revenue.{i}.growth")
+
+    for i, item in enumerate(state['cogs_items']):
+        if item['type'] == "% of Rev":
+            add_assump("COGS", f"{item['name']} - % of Rev", item['value'], pct_fmt, f"cogs.{i}.val")
+        else:
+            add_assump("COGS", f"{item['name']} - Fixed Amt", item['value'], currency_fmt, f"cogs.{i}.val")
+
+    for i, item in enumerate(state['opex_items']):
+        if item['type'] == "Fixed Amount":
+            add_assump("OpEx", f"{item['name']} - Start Value", item['value'], currency_fmt, f"opex.{i}.val")
+            add_assump("OpEx", f"{item['name']} - Growth", item.get('param2', 0.0), pct_fmt, f"opex.{i}.growth")
+        elif item['type'] == "% of Rev":
+            add_assump("OpEx", f"{item['name']} - % of Rev", item['value'], pct_fmt, f"opex.{i}.val")
+        elif item['type'] == "Personnel":
+            add_assump("OpEx", f"{item['name']} - Headcount", item['value'], None, f"opex.{i}.count")
+            add_assump("OpEx", f"{item['name']} - Avg Salary", item.get('param2', 0.0), currency_fmt, f"opex.{i}.salary")
+
+    for i, item in enumerate(state['capex_items']):
+        add_assump("CapEx", f"{item['name']} - Cost", item['cost'], currency_fmt, f"capex.{i}.cost")
+        add_assump("CapEx", f"{item['name']} - Deprec Rate", item.get('deprec_rate', 0.20), pct_fmt, f"capex.{i}.rate")
+
+    ws_assump.column_dimensions['A'].width = 20
+    ws_assump.column_dimensions['B'].width = 30
+    ws_assump.column_dimensions['C'].width = 15
+
+    # 2. Main Sheet: the quarterly lines and formulas of schema.py, planned before any row is written
+    ws = wb.create_sheet("3 Statement Model")
+    
+    headers = ["Item"] + quarters
+    ws.append(headers)
+    for cell in ws[1]:
+        apply_style(cell, styles['header'])
+
+    structure = state_structure(state)
+    lines = model_lines(structure, QUARTERLY_LINES)
+    specs = quarterly_specs(structure)
+    rows = row_numbers(lines)
+    fields = {
+        'row': {key_name(key): r for key, r in rows.items()}, 'ref': refs, 'ppy': ppy,
+        'first': {group: rows[header] + 1 for group, (header, total, result) in GROUPS.items()},
+        'last': {group: rows[total] - 1 for group, (header, total, result) in GROUPS.items()},
+    }
+    for line in lines:
+        if line is None:
+            ws.append([])
+            continue
+        key, name, bold = line
+        cells = [styled_cell(ws, name, label if bold else None)]
+        if key in specs:
+            cells += [styled_cell(ws, value, currency) for value, fmt in spec_emitter(specs[key], rows[key], tl, fields)()]
+        ws.append(cells)
+
+    ws.column_dimensions['A'].width = 30
+    for col in tl['cols']:
+        ws.column_dimensions[col].width = 15
+        
+    return wb
+
+def workbook_bytes(state, with_values=False, include_kpis=True, sensitivity_pct=None, grid_spec=None, all_scenarios=False, profile=None):
+    # Serialized .xlsx, streamed in write-only mode; with_values stores engine-computed results next to each formula.
+    # Every build logs one "workbook_build" line with its phases; pass a profile to read them back (profile['summary'])
+    profile = profile or start_profile()
+    tl = state_timeline(state)
+    scen = state['scenario_to_run']
+    names = scenario_names(state)
+    # One engine run sizes the columns and, with_values, fills the cached values
+    mark(profile, "Engine")
+    from engine import compute_model, compute_scenarios, scenario_result
+    if all_scenarios:
+        result = compute_scenarios(state, names, tl, include_kpis=include_kpis)
+    else:
+        result = compute_model(state, scen, tl, include_kpis=include_kpis)
+    wb = generate_excel(state, include_kpis, write_only=True, sensitivity_pct=sensitivity_pct, grid_spec=grid_spec,
+                        all_scenarios=all_scenarios, profile=profile, result=result)
+    if with_values:
+        # Formulas carry their computed results, so there is no need to recalculate on open
+        wb.calculation.fullCalcOnLoad = False
+    mark(profile, "Serialization")
+    buffer = BytesIO()
+    wb.save(buffer)
+    data = buffer.getvalue()
+    if with_values:
+        mark(profile, "Cached Values")
+        from xlsx_values import model_cell_values, embed_cached_values
+        if all_scenarios:
+            result = scenario_result(result, names.index(scen))
+        values = model_cell_values(model_layout(state, include_kpis, tl), result, tl)
+        if all_scenarios:
+            # The switch's CHOOSE cells hold the active scenario's values
+            rows, refs = assumption_rows(state, scen, include_kpis, switch=True)
+            values["Assumptions"] = {f"C{i+2}": row[2] for i, row in enumerate(rows) if i > 0}
+        data = embed_cached_values(data, values)
+    log_profile(finish_profile(profile), digest=state_digest(state), scenario=scen, horizon_months=tl['horizon_months'],
+                granularity=tl['granularity'], with_values=with_values, bytes=len(data))
+    return data
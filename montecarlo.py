@@ -0,0 +1,130 @@
+import copy
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from engine import extract_drivers, get_driver, project, set_driver
+from timeline import state_timeline
+
+# --- MONTE CARLO SIMULATION ---
+# Samples uncertain drivers around one scenario and runs every path through the batched engine:
+# each driver becomes a (paths,) array, so a chunk of paths is one project() call, not a loop.
+# Chunks bound memory (the engine keeps every row for the whole chunk) and may be spread across
+# processes; sampling happens up front with one seeded generator, so results don't depend on workers.
+
+DISTRIBUTIONS = ["Normal", "Uniform", "Triangular"]
+DEFAULT_PATHS = 10000
+CHUNK_PATHS = 5000
+PERCENTILES = [5, 10, 25, 50, 75, 90, 95]
+
+METRICS = {
+    'ending_cash': "Ending Cash",
+    'min_cash': "Minimum Cash",
+    'final_year_ni': "Net Income (Final Year)",
+    'ltv_cac': "LTV:CAC (Final Period)",
+}
+
+
+def simulated_drivers(drivers):
+    # [(label, path into the drivers dict, lower bound)] of every driver a simulation may vary;
+    # labels match the Assumptions sheet
+    out = []
+    for i, item in enumerate(drivers['revenue']):
+        for y in (1, 2, 3):
+            out.append((f"{item['name']} - Y{y} Growth", ('revenue', i, f'growth_y{y}'), -1.0))
+    out.append(("Monthly Churn Rate", ('churn_rate',), 0.0))
+    for i, item in enumerate(drivers['cogs']):
+        if item['type'] == "% of Rev":
+            out.append((f"{item['name']} - % of Rev", ('cogs', i, 'val'), 0.0))
+    out += [
+        ("AR % of Rev", ('ar_pct',), 0.0), ("AP % of OpEx", ('ap_pct',), 0.0),
+        ("Debt Interest Rate", ('debt_int',), 0.0), ("Cash Interest Rate", ('cash_int',), 0.0),
+        ("Overdraft Interest Rate", ('od_int',), 0.0),
+    ]
+    return out
+
+
+def base_values(state, scen):
+    # {driver label: scenario value} of every driver a simulation may vary
+    drivers = extract_drivers(state, scen)
+    return {label: float(get_driver(drivers, path)) for label, path, lower in simulated_drivers(drivers)}
+
+
+def sample(spec, n_paths, rng):
+    # spec: {'dist': "Normal", 'mean', 'sd'} | {'dist': "Uniform", 'low', 'high'} | {'dist': "Triangular", 'low', 'mode', 'high'}
+    dist = spec['dist']
+    if dist == "Normal":
+        return rng.normal(spec['mean'], spec['sd'], n_paths)
+    if dist == "Uniform":
+        return rng.uniform(spec['low'], spec['high'], n_paths)
+    if dist == "Triangular":
+        if spec['low'] == spec['high']:
+            return np.full(n_paths, float(spec['low']))
+        return rng.triangular(spec['low'], spec['mode'], spec['high'], n_paths)
+    raise ValueError(f"unknown distribution: {dist}")
+
+
+# Engine rows the metrics are read from: project() skips every line none of them depends on
+METRIC_ROWS = ('cash', 'net_income', 'ltv_cac')
+
+
+def path_metrics(result, periods_per_year):
+    # Per-path outcomes of one batched engine result
+    cash = result['cash']
+    return {
+        'ending_cash': cash[..., -1],
+        'min_cash': cash.min(axis=-1),
+        'final_year_ni': result['net_income'][..., -periods_per_year:].sum(axis=-1),
+        'ltv_cac': result['ltv_cac'][..., -1],
+    }
+
+
+def _run_chunk(drivers, n_periods, periods_per_year):
+    # Process-pool entry point: one project() call over a chunk of paths
+    return path_metrics(project(drivers, n_periods, periods_per_year, METRIC_ROWS), periods_per_year)
+
+
+def simulate(state, scen, specs, n_paths=DEFAULT_PATHS, seed=None, chunk_paths=CHUNK_PATHS, workers=1):
+    # specs: {driver label: distribution spec} for any of simulated_drivers(); other drivers stay at the scenario value.
+    # Returns {metric: (n_paths,) array}
+    tl = state_timeline(state)
+    base = extract_drivers(state, scen)
+    rng = np.random.default_rng(seed)
+    samples = []
+    for label, path, lower in simulated_drivers(base):
+        if label in specs:
+            samples.append((path, np.maximum(sample(specs[label], n_paths, rng), lower)))
+    if not samples:
+        # Nothing uncertain: every path is the scenario itself
+        single = _run_chunk(base, tl['n_periods'], tl['periods_per_year'])
+        return {key: np.full(n_paths, float(single[key])) for key in METRICS}
+
+    chunks = []
+    for start in range(0, n_paths, chunk_paths):
+        drivers = copy.deepcopy(base)
+        for path, values in samples:
+            set_driver(drivers, path, values[start:start + chunk_paths])
+        chunks.append(drivers)
+
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_run_chunk, chunks, [tl['n_periods']] * len(chunks), [tl['periods_per_year']] * len(chunks)))
+    else:
+        parts = [_run_chunk(d, tl['n_periods'], tl['periods_per_year']) for d in chunks]
+    return {key: np.concatenate([p[key] for p in parts]) for key in METRICS}
+
+
+def percentile_table(metrics, percentiles=PERCENTILES):
+    # {metric label: {"P5": value, ..., "Mean": value}}
+    table = {}
+    for key, label in METRICS.items():
+        values = metrics[key]
+        row = {f"P{p}": v for p, v in zip(percentiles, np.nanpercentile(values, percentiles))}
+        row["Mean"] = np.nanmean(values)
+        table[label] = row
+    return table
+
+
+def cash_shortfall_probability(metrics):
+    # Share of paths whose cash goes negative at any point in the horizon
+    return float(np.mean(metrics['min_cash'] < 0))
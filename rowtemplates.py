@@ -0,0 +1,100 @@
+from openpyxl.worksheet.formula import ArrayFormula
+
+# --- ROW TEMPLATES ---
+# A statement line is declared once as a pair of column templates: first(col) for Period 1 and
+# rest(col, prev_col) for every later period, over the timeline's precomputed column letters.
+# row_emitter() compiles that into the function a sheet calls while streaming the row. With shared
+# formulas on, each run of steady-state periods is written as one Excel shared formula: the master cell
+# holds the text and the range, the others only its index, so neither Python nor the XML spells the
+# formula out per period. That requires rest() to be column-relative: the current and previous column
+# are its only relative references, everything else is absolute (Assumptions!$C$5, $B7). A template
+# that changes shape along the row (e.g. a different growth driver each year) names the breaks with
+# segment(col): a new shared formula starts wherever the segment changes. spec_emitter() does the same
+# for a line declared as text templates in the model schema (schema.py).
+
+
+class SharedFormula(ArrayFormula):
+    # <f t="shared">: openpyxl writes any ArrayFormula's attributes and text, so the master carries
+    # ref + text and the followers just si; readers (Excel, LibreOffice, openpyxl) translate the
+    # master's relative references to each follower's column
+    t = "shared"
+
+    def __init__(self, si, ref=None, text=None):
+        super().__init__(ref, text)
+        self.si = si
+
+    def __iter__(self):
+        yield 't', self.t
+        if self.ref:
+            yield 'ref', self.ref
+        yield 'si', str(self.si)
+
+
+def _lead_cell(value, fmt):
+    # Leading text (e.g. "N/A" before a year-on-year line has a prior year) is left unformatted
+    return value, None if isinstance(value, str) and not value.startswith('=') else fmt
+
+
+def row_emitter(row, cols, prevs, first, rest=None, fmt=None, segment=None, shared_ids=None, lead=None):
+    # () -> [(value, number format)] per period of one line at worksheet row `row`.
+    # rest defaults to first (the whole row is one template). lead: periods written from first
+    # (default 1, or 0 without rest). shared_ids: a per-sheet itertools.count for shared formula
+    # indexes, None writes every formula out in full
+    steady = rest or (lambda c, p: first(c))
+    start = min(len(cols), (1 if rest else 0) if lead is None else lead)
+    if shared_ids is None:
+        return lambda: ([_lead_cell(first(c), fmt) for c in cols[:start]] +
+                        [(steady(c, p), fmt) for c, p in zip(cols[start:], prevs[start:])])
+
+    # Runs of steady-state columns [a, b) that share one template
+    bounds = [start]
+    if segment:
+        keys = [segment(c) for c in cols]
+        bounds += [i for i in range(start + 1, len(cols)) if keys[i] != keys[i-1]]
+    bounds.append(len(cols))
+    runs = [(a, b) for a, b in zip(bounds, bounds[1:]) if a < b]
+
+    def emit():
+        out = [_lead_cell(first(c), fmt) for c in cols[:start]]
+        for a, b in runs:
+            master = steady(cols[a], prevs[a])
+            if b - a == 1 or not (isinstance(master, str) and master.startswith('=')):
+                # Constants (and single cells) are written as they are
+                out.append((master, fmt))
+                out += [(steady(c, p), fmt) for c, p in zip(cols[a+1:b], prevs[a+1:b])]
+                continue
+            si = next(shared_ids)
+            out.append((SharedFormula(si, f"{cols[a]}{row}:{cols[b-1]}{row}", master), fmt))
+            out += [(SharedFormula(si), fmt)] * (b - a - 1)
+        return out
+    return emit
+
+
+def spec_emitter(spec, row, timeline, fields, fmt=None, shared_ids=None):
+    # row_emitter() of a schema line spec ({'first', 'rest', 'lead', 'lag'}, see schema.py). fields fills
+    # every placeholder but {c} and {p} once ({'row', 'ref', 'first', 'last', 'ppy', ...}), so a period
+    # only formats its column letters in
+    cols = timeline['cols']
+    ppy = timeline['periods_per_year']
+
+    def fill(template):
+        if not isinstance(template, str):
+            return lambda c, p: template
+        text = template.format(c="{c}", p="{p}", **fields)
+        return lambda c, p: text.format(c=c, p=p)
+
+    prevs = timeline['prev_cols']
+    if spec.get('lag') == 'year':
+        prevs = [None] * min(ppy, len(cols)) + cols[:-ppy]
+    lead = ppy if spec.get('lead') == 'year' else None
+    head = fill(spec['first'])
+    first = lambda c: head(c, None)
+    if 'rest' not in spec:
+        return row_emitter(row, cols, prevs, first, None, fmt, shared_ids=shared_ids, lead=lead)
+    if not isinstance(spec['rest'], list):
+        return row_emitter(row, cols, prevs, first, fill(spec['rest']), fmt, shared_ids=shared_ids, lead=lead)
+    # One template per year, the last one repeating: each is its own shared formula
+    steps = [fill(template) for template in spec['rest']]
+    step_of = {c: min(y, len(steps) - 1) for c, y in zip(cols, timeline['year_of'])}
+    return row_emitter(row, cols, prevs, first, lambda c, p: steps[step_of[c]](c, p), fmt,
+                       segment=step_of.get, shared_ids=shared_ids, lead=lead)
@@ -0,0 +1,168 @@
+import numpy as np
+
+from engine import extract_drivers, get_driver, project, set_driver
+from model_builder import scenario_names
+from timeline import state_timeline
+
+# --- SCENARIO STORE ---
+# Scenario-set operations on a columnar view of the assumptions: one (drivers, scenarios) float array
+# plus a name -> column index. Cloning a scenario is one column copy, diffing two is one vectorised
+# comparison, and any number of scenarios evaluate as a single batched project() call built straight
+# from the array columns. The per-item {scenario: value} dicts stay the editing and file format; a
+# store is read from them in one pass and a scenario is written back to them in O(drivers).
+
+
+def scenario_entries(state):
+    # [(label, path to a {scenario: value} dict in the state, engine driver path or None, fallback)] for every
+    # scenario-keyed assumption; labels and fallbacks match the Assumptions sheet
+    out = [
+        ("Tax Rate", ('tax_assumptions', 'tax_rate'), ('tax_rate',), None),
+        ("AR % of Rev", ('wc_assumptions', 'ar_percent'), ('ar_pct',), None),
+        ("AP % of OpEx", ('wc_assumptions', 'ap_percent'), ('ap_pct',), None),
+        ("Deferred Rev %", ('wc_assumptions', 'deferred_rev_percent'), ('dr_pct',), None),
+        ("Days Inventory Outstanding (DIO)", ('wc_assumptions', 'days_inventory'), ('dio',), None),
+        ("Days Payable Outstanding (DPO)", ('wc_assumptions', 'days_payable'), ('dpo',), None),
+        ("Equity Raised", ('financing_assumptions', 'equity_raised'), ('equity',), None),
+        ("Debt Issued", ('financing_assumptions', 'debt_issued'), ('debt',), None),
+        ("Debt Interest Rate", ('financing_assumptions', 'debt_interest_rate'), ('debt_int',), None),
+        ("Cash Interest Rate", ('financing_assumptions', 'cash_interest_rate'), ('cash_int',), None),
+        ("Overdraft Interest Rate", ('financing_assumptions', 'overdraft_interest_rate'), ('od_int',), None),
+        ("Debt Repayment Term (Years)", ('financing_assumptions', 'debt_repayment_term'), ('debt_term',), None),
+    ]
+    for i, item in enumerate(state['revenue_items']):
+        out.append((f"{item['name']} - Start Value", ('revenue_items', i, 'value'), ('revenue', i, 'start'), None))
+        for y, fallback in ((1, 0.10), (2, 0.07), (3, 0.04)):
+            out.append((f"{item['name']} - Y{y} Growth", ('revenue_items', i, f'growth_y{y}'), ('revenue', i, f'growth_y{y}'), fallback))
+    for i, item in enumerate(state['cogs_items']):
+        out.append((f"{item['name']} - {'% of Rev' if item['type'] == '% of Rev' else 'Fixed Amt'}", ('cogs_items', i, 'value'), ('cogs', i, 'val'), None))
+    for i, item in enumerate(state['opex_items']):
+        # Every dict the item carries is kept (a type switch must not lose values); only the current type's feed the engine
+        kind = item['type']
+        if kind == "Fixed Amount":
+            out.append((f"{item['name']} - Start Value", ('opex_items', i, 'value'), ('opex', i, 'val'), None))
+        elif kind == "% of Rev":
+            out.append((f"{item['name']} - % of Rev", ('opex_items', i, 'value'), ('opex', i, 'val'), None))
+        else:
+            out.append((f"{item['name']} - Headcount", ('opex_items', i, 'value'), ('opex', i, 'count'), None))
+        if 'param2' in item or kind != "% of Rev":
+            label, path = {"Fixed Amount": ("Growth", 'growth'), "Personnel": ("Avg Salary", 'salary')}.get(kind, ("Param 2", None))
+            out.append((f"{item['name']} - {label}", ('opex_items', i, 'param2'), path and ('opex', i, path), 0.0))
+        if 'revenue_threshold' in item:
+            engine_path = ('opex', i, 'threshold') if kind == "Personnel" and item['revenue_threshold'] else None
+            out.append((f"{item['name']} - Revenue Threshold ($)", ('opex_items', i, 'revenue_threshold'), engine_path, 50000.0))
+    for i, item in enumerate(state['capex_items']):
+        out.append((f"{item['name']} - Cost", ('capex_items', i, 'cost'), ('capex', i, 'cost'), None))
+        out.append((f"{item['name']} - Deprec Rate", ('capex_items', i, 'deprec_rate'), ('capex', i, 'rate'), 0.20))
+    out += [
+        ("Maintenance CapEx (% of Revenue)", ('capex_assumptions', 'maintenance_pct'), ('maint_capex',), 0.02),
+        ("Starting Customers", ('kpi_assumptions', 'starting_customers'), ('start_cust',), None),
+        ("New Customers Monthly", ('kpi_assumptions', 'new_customers_monthly'), ('new_cust',), None),
+        ("Monthly Churn Rate", ('kpi_assumptions', 'churn_rate_monthly'), ('churn_rate',), None),
+    ]
+    return out
+
+
+def _values_dict(state, path):
+    # The {scenario: value} dict at path, created empty if an older file doesn't have it
+    parent = get_driver(state, path[:-1])
+    if path[-1] not in parent:
+        parent[path[-1]] = {}
+    return parent[path[-1]]
+
+
+def scenario_store(state):
+    # {'names': [scenario], 'index': {scenario: column}, 'labels', 'paths', 'engine_paths': [per driver],
+    #  'integer': (drivers,) bool (written back as int), 'values': (drivers, scenarios) float array}
+    names = scenario_names(state)
+    entries = scenario_entries(state)
+    values = np.empty((len(entries), len(names)))
+    integer = np.zeros(len(entries), dtype=bool)
+    for k, (label, path, engine_path, fallback) in enumerate(entries):
+        parent = get_driver(state, path[:-1])
+        d = parent.get(path[-1], {})
+        row = [d.get(name, fallback) if fallback is not None else d[name] for name in names]
+        values[k] = row
+        integer[k] = all(isinstance(v, int) and not isinstance(v, bool) for v in row)
+    return {
+        'names': list(names),
+        'index': {name: j for j, name in enumerate(names)},
+        'labels': [e[0] for e in entries],
+        'paths': [e[1] for e in entries],
+        'engine_paths': [e[2] for e in entries],
+        'integer': integer,
+        'values': values,
+    }
+
+
+def clone_scenario(store, source, name):
+    # New store with `name` appended as a copy of `source`
+    if name in store['index']:
+        raise ValueError(f"scenario {name!r} already exists")
+    column = store['values'][:, store['index'][source]]
+    return dict(store, names=store['names'] + [name], index=dict(store['index'], **{name: len(store['names'])}),
+                values=np.column_stack([store['values'], column]))
+
+
+def drop_scenario(store, name):
+    # New store without `name`
+    j = store['index'][name]
+    names = store['names'][:j] + store['names'][j+1:]
+    return dict(store, names=names, index={n: i for i, n in enumerate(names)}, values=np.delete(store['values'], j, axis=1))
+
+
+def diff_scenarios(store, a, b, rel_tol=1e-9):
+    # [(driver label, value in a, value in b)] for every driver that differs between two scenarios
+    va = store['values'][:, store['index'][a]]
+    vb = store['values'][:, store['index'][b]]
+    changed = np.flatnonzero(~np.isclose(va, vb, rtol=rel_tol, atol=0.0))
+    return [(store['labels'][k], float(va[k]), float(vb[k])) for k in changed]
+
+
+def write_scenario(state, store, name):
+    # Writes one store column into the state's {scenario: value} dicts (adding the scenario to the list if new)
+    column = store['values'][:, store['index'][name]]
+    for k, path in enumerate(store['paths']):
+        v = column[k]
+        _values_dict(state, path)[name] = int(v) if store['integer'][k] else float(v)
+    if name not in state.setdefault('scenarios', scenario_names(state)):
+        state['scenarios'].append(name)
+
+
+def remove_scenario(state, name):
+    # Deletes a scenario from the list and from every {scenario: value} dict; the last one can't be removed
+    names = scenario_names(state)
+    if len(names) == 1:
+        raise ValueError("a model needs at least one scenario")
+    for label, path, engine_path, fallback in scenario_entries(state):
+        get_driver(state, path[:-1]).get(path[-1], {}).pop(name, None)
+    state['scenarios'] = [n for n in names if n != name]
+    for key in ('scenario_to_run', 'scenario_to_edit'):
+        if state.get(key) == name:
+            state[key] = state['scenarios'][0]
+
+
+def store_drivers(state, store, names=None):
+    # Batched engine drivers, one entry per scenario in names (default: all), taken from the store columns;
+    # drivers that are not scenario-keyed (beginning cash, NOL, tax timing) come from the state
+    names = store['names'] if names is None else names
+    cols = [store['index'][name] for name in names]
+    drivers = extract_drivers(state, scenario_names(state)[0])
+    for k, path in enumerate(store['engine_paths']):
+        if path:
+            set_driver(drivers, path, store['values'][k, cols])
+    return drivers
+
+
+def evaluate_scenarios(state, store=None, names=None):
+    # One project() call over many scenarios: rows come back as (len(names), periods)
+    store = store or scenario_store(state)
+    tl = state_timeline(state)
+    return project(store_drivers(state, store, names), tl['n_periods'], tl['periods_per_year'])
+
+
+def scenario_outputs(state, store=None):
+    # {scenario: {output: value}} of the sensitivity outputs for every scenario, from one batched run
+    from sensitivity import sweep_outputs
+    store = store or scenario_store(state)
+    outputs = sweep_outputs(evaluate_scenarios(state, store), state_timeline(state))
+    return {name: {key: float(out[j]) for key, out in outputs.items()} for j, name in enumerate(store['names'])}
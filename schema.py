@@ -0,0 +1,471 @@
+from string import Formatter
+
+# --- MODEL SCHEMA ---
+# The three-statement model declared once as data. Every line has a key, a label and (for formula rows)
+# Excel templates; the workbook writer fills the templates in, the engine evaluates one calculation per
+# line, and both follow the dependency graph read off the templates, so the three can't drift apart.
+#
+# Templates are str.format strings. {c} is the period's column and {p} the column it compares against
+# (the previous period, or a year back for lines with lag='year'); {row[key]} is a line's worksheet row
+# (items are 'revenue.0', 'opex.2', ...), {ref[path]} an Assumptions driver cell ('ar_pct',
+# 'revenue.0.start'), {first[group]} / {last[group]} the rows a group's total sums, and {m} the model
+# sheet prefix for KPI formulas. {ppy}, {mpp} and {days} are periods per year, months per period and
+# days per period. A spec is {'first': Period 1 template, 'rest': later periods (omitted: same as first;
+# a list: one template per year, the last repeating)}, plus 'lead' (periods written from first, 'year'
+# for a whole year) and 'lag' ('year': {p} is a year back). Non-string templates are constants.
+
+# Item groups: header line, total line, engine result key
+GROUPS = {
+    'revenue': ('rev_header', 'total_rev', 'revenue_lines'),
+    'cogs': ('cogs_header', 'total_cogs', 'cogs_lines'),
+    'opex': ('opex_header', 'total_opex', 'opex_lines'),
+}
+
+# Model sheet lines in order: (key, label, bold); None is a blank row. Each group's items follow its header
+MODEL_LINES = [
+    ('pl', "PROFIT & LOSS", True), ('rev_header', "Revenue", True),
+    ('total_rev', "Total Revenue", True), ('cogs_header', "Cost of Goods Sold", True),
+    ('total_cogs', "Total COGS", True), ('gross_profit', "Gross Profit", True), None,
+    ('opex_header', "Operating Expenses", True),
+    ('total_opex', "Total Opex", True), ('ebitda', "EBITDA", True), ('deprec', "Depreciation", False),
+    ('ebit', "EBIT", True), ('int_exp', "Interest Expense (Debt)", False),
+    ('od_int', "Interest Expense (Overdraft)", False), ('int_inc', "Interest Income", False),
+    ('ebt', "EBT", True), ('nol_beg', "NOL Beginning Balance", False), ('taxable_inc', "Taxable Income", False),
+    ('nol_end', "NOL Ending Balance", False), ('tax', "Income Tax", False), ('ni', "Net Income", True),
+    None, None,
+    ('bs', "BALANCE SHEET", True), ('assets_header', "Assets", True),
+    ('cash', "Cash & Equivalents", False), ('ar', "Accounts Receivable", False), ('inv', "Inventory", False),
+    ('fa', "Fixed Assets (Gross)", False), ('ad', "Accumulated Depreciation", False),
+    ('total_assets', "Total Assets", True),
+    None,
+    ('le_header', "Liabilities & Equity", True),
+    ('ap', "Accounts Payable", False), ('dr', "Deferred Revenue", False), ('tp', "Tax Payable", False),
+    ('debt', "Long Term Debt", False), ('cs', "Common Stock", False), ('re', "Retained Earnings", False),
+    ('total_le', "Total Liab & Equity", True),
+    None, None,
+    ('cf', "CASH FLOW STATEMENT", True), ('cfo_header', "Cash from Operations", True),
+    ('cf_ni', "Net Income", False), ('cf_deprec', "Depreciation", False), ('chg_ar', "Change in AR", False),
+    ('chg_inv', "Change in Inventory", False), ('chg_ap', "Change in AP", False),
+    ('chg_dr', "Change in Deferred Rev", False), ('chg_tp', "Change in Tax Payable", False),
+    ('cfi_header', "Cash from Investing", True), ('capex', "CapEx", False),
+    ('cff_header', "Cash from Financing", True), ('stock_iss', "Issuance of Common Stock", False),
+    ('debt_iss', "Issuance of Debt", False), ('repay', "Debt Repayment", False),
+    ('ncf', "Net Cash Flow", True),
+    None,
+    ('ending_cash', "Ending Cash Balance", True),
+]
+
+KPI_LINES = [
+    ('cust_count', "Customer Count"), ('mrr', "MRR"), ('sm_spend', "S&M Spend"), ('cac', "CAC"),
+    ('gm_pct', "Gross Margin %"), ('arpa', "ARPA"), ('ltv', "LTV"), ('ltv_cac', "LTV:CAC Ratio"),
+    ('gp_per_cust', "Gross Profit per Customer"), ('cac_payback', "CAC Payback (Months)"),
+    ('rev_growth', "Revenue Growth % (YoY)"), ('ebitda_margin', "EBITDA Margin %"), ('rule40', "Rule of 40"),
+]
+
+# KPI number formats other than currency
+KPI_FORMATS = {
+    'cust_count': '#,##0', 'gm_pct': '0.00%', 'ltv_cac': '0.00', 'cac_payback': '0.0',
+    'rev_growth': '0.00%', 'ebitda_margin': '0.00%', 'rule40': '0.00%',
+}
+
+# Line key -> engine result row (engine.project() output names)
+ENGINE_ROWS = {
+    'total_rev': 'total_revenue', 'total_cogs': 'total_cogs', 'gross_profit': 'gross_profit',
+    'total_opex': 'total_opex', 'ebitda': 'ebitda', 'deprec': 'depreciation', 'ebit': 'ebit',
+    'int_exp': 'interest_expense', 'od_int': 'overdraft_interest', 'int_inc': 'interest_income',
+    'ebt': 'ebt', 'nol_beg': 'nol_beginning', 'taxable_inc': 'taxable_income', 'nol_end': 'nol_ending',
+    'tax': 'income_tax', 'ni': 'net_income',
+    'cash': 'cash', 'ar': 'accounts_receivable', 'inv': 'inventory', 'fa': 'fixed_assets',
+    'ad': 'accumulated_depreciation', 'total_assets': 'total_assets', 'ap': 'accounts_payable',
+    'dr': 'deferred_revenue', 'tp': 'tax_payable', 'debt': 'long_term_debt', 'cs': 'common_stock',
+    're': 'retained_earnings', 'total_le': 'total_liab_equity',
+    'cf_ni': 'net_income', 'cf_deprec': 'depreciation', 'chg_ar': 'change_ar', 'chg_inv': 'change_inventory',
+    'chg_ap': 'change_ap', 'chg_dr': 'change_deferred_revenue', 'chg_tp': 'change_tax_payable', 'capex': 'capex',
+    'stock_iss': 'stock_issuance', 'debt_iss': 'debt_issuance', 'repay': 'debt_repayment',
+    'ncf': 'net_cash_flow', 'ending_cash': 'ending_cash',
+    'cust_count': 'customers', 'mrr': 'mrr', 'sm_spend': 'sm_spend', 'cac': 'cac', 'gm_pct': 'gross_margin',
+    'arpa': 'arpa', 'ltv': 'ltv', 'ltv_cac': 'ltv_cac', 'gp_per_cust': 'gp_per_customer',
+    'cac_payback': 'cac_payback', 'rev_growth': 'revenue_growth_yoy', 'ebitda_margin': 'ebitda_margin',
+    'rule40': 'rule_of_40',
+}
+
+# Model lines with a single template for every period
+_SAME = {
+    'total_rev': "=SUM({c}{first[revenue]}:{c}{last[revenue]})",
+    'total_cogs': "=SUM({c}{first[cogs]}:{c}{last[cogs]})",
+    'gross_profit': "={c}{row[total_rev]}-{c}{row[total_cogs]}",
+    'total_opex': "=SUM({c}{first[opex]}:{c}{last[opex]})",
+    'ebitda': "={c}{row[gross_profit]}-{c}{row[total_opex]}",
+    'ebit': "={c}{row[ebitda]}-{c}{row[deprec]}",
+    'int_exp': "={c}{row[debt]}*{ref[debt_int]}/{ppy}",
+    'ebt': "={c}{row[ebit]}-{c}{row[int_exp]}-{c}{row[od_int]}+{c}{row[int_inc]}",
+    'taxable_inc': "=MAX(0, {c}{row[ebt]}-{c}{row[nol_beg]})",
+    'nol_end': "=IF({c}{row[ebt]}<0, {c}{row[nol_beg]}-{c}{row[ebt]}, MAX(0, {c}{row[nol_beg]}-{c}{row[ebt]}))",
+    'tax': "={c}{row[taxable_inc]}*{ref[tax_rate]}",
+    'ni': "={c}{row[ebt]}-{c}{row[tax]}",
+    'cash': "={c}{row[ending_cash]}",
+    'ar': "={c}{row[total_rev]}*{ref[ar_pct]}",
+    'inv': "=({c}{row[total_cogs]}/{days})*{ref[dio]}",  # Approx 30 days/month
+    'total_assets': "=SUM({c}{row[cash]}:{c}{row[ad]})",
+    'ap': "=({c}{row[total_cogs]}/{days})*{ref[dpo]}",  # Approx 30 days/month
+    'dr': "={c}{row[total_rev]}*{ref[dr_pct]}",
+    'cs': "={ref[beg_cash]}+{ref[equity]}",
+    'total_le': "=SUM({c}{row[ap]}:{c}{row[re]})",
+    'cf_ni': "={c}{row[ni]}",
+    'cf_deprec': "={c}{row[deprec]}",
+    'ncf': "=SUM({c}{row[cf_ni]}:{c}{row[chg_tp]})+SUM({c}{row[capex]}:{c}{row[capex]})+SUM({c}{row[stock_iss]}:{c}{row[repay]})",
+}
+
+# Model lines with a Period 1 variant: (first, rest)
+_OPENING = {
+    # Interest is driven by the prior period's cash (Beginning Cash in Period 1), which keeps the
+    # model free of circular references
+    'od_int': ("=IF({ref[beg_cash]}<0, ABS({ref[beg_cash]})*{ref[od_int]}/{ppy}, 0)",
+               "=IF({p}{row[cash]}<0, ABS({p}{row[cash]})*{ref[od_int]}/{ppy}, 0)"),
+    'int_inc': ("=IF({ref[beg_cash]}>0, {ref[beg_cash]}*{ref[cash_int]}/{ppy}, 0)",
+                "=IF({p}{row[cash]}>0, {p}{row[cash]}*{ref[cash_int]}/{ppy}, 0)"),
+    # Taxes (NOL logic)
+    'nol_beg': ("={ref[beg_nol]}", "={p}{row[nol_end]}"),
+    'fa': ("=-{c}{row[capex]}", "={p}{row[fa]}-{c}{row[capex]}"),
+    'ad': ("=-{c}{row[deprec]}", "={p}{row[ad]}-{c}{row[deprec]}"),
+    # Tax Payable: Immediate = 0; Deferred = previous + this period's tax (accumulates)
+    'tp': ("=IF({ref[tax_timing]}=0, 0, {c}{row[tax]})", "=IF({ref[tax_timing]}=0, 0, {p}{row[tp]}+{c}{row[tax]})"),
+    'debt': ("={ref[debt]}", "={p}{row[debt]}-{c}{row[repay]}"),
+    're': ("={c}{row[ni]}", "={p}{row[re]}+{c}{row[ni]}"),
+    'chg_ar': ("=-{c}{row[ar]}", "={p}{row[ar]}-{c}{row[ar]}"),
+    'chg_inv': ("=-{c}{row[inv]}", "={p}{row[inv]}-{c}{row[inv]}"),
+    'chg_ap': ("={c}{row[ap]}", "={c}{row[ap]}-{p}{row[ap]}"),
+    'chg_dr': ("={c}{row[dr]}", "={c}{row[dr]}-{p}{row[dr]}"),
+    'chg_tp': ("={c}{row[tp]}", "={c}{row[tp]}-{p}{row[tp]}"),
+    'stock_iss': ("={ref[beg_cash]}+{ref[equity]}", 0),
+    'debt_iss': ("={ref[debt]}", 0),
+    # Repayment = Debt / (Term * periods per year) if Term > 0
+    'repay': (0, "=IF({ref[debt_term]}>0, {ref[debt]}/({ref[debt_term]}*{ppy}), 0)"),
+    'ending_cash': ("=0+{c}{row[ncf]}", "={p}{row[ending_cash]}+{c}{row[ncf]}"),
+}
+
+# KPI lines with a single template (monthly drivers scale with {mpp} where a period is longer)
+_KPI_SAME = {
+    'gm_pct': "=IF({m}{c}{row[total_rev]}>0, {m}{c}{row[gross_profit]}/{m}{c}{row[total_rev]}, 0)",
+    'arpa': "=IF({c}{row[cust_count]}>0, {c}{row[mrr]}/{c}{row[cust_count]}, 0)",
+    'ltv': "=IF({ref[churn_rate]}>0, ({c}{row[arpa]}*{c}{row[gm_pct]})/{ref[churn_rate]}, 0)",
+    'ltv_cac': "=IF({c}{row[cac]}>0, {c}{row[ltv]}/{c}{row[cac]}, 0)",
+    'cac_payback': "=IF({c}{row[gp_per_cust]}>0, {c}{row[cac]}/{c}{row[gp_per_cust]}, 0)",
+    'ebitda_margin': "=IF({m}{c}{row[total_rev]}>0, {m}{c}{row[ebitda]}/{m}{c}{row[total_rev]}, 0)",
+}
+
+
+# The single-case quarterly model (generate_quarterly_excel): a smaller statement set with its own line
+# order and simpler drivers (one growth rate per item, interest on cash only, no inventory or KPIs)
+QUARTERLY_LINES = [
+    ('pl', "PROFIT & LOSS", True), ('rev_header', "Revenue", True), ('total_rev', "Total Revenue", True), None,
+    ('cogs_header', "Cost of Goods Sold", True), ('total_cogs', "Total COGS", True), ('gross_profit', "Gross Profit", True), None,
+    ('opex_header', "Operating Expenses", True), ('total_opex', "Total Opex", True), ('ebitda', "EBITDA", True),
+    ('deprec', "Depreciation", False), ('ebit', "EBIT", True), ('int_exp', "Interest Expense", False),
+    ('int_inc', "Interest Income", False), ('ebt', "EBT", True), ('tax', "Income Tax", False), ('ni', "Net Income", True),
+    None, None,
+    ('bs', "BALANCE SHEET", True), ('assets_header', "Assets", True),
+    ('cash', "Cash & Equivalents", False), ('ar', "Accounts Receivable", False), ('fa', "Fixed Assets (Gross)", False),
+    ('ad', "Accumulated Depreciation", False), ('total_assets', "Total Assets", True),
+    None,
+    ('le_header', "Liabilities & Equity", True),
+    ('ap', "Accounts Payable", False), ('dr', "Deferred Revenue", False), ('tp', "Tax Payable", False),
+    ('debt', "Long Term Debt", False), ('cs', "Common Stock", False), ('re', "Retained Earnings", False),
+    ('total_le', "Total Liab & Equity", True),
+    None, None,
+    ('cf', "CASH FLOW STATEMENT", True), ('cfo_header', "Cash from Operations", True),
+    ('cf_ni', "Net Income", False), ('cf_deprec', "Depreciation", False), ('chg_ar', "Change in AR", False),
+    ('chg_ap', "Change in AP", False), ('chg_dr', "Change in Deferred Rev", False), ('chg_tp', "Change in Tax Payable", False),
+    ('cfi_header', "Cash from Investing", True), ('capex', "CapEx", False),
+    ('cff_header', "Cash from Financing", True), ('stock_iss', "Issuance of Common Stock", False),
+    ('debt_iss', "Issuance of Debt", False),
+    ('ncf', "Net Cash Flow", True),
+    None,
+    ('ending_cash', "Ending Cash Balance", True),
+]
+
+
+def key_name(key):
+    # Template name of a line key: ('revenue', 0) -> 'revenue.0'
+    return key if isinstance(key, str) else f"{key[0]}.{key[1]}"
+
+
+def driver_path(name):
+    # Engine driver path of a {ref[...]} name: 'revenue.0.start' -> ('revenue', 0, 'start')
+    return tuple(int(part) if part.isdigit() else part for part in name.split('.'))
+
+
+def state_structure(state):
+    # The shape of a model as the schema needs it, from an assumptions mapping: items per group
+    # ({'name', 'type', 'threshold'}; threshold only matters for Personnel) and the S&M OpEx names.
+    # engine.extract_drivers() output has the same shape
+    return {
+        'revenue': [{'name': item['name']} for item in state['revenue_items']],
+        'cogs': [{'name': item['name'], 'type': item['type']} for item in state['cogs_items']],
+        'opex': [{'name': item['name'], 'type': item['type'],
+                  'threshold': True if item['type'] == "Personnel" and item.get('revenue_threshold') else None}
+                 for item in state['opex_items']],
+        'capex': [{'name': item['name']} for item in state['capex_items']],
+        'sm_opex_items': list(state.get('kpi_assumptions', {}).get('sm_opex_items', [])),
+    }
+
+
+def model_lines(structure, lines=MODEL_LINES):
+    # Model sheet layout: (key, label, bold) lines, None for blanks, with each group's items after its header
+    headers = {header: group for group, (header, total, result) in GROUPS.items()}
+    out = []
+    for line in lines:
+        out.append(line)
+        if line and line[0] in headers:
+            group = headers[line[0]]
+            out += [((group, i), item['name'], False) for i, item in enumerate(structure[group])]
+    return out
+
+
+def _item_specs(structure, months_per_period):
+    specs = {}
+    for i, item in enumerate(structure['revenue']):
+        # Each period compounds the annual growth of its own year (Y3 growth from Year 3 onwards)
+        specs[('revenue', i)] = {
+            'first': f"={{ref[revenue.{i}.start]}}/{{ppy}}",
+            'rest': [f"={{p}}{{row[revenue.{i}]}}*((1+{{ref[revenue.{i}.{g}]}})^(1/{{ppy}}))" for g in ('growth_y1', 'growth_y2', 'growth_y3')],
+        }
+    for i, item in enumerate(structure['cogs']):
+        if item['type'] == "% of Rev":
+            specs[('cogs', i)] = {'first': f"={{c}}{{row[total_rev]}}*{{ref[cogs.{i}.val]}}"}
+        else:
+            specs[('cogs', i)] = {'first': f"={{ref[cogs.{i}.val]}}/{{ppy}}"}
+    for i, item in enumerate(structure['opex']):
+        kind = item['type']
+        if kind == "Fixed Amount":
+            specs[('opex', i)] = {'first': f"={{ref[opex.{i}.val]}}/{{ppy}}",
+                                  'rest': f"={{p}}{{row[opex.{i}]}}*((1+{{ref[opex.{i}.growth]}})^(1/{{ppy}}))"}
+        elif kind == "% of Rev":
+            specs[('opex', i)] = {'first': f"={{c}}{{row[total_rev]}}*{{ref[opex.{i}.val]}}"}
+        elif kind == "Personnel":
+            count, salary = f"{{ref[opex.{i}.count]}}", f"{{ref[opex.{i}.salary]}}"
+            if item.get('threshold') is not None:
+                # One extra hire per full threshold of (monthly) revenue above Period 1
+                threshold = f"{{ref[opex.{i}.threshold]}}" if months_per_period == 1 else f"({{ref[opex.{i}.threshold]}}*{{mpp}})"
+                specs[('opex', i)] = {'first': f"=(({count}+FLOOR(MAX(0,{{c}}{{row[total_rev]}}-$B{{row[total_rev]}})/{threshold},1))*{salary})/{{ppy}}"}
+            else:
+                specs[('opex', i)] = {'first': f"=({count}*{salary})/{{ppy}}"}
+    return specs
+
+
+def _kpi_specs(structure, months_per_period):
+    mpp = months_per_period
+    specs = {key: {'first': template} for key, template in _KPI_SAME.items()}
+    # Customer drivers are monthly; longer periods compound them over the period's months and
+    # express MRR, CAC and GP per customer per month
+    if mpp == 1:
+        specs['cust_count'] = {
+            'first': "={ref[start_cust]}+{ref[new_cust]}-(({ref[start_cust]})*{ref[churn_rate]})",
+            'rest': "={p}{row[cust_count]}+{ref[new_cust]}-(({p}{row[cust_count]})*{ref[churn_rate]})",
+        }
+        specs['mrr'] = {'first': "={m}{c}{row[total_rev]}"}
+    else:
+        kept = "(1-{ref[churn_rate]})^{mpp}"
+        added = f"{{ref[new_cust]}}*IF({{ref[churn_rate]}}>0, (1-{kept})/{{ref[churn_rate]}}, {{mpp}})"
+        specs['cust_count'] = {'first': f"={{ref[start_cust]}}*{kept}+{added}", 'rest': f"={{p}}{{row[cust_count]}}*{kept}+{added}"}
+        specs['mrr'] = {'first': "={m}{c}{row[total_rev]}/{mpp}"}
+    # S&M Spend: sum of the OpEx items marked as S&M
+    sm_rows = [f"{{m}}{{c}}{{row[opex.{i}]}}" for i, item in enumerate(structure['opex']) if item['name'] in structure['sm_opex_items']]
+    specs['sm_spend'] = {'first': "=" + "+".join(sm_rows) if sm_rows else "=0"}
+    new_in_period = "{ref[new_cust]}" if mpp == 1 else "({ref[new_cust]}*{mpp})"
+    specs['cac'] = {'first': f"=IF({{ref[new_cust]}}>0, {{c}}{{row[sm_spend]}}/{new_in_period}, 0)"}
+    per_month = "" if mpp == 1 else "/{mpp}"
+    specs['gp_per_cust'] = {'first': f"=IF({{c}}{{row[cust_count]}}>0, {{m}}{{c}}{{row[gross_profit]}}{per_month}/{{c}}{{row[cust_count]}}, 0)"}
+    # Year-on-year lines are N/A for the first year
+    specs['rev_growth'] = {'first': "N/A", 'lead': 'year', 'lag': 'year',
+                           'rest': "=IF({m}{p}{row[total_rev]}>0, ({m}{c}{row[total_rev]}-{m}{p}{row[total_rev]})/{m}{p}{row[total_rev]}, 0)"}
+    specs['rule40'] = {'first': "N/A", 'lead': 'year', 'rest': "={c}{row[rev_growth]}+{c}{row[ebitda_margin]}"}
+    return specs
+
+
+def model_specs(structure, months_per_period=1, include_kpis=True):
+    # {line key: template spec} for every formula row of the model sheet (and the KPI sheet)
+    specs = {key: {'first': template} for key, template in _SAME.items()}
+    specs.update({key: {'first': first, 'rest': rest} for key, (first, rest) in _OPENING.items()})
+    specs.update(_item_specs(structure, months_per_period))
+    # Depreciation: sum of Cost * Rate over the assets, per period
+    parts = [f"({{ref[capex.{i}.cost]}}*{{ref[capex.{i}.rate]}})" for i in range(len(structure['capex']))]
+    specs['deprec'] = {'first': "=(" + "+".join(parts) + ")/{ppy}" if parts else "=0"}
+    # CapEx: the assets' cost in Period 1, plus maintenance every period
+    costs = "(" + "+".join(f"{{ref[capex.{i}.cost]}}" for i in range(len(structure['capex']))) + ")" if structure['capex'] else "0"
+    specs['capex'] = {'first': f"=-({costs}+{{c}}{{row[total_rev]}}*{{ref[maint_capex]}})",
+                      'rest': "=-{c}{row[total_rev]}*{ref[maint_capex]}"}
+    if include_kpis:
+        specs.update(_kpi_specs(structure, months_per_period))
+    return specs
+
+
+def quarterly_specs(structure):
+    # {line key: template spec} of the quarterly model's formula rows (QUARTERLY_LINES)
+    specs = {key: {'first': _SAME[key]} for key in (
+        'total_rev', 'total_cogs', 'gross_profit', 'total_opex', 'ebitda', 'ebit', 'ni', 'cash', 'ar',
+        'total_assets', 'dr', 'cs', 'total_le', 'cf_ni', 'cf_deprec')}
+    specs.update({key: {'first': _OPENING[key][0], 'rest': _OPENING[key][1]} for key in (
+        'fa', 'ad', 're', 'chg_ar', 'chg_ap', 'chg_dr', 'chg_tp', 'stock_iss', 'debt_iss', 'ending_cash')})
+    specs.update({
+        'int_exp': {'first': "={ref[debt]}*{ref[debt_int]}/{ppy}"},
+        'int_inc': {'first': "={ref[beg_cash]}*{ref[cash_int]}/{ppy}", 'rest': "={p}{row[cash]}*{ref[cash_int]}/{ppy}"},
+        'ebt': {'first': "={c}{row[ebit]}-{c}{row[int_exp]}+{c}{row[int_inc]}"},
+        'tax': {'first': "=MAX(0, {c}{row[ebt]}*{ref[tax_rate]})"},
+        'ap': {'first': "={c}{row[total_opex]}*{ref[ap_pct]}"},
+        'tp': {'first': "=IF({ref[tax_timing]}=0, 0, {c}{row[tax]})"},
+        'debt': {'first': "={ref[debt]}"},
+        'ncf': {'first': "=SUM({c}{row[cf_ni]}:{c}{row[chg_tp]})+SUM({c}{row[capex]}:{c}{row[capex]})+SUM({c}{row[stock_iss]}:{c}{row[debt_iss]})"},
+    })
+    for i, item in enumerate(structure['revenue']):
+        specs[('revenue', i)] = {'first': f"={{ref[revenue.{i}.start]}}", 'rest': f"={{p}}{{row[revenue.{i}]}}*(1+{{ref[revenue.{i}.growth]}})"}
+    for i, item in enumerate(structure['cogs']):
+        specs[('cogs', i)] = {'first': f"={{c}}{{row[total_rev]}}*{{ref[cogs.{i}.val]}}" if item['type'] == "% of Rev" else f"={{ref[cogs.{i}.val]}}"}
+    for i, item in enumerate(structure['opex']):
+        if item['type'] == "Fixed Amount":
+            specs[('opex', i)] = {'first': f"={{ref[opex.{i}.val]}}", 'rest': f"={{p}}{{row[opex.{i}]}}*(1+{{ref[opex.{i}.growth]}})"}
+        elif item['type'] == "% of Rev":
+            specs[('opex', i)] = {'first': f"={{c}}{{row[total_rev]}}*{{ref[opex.{i}.val]}}"}
+        elif item['type'] == "Personnel":
+            specs[('opex', i)] = {'first': f"=({{ref[opex.{i}.count]}}*{{ref[opex.{i}.salary]}})/{{ppy}}"}
+    parts = [f"({{ref[capex.{i}.cost]}}*{{ref[capex.{i}.rate]}}/{{ppy}})" for i in range(len(structure['capex']))]
+    specs['deprec'] = {'first': "=" + "+".join(parts) if parts else "=0"}
+    costs = "(" + "+".join(f"{{ref[capex.{i}.cost]}}" for i in range(len(structure['capex']))) + ")" if structure['capex'] else "0"
+    specs['capex'] = {'first': f"=-{costs}", 'rest': 0}
+    return specs
+
+
+# --- DEPENDENCY GRAPH ---
+
+def _fields(template):
+    # [(literal before, field name)] of a template
+    if not isinstance(template, str):
+        return []
+    return [(literal, field) for literal, field, spec, conv in Formatter().parse(template) if field is not None]
+
+
+def _templates(spec):
+    rest = spec.get('rest', ())
+    return [spec['first']] + (list(rest) if isinstance(rest, list) else [rest])
+
+
+def _bracket(field):
+    # 'row[total_rev]' -> ('row', 'total_rev')
+    name, _, arg = field.partition('[')
+    return name, arg[:-1]
+
+
+def dependency_graph(specs, lines):
+    # {line key: {'same': {line keys read in the same period}, 'lag': {line keys read from an earlier
+    # period}, 'drivers': {driver paths}}} read off the templates; a {c}-range between two rows depends
+    # on every line between them. lines: the layout the specs are written into (model then KPI sheet)
+    order = [line[0] for line in lines if line]
+    position = {key: i for i, key in enumerate(order)}
+    names = {key_name(key): key for key in order}
+    graph = {}
+    for key, spec in specs.items():
+        node = {'same': set(), 'lag': set(), 'drivers': set()}
+        for template in _templates(spec):
+            fields = _fields(template)
+            for j, (literal, field) in enumerate(fields):
+                kind, arg = _bracket(field)
+                if kind == 'ref':
+                    node['drivers'].add(driver_path(arg))
+                elif kind == 'first':
+                    node['same'].update(k for k in order if isinstance(k, tuple) and k[0] == arg)
+                elif kind == 'row':
+                    column = fields[j-1][1] if j and literal == "" else None
+                    target = names[arg]
+                    # A range {c}{row[a]}:{c}{row[b]} covers the lines in between
+                    if j >= 2 and column == 'c' and fields[j-1][0] == ":" and _bracket(fields[j-2][1])[0] == 'row':
+                        start = names[_bracket(fields[j-2][1])[1]]
+                        node['same'].update(order[position[start]:position[target] + 1])
+                    node['lag' if column == 'p' else 'same'].add(target)
+        node['same'].discard(key)
+        graph[key] = node
+    return graph
+
+
+def components(graph):
+    # Iterative Tarjan over {node: iterable of precedents}; returns the strongly connected components
+    # precedents-first (a topological order of the condensed graph)
+    index, low, on_stack, stack, order = {}, {}, set(), [], []
+    counter = 0
+    for root in graph:
+        if root in index:
+            continue
+        work = [(root, iter(graph[root]))]
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, children = work[-1]
+            advanced = False
+            for child in children:
+                if child not in graph:
+                    continue
+                if child not in index:
+                    index[child] = low[child] = counter
+                    counter += 1
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(graph[child])))
+                    advanced = True
+                    break
+                if child in on_stack:
+                    low[node] = min(low[node], index[child])
+            if advanced:
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+            if low[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                order.append(component)
+    return order
+
+
+def evaluation_order(graph):
+    # Lines grouped into evaluation steps, precedents first: a step is one line, or several that feed
+    # each other across periods (the cash / interest / tax recurrence) and must advance period by period
+    precedents = {key: node['same'] | node['lag'] for key, node in graph.items()}
+    return [sorted(component, key=str) for component in components(precedents)]
+
+
+def upstream(graph, keys):
+    # Every line the given lines depend on (themselves included): what must be computed to show them
+    seen, todo = set(), [k for k in keys if k in graph]
+    while todo:
+        key = todo.pop()
+        if key in seen:
+            continue
+        seen.add(key)
+        todo += [k for k in graph[key]['same'] | graph[key]['lag'] if k in graph]
+    return seen
+
+
+def downstream(graph, keys=(), drivers=()):
+    # Every line affected by a change to the given lines or driver paths (themselves included)
+    dependents = {}
+    for key, node in graph.items():
+        for dep in node['same'] | node['lag']:
+            dependents.setdefault(dep, set()).add(key)
+    drivers = set(drivers)
+    todo = list(keys) + [key for key, node in graph.items() if node['drivers'] & drivers]
+    seen = set()
+    while todo:
+        key = todo.pop()
+        if key in seen:
+            continue
+        seen.add(key)
+        todo += dependents.get(key, ())
+    return seen
+
@@ -0,0 +1,161 @@
+import copy
+from collections import Counter
+
+import numpy as np
+
+from engine import extract_drivers, get_driver, project, set_driver
+from timeline import state_timeline
+
+# --- SENSITIVITY / TORNADO ---
+# One-at-a-time sweep: every Assumptions-sheet driver is moved down and up by the same percentage while
+# all others stay at the scenario value. The base case and all 2 x drivers perturbations form one
+# (1 + 2n,) batch, so the whole sweep is a single engine.project() call.
+# Grid sweeps (two-driver "What-If Data Tables") flatten the whole grid into one batch the same way.
+
+DEFAULT_PCT = 0.10
+
+OUTPUTS = {
+    'y3_ni': "Year 3 Net Income",
+    'ending_cash': "Ending Cash",
+    'min_cash_month': "Minimum Cash Month",
+    'rule_of_40': "Rule of 40",
+}
+# Engine rows the outputs are read from: project() skips every line none of them depends on
+SWEEP_ROWS = ('cash', 'net_income', 'rule_of_40')
+OUTPUT_FORMATS = {'y3_ni': '#,##0.00', 'ending_cash': '#,##0.00', 'min_cash_month': '0', 'rule_of_40': '0.00%'}
+GROUP_LABELS = {'revenue': "Revenue", 'cogs': "COGS", 'opex': "OpEx", 'capex': "CapEx"}
+
+
+def assumption_drivers(drivers):
+    # [(Assumptions sheet driver label, path into the drivers dict)] for every numeric driver,
+    # in the sheet's order (the tax timing switch is a choice, not a quantity, so it is left out)
+    out = [
+        ("Tax Rate", ('tax_rate',)), ("NOL Beginning Balance", ('beg_nol',)),
+        ("Beginning Cash", ('beg_cash',)), ("AR % of Rev", ('ar_pct',)), ("AP % of OpEx", ('ap_pct',)),
+        ("Deferred Rev %", ('dr_pct',)), ("Days Inventory Outstanding (DIO)", ('dio',)),
+        ("Days Payable Outstanding (DPO)", ('dpo',)),
+        ("Equity Raised", ('equity',)), ("Debt Issued", ('debt',)), ("Debt Interest Rate", ('debt_int',)),
+        ("Cash Interest Rate", ('cash_int',)), ("Overdraft Interest Rate", ('od_int',)),
+        ("Debt Repayment Term (Years)", ('debt_term',)),
+    ]
+    for i, item in enumerate(drivers['revenue']):
+        out.append((f"{item['name']} - Start Value", ('revenue', i, 'start')))
+        for y in (1, 2, 3):
+            out.append((f"{item['name']} - Y{y} Growth", ('revenue', i, f'growth_y{y}')))
+    for i, item in enumerate(drivers['cogs']):
+        out.append((f"{item['name']} - {'% of Rev' if item['type'] == '% of Rev' else 'Fixed Amt'}", ('cogs', i, 'val')))
+    for i, item in enumerate(drivers['opex']):
+        if item['type'] == "Fixed Amount":
+            out += [(f"{item['name']} - Start Value", ('opex', i, 'val')), (f"{item['name']} - Growth", ('opex', i, 'growth'))]
+        elif item['type'] == "% of Rev":
+            out.append((f"{item['name']} - % of Rev", ('opex', i, 'val')))
+        elif item['type'] == "Personnel":
+            out += [(f"{item['name']} - Headcount", ('opex', i, 'count')), (f"{item['name']} - Avg Salary", ('opex', i, 'salary'))]
+            if item['threshold'] is not None:
+                out.append((f"{item['name']} - Revenue Threshold ($)", ('opex', i, 'threshold')))
+    for i, item in enumerate(drivers['capex']):
+        out += [(f"{item['name']} - Cost", ('capex', i, 'cost')), (f"{item['name']} - Deprec Rate", ('capex', i, 'rate'))]
+    out.append(("Maintenance CapEx (% of Revenue)", ('maint_capex',)))
+    if 'start_cust' in drivers:
+        out += [("Starting Customers", ('start_cust',)), ("New Customers Monthly", ('new_cust',)),
+                ("Monthly Churn Rate", ('churn_rate',))]
+    return out
+
+
+def driver_key(path):
+    # A driver's key, as on the Assumptions sheet (model_builder.assumption_rows): ('revenue', 0, 'start') -> 'revenue.0.start'
+    return ".".join(str(part) for part in path)
+
+
+def driver_labels(paths):
+    # {driver key: display label} of assumption_drivers(). Sweeps and formats go by key: labels are only
+    # unique per item name, so a label two items share ("X - Start Value" of a Revenue and an OpEx item "X")
+    # gets the item's category and position added
+    counts = Counter(label for label, path in paths)
+    return {driver_key(path): label if counts[label] == 1 or len(path) != 3 else f"{label} ({GROUP_LABELS[path[0]]} #{path[1] + 1})"
+            for label, path in paths}
+
+
+def sweep_outputs(result, timeline):
+    # Per-batch-entry outputs of one engine result
+    ppy = timeline['periods_per_year']
+    year = min(2, len(timeline['years']) - 1)  # Year 3, or the last year of a shorter horizon
+    cash = result['cash']
+    return {
+        'y3_ni': result['net_income'][..., year*ppy:(year+1)*ppy].sum(axis=-1),
+        'ending_cash': cash[..., -1],
+        'min_cash_month': (cash.argmin(axis=-1) + 1) * timeline['months_per_period'],
+        'rule_of_40': result['rule_of_40'][..., -1],
+    }
+
+
+def sensitivity(state, scen, pct=DEFAULT_PCT):
+    # Returns {'base': {output: value}, 'rows': [{'key', 'driver' (display label), 'base', 'low_value',
+    # 'high_value', 'low': {output: value}, 'high': {output: value}}]} with one row per driver, in Assumptions order
+    tl = state_timeline(state)
+    base = extract_drivers(state, scen)
+    paths = assumption_drivers(base)
+    labels = driver_labels(paths)
+    n = 1 + 2 * len(paths)
+
+    drivers = copy.deepcopy(base)
+    values = []
+    for k, (label, path) in enumerate(paths):
+        v = float(get_driver(base, path))
+        column = np.full(n, v)
+        column[1 + 2*k] = v * (1 - pct)
+        column[2 + 2*k] = v * (1 + pct)
+        set_driver(drivers, path, column)
+        values.append(v)
+    outputs = sweep_outputs(project(drivers, tl['n_periods'], tl['periods_per_year'], SWEEP_ROWS), tl)
+
+    rows = []
+    for k, (label, path) in enumerate(paths):
+        rows.append({
+            'key': driver_key(path), 'driver': labels[driver_key(path)], 'base': values[k], 'low_value': values[k] * (1 - pct), 'high_value': values[k] * (1 + pct),
+            'low': {key: float(out[1 + 2*k]) for key, out in outputs.items()},
+            'high': {key: float(out[2 + 2*k]) for key, out in outputs.items()},
+        })
+    return {'base': {key: float(out[0]) for key, out in outputs.items()}, 'rows': rows}
+
+
+def swing(row, output):
+    # Spread between the down and up cases; NaN outputs (e.g. Rule of 40 in Year 1) count as no swing
+    s = abs(row['high'][output] - row['low'][output])
+    return 0.0 if np.isnan(s) else s
+
+
+def ranked(sweep, output):
+    # Rows ordered by swing on one output, largest first (the tornado order)
+    return sorted(sweep['rows'], key=lambda row: swing(row, output), reverse=True)
+
+
+def driver_values(state, scen):
+    # {driver key: (display label, scenario value)} of every driver a sweep may vary
+    drivers = extract_drivers(state, scen)
+    paths = assumption_drivers(drivers)
+    labels = driver_labels(paths)
+    return {driver_key(path): (labels[driver_key(path)], float(get_driver(drivers, path))) for label, path in paths}
+
+
+def grid_values(low, high, steps):
+    return np.linspace(low, high, int(steps))
+
+
+def grid_sweep(state, scen, x_driver, x_values, y_driver, y_values):
+    # Two-driver data table: {output: (len(y_values), len(x_values)) array}, row i / column j
+    # evaluated with y_driver = y_values[i] and x_driver = x_values[j]; drivers by key (driver_key())
+    if x_driver == y_driver:
+        raise ValueError("a grid sweep needs two different drivers")
+    tl = state_timeline(state)
+    base = extract_drivers(state, scen)
+    paths = {driver_key(path): path for label, path in assumption_drivers(base)}
+    for key in (x_driver, y_driver):
+        if key not in paths:
+            raise ValueError(f"unknown driver: {key}")
+    xs, ys = np.meshgrid(np.asarray(x_values, dtype=float), np.asarray(y_values, dtype=float))
+    drivers = copy.deepcopy(base)
+    set_driver(drivers, paths[x_driver], xs.ravel())
+    set_driver(drivers, paths[y_driver], ys.ravel())
+    outputs = sweep_outputs(project(drivers, tl['n_periods'], tl['periods_per_year'], SWEEP_ROWS), tl)
+    return {key: np.broadcast_to(out, xs.size).reshape(xs.shape) for key, out in outputs.items()}
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from engine import compute_model
+from model_builder import KPI_SHEET, SUMMARY_SHEET, model_layout
+from schema import ENGINE_ROWS, KPI_FORMATS, KPI_LINES
+from timeline import state_timeline
+from xlsx_values import line_series
+
+# --- LIVE STATEMENTS ---
+# The workbook's tables rebuilt from the native engine as DataFrames, so the app can show results
+# without exporting. Rows follow the planned workbook layout (same labels, same order); headers
+# and blank rows are dropped.
+
+# Model sheet section header key -> table name
+STATEMENT_SECTIONS = {'pl': "Profit & Loss", 'bs': "Balance Sheet", 'cf': "Cash Flow"}
+
+# KPI rows shown as percentages / ratios rather than currency (the schema's KPI number formats)
+KPI_PCT_ROWS = [label for key, label in KPI_LINES if KPI_FORMATS.get(key, '').endswith('%')]
+KPI_RATIO_ROWS = [label for key, label in KPI_LINES if key in KPI_FORMATS and not KPI_FORMATS[key].endswith('%')]
+
+
+def _table(rows, columns):
+    if not rows:
+        return pd.DataFrame(columns=columns)
+    labels, data = zip(*rows)
+    return pd.DataFrame(np.vstack(data), index=pd.Index(labels, name="Item"), columns=columns)
+
+
+def statement_tables(state, scen, cache=None):
+    # {table name: DataFrame (rows = line items, columns = period labels)} for one scenario.
+    # cache: the scenario's engine cache (engine.project), so only rows downstream of a changed driver are recomputed
+    tl = state_timeline(state)
+    result = compute_model(state, scen, tl, cache)
+    layout = model_layout(state, True, tl)
+    model_lines = layout[tl['sheet']]
+
+    # Split the model sheet at its section headers; rows are matched on line keys (xlsx_values.line_series),
+    # so an item named like a header or total still gets its own values
+    sections = {name: [] for name in STATEMENT_SECTIONS.values()}
+    computed = {r: (label, series) for r, label, series in line_series(model_lines, result)}
+    section = None
+    for r, line in enumerate(model_lines, start=2):
+        if line and line[0] in STATEMENT_SECTIONS:
+            section = STATEMENT_SECTIONS[line[0]]
+        elif r in computed:
+            sections[section].append(computed[r])
+    tables = {name: _table(rows, tl['labels']) for name, rows in sections.items()}
+
+    # Annual Summary: P&L lines summed per year, balances at year end (a partial final year included)
+    ppy = tl['periods_per_year']
+    years = [f"Year {y+1}" for y in range(len(tl['years']))]
+    summary = []
+    for key, label, bold in filter(None, layout[SUMMARY_SHEET]):
+        if key[0] != 'year':
+            continue
+        series = result[ENGINE_ROWS[key[1]]]
+        chunks = [series[y*ppy:(y+1)*ppy] for y in range(len(years))]
+        summary.append((label, np.array([c.sum() if key[2] else c[-1] for c in chunks])))
+    tables[SUMMARY_SHEET] = _table(summary, years)
+
+    tables[KPI_SHEET] = _table([(label, series) for r, label, series in line_series(layout[KPI_SHEET], result)], tl['labels'])
+    return tables
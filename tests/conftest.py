@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+# The app's modules sit flat in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def state():
+    # A fresh default state per test; tests edit it in place
+    from model_builder import default_state
+    return default_state()
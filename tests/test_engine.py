@@ -0,0 +1,55 @@
+import copy
+
+import numpy as np
+import pytest
+
+from engine import extract_drivers, project, set_driver
+
+# One driver of each kind: (path, new value, a line it must recompute, a line it must not)
+EDITS = [
+    (('revenue', 0, 'start'), 150000.0, ('revenue', 0), 'cust_count'),
+    (('opex', 0, 'val'), 25000.0, ('opex', 0), 'cust_count'),
+    (('debt_int',), 0.12, 'int_exp', 'total_rev'),
+    (('churn_rate',), 0.05, 'cust_count', 'ni'),
+]
+
+
+def assert_same_rows(cached, fresh):
+    assert set(cached) == set(fresh)
+    for name, row in fresh.items():
+        if isinstance(row, list):
+            assert len(cached[name]) == len(row), name
+            for a, b in zip(cached[name], row):
+                np.testing.assert_array_equal(a, b, err_msg=name)
+        else:
+            np.testing.assert_array_equal(cached[name], row, err_msg=name)
+
+
+@pytest.mark.parametrize("path, value, changed, unchanged", EDITS, ids=["revenue", "opex", "financing", "kpi"])
+def test_cached_run_equals_full_run_after_edit(state, path, value, changed, unchanged):
+    drivers = extract_drivers(state, 'Base')
+    cache = {}
+    project(drivers, cache=cache)
+    edited = copy.deepcopy(drivers)
+    set_driver(edited, path, value)
+    assert_same_rows(project(edited, cache=cache), project(edited))
+    assert changed in cache['recomputed']
+    assert unchanged not in cache['recomputed']
+
+
+def test_cached_run_follows_in_place_edits(state):
+    # The cache keeps its own copy of the drivers, so editing the same dict between calls is seen
+    drivers = extract_drivers(state, 'Base')
+    cache = {}
+    project(drivers, cache=cache)
+    for path, value, changed, unchanged in EDITS:
+        set_driver(drivers, path, value)
+        assert_same_rows(project(drivers, cache=cache), project(copy.deepcopy(drivers)))
+
+
+def test_unchanged_drivers_reuse_every_line(state):
+    drivers = extract_drivers(state, 'Base')
+    cache = {}
+    first = project(drivers, cache=cache)
+    assert_same_rows(project(drivers, cache=cache), first)
+    assert cache['recomputed'] == []
@@ -0,0 +1,74 @@
+import pytest
+from openpyxl import Workbook
+
+from evaluator import compare_cached_values, evaluate_workbook
+from model_builder import scenario_names, workbook_bytes
+
+
+def check_cached(data):
+    # (mismatches, formulas without a cached value) of an export against a fresh evaluation
+    evaluation = evaluate_workbook(data)
+    assert evaluation['converged']
+    uncached = []
+    return compare_cached_values(data, evaluation, uncached=uncached), uncached
+
+
+def test_default_state_matches_cached_values(state):
+    assert check_cached(workbook_bytes(state, with_values=True)) == ([], [])
+
+
+@pytest.mark.parametrize("horizon_months, granularity", [(60, "Quarterly"), (24, "Annual"), (48, "Monthly")])
+def test_other_timelines_match_cached_values(state, horizon_months, granularity):
+    state['horizon_months'], state['granularity'] = horizon_months, granularity
+    assert check_cached(workbook_bytes(state, with_values=True)) == ([], [])
+
+
+def test_all_scenarios_export_matches_cached_values(state):
+    state['scenario_to_run'] = scenario_names(state)[1]
+    assert check_cached(workbook_bytes(state, with_values=True, all_scenarios=True)) == ([], [])
+
+
+@pytest.mark.parametrize("group, name", [('revenue_items', "Revenue"), ('cogs_items', "Cost of Goods Sold"),
+                                         ('opex_items', "Operating Expenses"), ('opex_items', "Total Opex")])
+def test_items_named_like_fixed_lines_match_cached_values(state, group, name):
+    state[group][0]['name'] = name
+    assert check_cached(workbook_bytes(state, with_values=True)) == ([], [])
+
+
+def test_export_without_values_is_uncached_not_mismatched(state):
+    data = workbook_bytes(state)
+    mismatches, uncached = check_cached(data)
+    assert mismatches == []
+    assert len(uncached) == evaluate_workbook(data)['cells']
+
+
+def test_circular_block_iterates_to_fixed_point():
+    # A1 = 10 + B1 / 2 and B1 = A1 / 2 feed each other: A1 = 40/3, B1 = 20/3
+    wb = Workbook()
+    wb.calculation.iterate = True
+    wb.calculation.iterateCount = 100
+    wb.calculation.iterateDelta = 1e-9
+    ws = wb.active
+    ws['A1'] = "=10+B1/2"
+    ws['B1'] = "=A1/2"
+    ws['C1'] = "=A1+B1"
+    evaluation = evaluate_workbook(wb)
+    assert evaluation['cyclic_components'] == [2]
+    assert evaluation['converged']
+    assert 1 < evaluation['iterations'] < 100
+    values = evaluation['values']
+    assert values[ws.title, 'A1'] == pytest.approx(40 / 3)
+    assert values[ws.title, 'B1'] == pytest.approx(20 / 3)
+    assert values[ws.title, 'C1'] == pytest.approx(20)
+
+
+def test_circular_block_stops_at_iterate_count():
+    # A1 = A1 + 1 never settles: the evaluation gives up after iterateCount sweeps
+    wb = Workbook()
+    wb.calculation.iterate = True
+    wb.calculation.iterateCount = 7
+    wb.active['A1'] = "=A1+1"
+    evaluation = evaluate_workbook(wb)
+    assert evaluation['iterations'] == 7
+    assert not evaluation['converged']
+    assert evaluation['values'][wb.active.title, 'A1'] == 7
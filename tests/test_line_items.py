@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from line_items import ITEM_ID, LINE_FIELDS, column_name, frame_items, items_frame
+from model_builder import scenario_names
+
+VALUE = "Fixed ($) / % of Rev / Headcount"
+
+
+def edit(state, category, scenarios, change):
+    # Items after editing the category's table (shown for `scenarios`) with change(df) -> df
+    items = state[category]
+    df = change(items_frame(items, category, scenarios).copy())
+    return frame_items(df, items, category, scenarios, scenario_names(state))
+
+
+@pytest.mark.parametrize("category", list(LINE_FIELDS))
+def test_unedited_table_keeps_items(state, category):
+    scenarios = scenario_names(state)
+    items = edit(state, category, scenarios, lambda df: df)
+    for old, new in zip(state[category], items):
+        assert {key: new[key] for key in old} == old
+    # Fields an item lacked come back as the table's defaults, after which the round trip is exact
+    assert edit(dict(state, **{category: items}), category, scenarios, lambda df: df) == items
+
+
+def test_row_added_after_deleting_last_starts_from_defaults(state):
+    # Only Base is shown: the deleted item's Optimistic / Pessimistic values must not pass to the new row
+    state['opex_items'][-1]['value'] = {'Base': 3.0, 'Optimistic': 4.0, 'Pessimistic': 2.0}
+    n = len(state['opex_items'])
+
+    def change(df):
+        new = {ITEM_ID: None, 'Name': "Recruiting", 'Type': "Fixed Amount", column_name(VALUE, 'Base'): 1200.0}
+        return pd.concat([df.iloc[:-1], pd.DataFrame([new])], ignore_index=True)
+
+    items = edit(state, 'opex_items', ['Base'], change)
+    assert [item['name'] for item in items] == [item['name'] for item in state['opex_items'][:-1]] + ["Recruiting"]
+    assert len(items) == n
+    new = items[-1]
+    assert new['value'] == {'Base': 1200.0, 'Optimistic': 5000.0, 'Pessimistic': 5000.0}
+    assert new['param2'] == {s: 0.0 for s in scenario_names(state)}
+    assert new['revenue_threshold'] == {s: 50000.0 for s in scenario_names(state)}
+
+
+def test_reordered_rows_keep_their_own_items(state):
+    state['revenue_items'][0]['value']['Optimistic'] = 123.0
+    items = edit(state, 'revenue_items', ['Base'], lambda df: df.iloc[::-1].reset_index(drop=True))
+    assert items == list(reversed(state['revenue_items']))
+
+
+def test_duplicate_and_blank_names(state):
+    def change(df):
+        df.loc[1, 'Name'] = " " + df.loc[0, 'Name'] + " "
+        df.loc[len(df)] = {ITEM_ID: None, 'Name': "  "}
+        return df
+
+    items = edit(state, 'revenue_items', ['Base'], change)
+    first = state['revenue_items'][0]['name']
+    assert [item['name'] for item in items] == [first, f"{first} (2)"]
+    # The renamed row is still the second item
+    assert items[1]['value'] == state['revenue_items'][1]['value']
+
+
+def test_type_switch_rescales_percentages(state):
+    # Marketing goes from Fixed Amount ($) to % of Rev: the same cell now holds a percentage
+    scenarios = scenario_names(state)
+    frame = items_frame(state['opex_items'], 'opex_items', scenarios)
+    assert frame.loc[0, column_name(VALUE, 'Base')] == 10000.0
+    growth = column_name("Growth (%) / Avg Salary ($/yr)", 'Base')
+    assert frame.loc[0, growth] == pytest.approx(5.0)
+
+    def change(df):
+        df.loc[0, 'Type'] = "% of Rev"
+        df[column_name(VALUE, 'Base')] = df[column_name(VALUE, 'Base')].astype(float)
+        df.loc[0, column_name(VALUE, 'Base')] = 15.0
+        return df
+
+    items = edit(state, 'opex_items', scenarios, change)
+    assert items[0]['type'] == "% of Rev"
+    assert items[0]['value']['Base'] == 0.15
+    # param2 is a $ amount for anything but Fixed Amount, so the 5 shown is stored as is
+    assert items[0]['param2']['Base'] == 5.0
+    assert items_frame(items, 'opex_items', scenarios).loc[0, column_name(VALUE, 'Base')] == 15.0
+
+
+def test_unknown_type_and_bad_numbers_take_defaults(state):
+    def change(df):
+        df['Type'] = df['Type'].astype(object)
+        df.loc[0, 'Type'] = "Royalty"
+        df[column_name("% of Rev / Fixed ($)", 'Base')] = df[column_name("% of Rev / Fixed ($)", 'Base')].astype(object)
+        df.loc[0, column_name("% of Rev / Fixed ($)", 'Base')] = "n/a"
+        return df
+
+    items = edit(state, 'cogs_items', ['Base'], change)
+    assert items[0]['type'] == "% of Rev"
+    assert items[0]['value']['Base'] == 0.10
+
+
+def test_hidden_scenarios_keep_their_values(state):
+    state['revenue_items'][0]['growth_y1'] = {'Base': 0.10, 'Optimistic': 0.25, 'Pessimistic': -0.05}
+
+    def change(df):
+        df.loc[0, column_name("Y1 Growth (%)", 'Base')] = 12.5
+        return df
+
+    items = edit(state, 'revenue_items', ['Base'], change)
+    assert items[0]['growth_y1'] == {'Base': 0.125, 'Optimistic': 0.25, 'Pessimistic': -0.05}
+    assert np.isclose(items[0]['value']['Base'], state['revenue_items'][0]['value']['Base'])
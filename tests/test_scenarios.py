@@ -0,0 +1,71 @@
+import copy
+
+import numpy as np
+import pytest
+
+from engine import compute_model, get_driver
+from model_builder import scenario_names
+from scenarios import (clone_scenario, diff_scenarios, evaluate_scenarios, remove_scenario, scenario_store,
+                       write_scenario)
+
+
+def assert_same_rows(batched, j, single):
+    for name, row in single.items():
+        if isinstance(row, list):
+            for a, b in zip(batched[name], row):
+                np.testing.assert_allclose(a[j], b, rtol=1e-12, err_msg=name)
+        else:
+            np.testing.assert_allclose(batched[name][j], row, rtol=1e-12, err_msg=name)
+
+
+def test_batched_scenarios_equal_single_runs(state):
+    result = evaluate_scenarios(state)
+    for j, name in enumerate(scenario_names(state)):
+        assert_same_rows(result, j, compute_model(state, name))
+
+
+def test_store_reads_the_state_dicts(state):
+    store = scenario_store(state)
+    for k, path in enumerate(store['paths']):
+        values = get_driver(state, path[:-1]).get(path[-1], {})
+        for name, j in store['index'].items():
+            if name in values:
+                assert store['values'][k, j] == values[name], (store['labels'][k], name)
+
+
+def test_clone_write_remove_round_trip(state):
+    original = copy.deepcopy(state)
+    store = clone_scenario(scenario_store(state), 'Base', 'Stress')
+    assert diff_scenarios(store, 'Base', 'Stress') == []
+
+    # Edit two drivers of the clone, one of them integer-valued
+    j = store['index']['Stress']
+    churn = store['labels'].index("Monthly Churn Rate")
+    term = store['labels'].index("Debt Repayment Term (Years)")
+    store['values'][churn, j] *= 2
+    store['values'][term, j] += 1
+    assert [label for label, a, b in diff_scenarios(store, 'Base', 'Stress')] == ["Debt Repayment Term (Years)", "Monthly Churn Rate"]
+
+    write_scenario(state, store, 'Stress')
+    assert scenario_names(state) == scenario_names(original) + ['Stress']
+    assert state['kpi_assumptions']['churn_rate_monthly']['Stress'] == 2 * original['kpi_assumptions']['churn_rate_monthly']['Base']
+    term_value = state['financing_assumptions']['debt_repayment_term']['Stress']
+    assert isinstance(term_value, int) and term_value == original['financing_assumptions']['debt_repayment_term']['Base'] + 1
+    # The state read back gives the same store, and the new scenario runs like any other
+    np.testing.assert_array_equal(scenario_store(state)['values'], store['values'])
+    assert_same_rows(evaluate_scenarios(state), j, compute_model(state, 'Stress'))
+
+    state['scenario_to_run'] = 'Stress'
+    remove_scenario(state, 'Stress')
+    assert state['scenario_to_run'] == scenario_names(state)[0]
+    state['scenario_to_run'] = original['scenario_to_run']
+    assert state == original
+
+
+def test_scenario_names_and_last_scenario_are_guarded(state):
+    with pytest.raises(ValueError):
+        clone_scenario(scenario_store(state), 'Base', 'Optimistic')
+    for name in scenario_names(state)[1:]:
+        remove_scenario(state, name)
+    with pytest.raises(ValueError):
+        remove_scenario(state, 'Base')
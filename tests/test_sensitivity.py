@@ -0,0 +1,74 @@
+import copy
+
+import pytest
+
+from engine import compute_model, extract_drivers, get_driver
+from scenarios import scenario_entries
+from sensitivity import assumption_drivers, driver_key, driver_labels, grid_sweep, sensitivity, sweep_outputs
+from timeline import state_timeline
+
+# Drivers that are one value for every scenario: engine path -> state path
+SHARED_DRIVERS = {('beg_nol',): ('tax_assumptions', 'nol_balance'), ('beg_cash',): ('wc_assumptions', 'beginning_cash')}
+
+
+def with_driver(state, scen, path, value):
+    # Copy of the state with one engine driver set for scen, through the state dict that feeds it
+    state = copy.deepcopy(state)
+    if path in SHARED_DRIVERS:
+        *parent, key = SHARED_DRIVERS[path]
+        get_driver(state, parent)[key] = value
+    else:
+        *parent, key = next(entry[1] for entry in scenario_entries(state) if entry[2] == path)
+        get_driver(state, parent).setdefault(key, {})[scen] = value
+    return state
+
+
+def single_run(state, scen):
+    # Sweep outputs of one unbatched compute_model() run
+    return {key: float(out) for key, out in sweep_outputs(compute_model(state, scen), state_timeline(state)).items()}
+
+
+@pytest.mark.parametrize("scen, horizon_months, granularity", [("Base", 36, "Monthly"), ("Pessimistic", 36, "Monthly"),
+                                                               ("Base", 60, "Quarterly")])
+def test_sensitivity_columns_equal_single_runs(state, scen, horizon_months, granularity):
+    state['horizon_months'], state['granularity'] = horizon_months, granularity
+    sweep = sensitivity(state, scen, 0.2)
+    paths = {driver_key(path): path for label, path in assumption_drivers(extract_drivers(state, scen))}
+    assert [row['key'] for row in sweep['rows']] == list(paths)
+    assert sweep['base'] == pytest.approx(single_run(state, scen), rel=1e-12, nan_ok=True)
+    for row in sweep['rows']:
+        for case in ('low', 'high'):
+            edited = with_driver(state, scen, paths[row['key']], row[f'{case}_value'])
+            assert row[case] == pytest.approx(single_run(edited, scen), rel=1e-12, nan_ok=True), (row['key'], case)
+
+
+@pytest.mark.parametrize("x_key, y_key", [('churn_rate', 'revenue.0.growth_y1'), ('revenue.0.start', 'opex.0.val'),
+                                          ('beg_cash', 'capex.0.rate')])
+def test_grid_cells_equal_single_runs(state, x_key, y_key):
+    base = extract_drivers(state, 'Base')
+    paths = {driver_key(path): path for label, path in assumption_drivers(base)}
+    x_values = [f * get_driver(base, paths[x_key]) for f in (0.5, 1.0, 1.5)]
+    y_values = [f * get_driver(base, paths[y_key]) for f in (0.8, 1.2)]
+    grid = grid_sweep(state, 'Base', x_key, x_values, y_key, y_values)
+    for i, y in enumerate(y_values):
+        for j, x in enumerate(x_values):
+            edited = with_driver(with_driver(state, 'Base', paths[x_key], x), 'Base', paths[y_key], y)
+            expected = single_run(edited, 'Base')
+            assert {key: float(out[i, j]) for key, out in grid.items()} == pytest.approx(expected, rel=1e-12, nan_ok=True)
+
+
+def test_grid_sweep_tells_same_named_items_apart(state):
+    # A Revenue and an OpEx item both called "X" share the "X - Start Value" label but not the key
+    state['revenue_items'][0]['name'] = state['opex_items'][0]['name'] = "X"
+    labels = driver_labels(assumption_drivers(extract_drivers(state, 'Base')))
+    assert labels['revenue.0.start'] != labels['opex.0.val']
+    grid = grid_sweep(state, 'Base', 'revenue.0.start', [50000.0], 'opex.0.val', [20000.0])
+    edited = with_driver(with_driver(state, 'Base', ('revenue', 0, 'start'), 50000.0), 'Base', ('opex', 0, 'val'), 20000.0)
+    assert {key: float(out[0, 0]) for key, out in grid.items()} == pytest.approx(single_run(edited, 'Base'), rel=1e-12, nan_ok=True)
+
+
+def test_grid_sweep_rejects_bad_drivers(state):
+    with pytest.raises(ValueError):
+        grid_sweep(state, 'Base', 'churn_rate', [0.01], 'churn_rate', [0.02])
+    with pytest.raises(ValueError):
+        grid_sweep(state, 'Base', "Monthly Churn Rate", [0.01], 'beg_cash', [1.0])
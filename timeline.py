@@ -0,0 +1,47 @@
+from openpyxl.utils import get_column_letter
+
+# --- TIMELINE PLANNER ---
+# One place that decides the projection's period columns. The workbook builders, the engine and the
+# cached-value writer all take their period count, column letters, period length and year buckets
+# from plan_timeline(), so a 120-month or quarterly model needs no hand-edited ranges anywhere.
+
+# Granularity -> periods per year
+GRANULARITIES = {"Monthly": 12, "Quarterly": 4, "Annual": 1}
+PERIOD_LABELS = {"Monthly": "Month {}", "Quarterly": "Q{}", "Annual": "Year {}"}
+
+DEFAULT_HORIZON_MONTHS = 36
+DEFAULT_GRANULARITY = "Monthly"
+
+
+def plan_timeline(horizon_months=DEFAULT_HORIZON_MONTHS, granularity=DEFAULT_GRANULARITY):
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"unknown granularity: {granularity}")
+    per_year = GRANULARITIES[granularity]
+    months = 12 // per_year
+    horizon_months = int(horizon_months)
+    if horizon_months <= 0 or horizon_months % months:
+        raise ValueError(f"a {horizon_months} month horizon is not a whole number of {granularity.lower()} periods")
+    n = horizon_months // months
+
+    cols = [get_column_letter(i+2) for i in range(n)]  # column A holds the labels
+    n_years = -(-n // per_year)  # a partial final year still gets its own bucket
+    return {
+        'granularity': granularity,
+        'horizon_months': horizon_months,
+        'periods_per_year': per_year,
+        'months_per_period': months,
+        'days_per_period': 30 * months,  # Inventory / AP use "Approx 30 days/month"
+        'n_periods': n,
+        'labels': [PERIOD_LABELS[granularity].format(i+1) for i in range(n)],
+        'cols': cols,
+        'prev_cols': [None] + cols[:-1],
+        'year_of': [i // per_year for i in range(n)],
+        # (first column, last column) of each year, for Annual Summary sums and year-end balances
+        'years': [(cols[y*per_year], cols[min((y+1)*per_year, n) - 1]) for y in range(n_years)],
+        'sheet': f"{horizon_months} Month Model",
+    }
+
+
+def state_timeline(state):
+    # Timeline of an assumptions mapping; files saved before horizons were configurable get the 36-month default
+    return plan_timeline(state.get('horizon_months', DEFAULT_HORIZON_MONTHS), state.get('granularity', DEFAULT_GRANULARITY))
@@ -0,0 +1,118 @@
+import math
+import re
+import zipfile
+from io import BytesIO
+
+from openpyxl.utils import get_column_letter
+
+from model_builder import SUMMARY_SHEET, KPI_SHEET
+from schema import ENGINE_ROWS, GROUPS
+
+# --- CACHED CELL VALUES ---
+# openpyxl writes formula cells with an empty <v/>, so Excel/LibreOffice must recalculate on open and
+# non-calculating readers (previewers, pandas.read_excel, openpyxl data_only) see blanks.
+# These helpers fill each formula's cached value from the native engine results.
+
+
+def line_series(lines, result):
+    # Yields (worksheet row, label, engine series) for every line of a planned sheet
+    # (model_builder.model_layout()) the engine computes. Rows are matched on the line key, never on
+    # the label: an item line (group, i) takes the group's i-th series, so an item named like a
+    # header, a total or another item keeps its own values
+    for r, line in enumerate(lines, start=2):
+        if not line:
+            continue
+        key = line[0]
+        if isinstance(key, tuple) and key[0] in GROUPS:
+            items = result.get(GROUPS[key[0]][2], ())
+            series = items[key[1]] if key[1] < len(items) else None
+        else:
+            series = result.get(ENGINE_ROWS.get(key))
+        if series is not None:
+            yield r, line[1], series
+
+
+def _period_values(lines, result):
+    values = {}
+    for r, label, series in line_series(lines, result):
+        for i, v in enumerate(series):
+            values[f"{get_column_letter(i+2)}{r}"] = v
+    return values
+
+
+def _summary_values(lines, result, periods_per_year=12):
+    # ('year', model line key, summed) lines: P&L rows are summed per year; Balance Sheet rows take
+    # the last period of the year
+    values = {}
+    for r, line in enumerate(lines, start=2):
+        if not line or line[0][0] != 'year':
+            continue
+        key, source, is_sum = line[0]
+        series = result[ENGINE_ROWS[source]]
+        for y in range(-(-len(series) // periods_per_year)):  # a partial final year is still a column
+            year = series[y*periods_per_year:(y+1)*periods_per_year]
+            values[f"{get_column_letter(y+2)}{r}"] = year.sum() if is_sum else year[-1]
+    return values
+
+
+def model_cell_values(layout, result, timeline):
+    # {sheet title: {coordinate: value}} for every formula row the engine knows about.
+    # layout: model_builder.model_layout() the workbook was written from;
+    # timeline: the timeline.plan_timeline() the workbook and result were built for
+    values = {}
+    model_sheet = timeline['sheet']
+    if model_sheet in layout:
+        values[model_sheet] = _period_values(layout[model_sheet], result)
+    if SUMMARY_SHEET in layout:
+        values[SUMMARY_SHEET] = _summary_values(layout[SUMMARY_SHEET], result, timeline['periods_per_year'])
+    if KPI_SHEET in layout:
+        values[KPI_SHEET] = _period_values(layout[KPI_SHEET], result)
+    return values
+
+
+def _sheet_paths(archive):
+    # Sheet title -> part name, resolved through the workbook relationships
+    workbook = archive.read('xl/workbook.xml').decode('utf-8')
+    rels = archive.read('xl/_rels/workbook.xml.rels').decode('utf-8')
+    targets = {}
+    for rel in re.findall(r'<Relationship\b[^>]*>', rels):
+        rel_id = re.search(r'\bId="([^"]+)"', rel).group(1)
+        target = re.search(r'\bTarget="([^"]+)"', rel).group(1)
+        targets[rel_id] = target.lstrip('/') if target.startswith('/') else 'xl/' + target
+    paths = {}
+    for sheet in re.findall(r'<sheet\b[^>]*>', workbook):
+        name = re.search(r'\bname="([^"]+)"', sheet).group(1)
+        rel_id = re.search(r'\br:id="([^"]+)"', sheet).group(1)
+        paths[_unescape(name)] = targets[rel_id]
+    return paths
+
+
+def _unescape(text):
+    return text.replace('&lt;', '<').replace('&gt;', '>').replace('&quot;', '"').replace('&apos;', "'").replace('&amp;', '&')
+
+
+# Plain and shared formulas (<f t="shared" ref=".." si="0">..</f>, followers <f t="shared" si="0"></f>)
+FORMULA_CELL = re.compile(r'(<c r="([A-Z]+[0-9]+)"[^>]*>)(<f(?: [^>]*)?(?:/>|>.*?</f>))<v(?:\s*/>|></v>)')
+
+
+def embed_cached_values(xlsx_bytes, values):
+    # Rewrites the saved package so each formula cell carries its computed value in <v>
+    src = zipfile.ZipFile(BytesIO(xlsx_bytes))
+    parts = {path: title for title, path in _sheet_paths(src).items() if title in values}
+    out = BytesIO()
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as dst:
+        for info in src.infolist():
+            data = src.read(info.filename)
+            if info.filename in parts:
+                sheet_values = values[parts[info.filename]]
+
+                def fill(m):
+                    cell, coord, formula = m.groups()
+                    v = sheet_values.get(coord)
+                    if v is None or not math.isfinite(v):
+                        return m.group(0)
+                    return f"{cell}{formula}<v>{float(v)!r}</v>"
+
+                data = FORMULA_CELL.sub(fill, data.decode('utf-8')).encode('utf-8')
+            dst.writestr(info, data)
+    return out.getvalue()